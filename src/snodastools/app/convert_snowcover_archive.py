@@ -0,0 +1,106 @@
+"""
+This program converts an archive of snow cover GeoTIFFs to the compact format that is now written by SNODAS Tools:
+1-bit (or Byte) cells, compressed, with cells that have no SWE data masked as nodata.
+
+Older snow cover GeoTIFFs were written by the QGIS raster calculator using a 32-bit floating point
+data type and no compression.  The files are converted in parallel, one file per process.
+Each file is converted to a temporary file that replaces the original only when complete,
+so the program can be interrupted and run again.  Files that are already converted are skipped.
+
+Run with, for example:
+
+  python -m snodastools.app.convert_snowcover_archive --folder processedData/4_CreateSnowCover --workers 8
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import snodastools.app.version as version
+import snodastools.util.zonal_util as zonal_util
+
+
+def convert_file(tif_file_path: Path, compression: str, nbits: int) -> (Path, bool, int, int):
+    """
+    Convert one snow cover GeoTIFF, called in a worker process.
+    tif_file_path: path to the snow cover GeoTIFF
+    compression: compression method
+    nbits: number of bits per cell, 1 or 8
+    Returns: tuple of (file path, whether converted, file size before, file size after)
+    """
+    size_before = tif_file_path.stat().st_size
+    converted = zonal_util.convert_snow_cover_tif(tif_file_path, compression, nbits)
+    return tif_file_path, converted, size_before, tif_file_path.stat().st_size
+
+
+def main() -> None:
+    """
+    Parse the command line and convert the snow cover GeoTIFFs.
+    """
+    parser = argparse.ArgumentParser(prog='convert_snowcover_archive',
+                                     description='Convert snow cover GeoTIFFs to compact 1-bit or Byte GeoTIFFs.')
+    parser.add_argument('--version', action="store_true", help='Print program version.')
+    parser.add_argument("--folder", default=".",
+                        help="Folder containing the snow cover GeoTIFFs (default is current).")
+    parser.add_argument("--pattern", default="SNODAS_SnowCover_ClipAndProj_*.tif",
+                        help="File name pattern to convert (default is SNODAS_SnowCover_ClipAndProj_*.tif).")
+    parser.add_argument("--compression", default="DEFLATE", choices=zonal_util.SNOW_COVER_COMPRESSIONS,
+                        type=str.upper, help="Compression method (default is DEFLATE).")
+    parser.add_argument("--nbits", type=int, default=1, choices=(1, 8),
+                        help="Bits per cell, 1 or 8 (default is 1).")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="Number of files to convert in parallel (default is the number of CPUs).")
+    args = parser.parse_args()
+
+    if args.version:
+        print("convert_snowcover_archive version " + version.app_version, file=sys.stderr)
+        exit(0)
+
+    folder = Path(args.folder)
+    if not folder.is_dir():
+        print("Folder does not exist: {}".format(folder), file=sys.stderr)
+        exit(1)
+
+    tif_file_paths = sorted(folder.glob(args.pattern))
+    print("Converting {} files in {} using {} workers.".format(len(tif_file_paths), folder, args.workers),
+          file=sys.stderr)
+
+    start_time = time.perf_counter()
+    converted_count = 0
+    skipped_count = 0
+    failed_count = 0
+    bytes_before = 0
+    bytes_after = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(convert_file, tif_file_path, args.compression, args.nbits): tif_file_path
+                   for tif_file_path in tif_file_paths}
+        for future in as_completed(futures):
+            try:
+                tif_file_path, converted, size_before, size_after = future.result()
+            except Exception as e:
+                failed_count += 1
+                print("  Error converting {}: {}".format(futures[future], e), file=sys.stderr)
+                continue
+            if converted:
+                converted_count += 1
+                bytes_before += size_before
+                bytes_after += size_after
+            else:
+                skipped_count += 1
+
+    print("Converted {} files ({:.1f} MB to {:.1f} MB), skipped {} already converted, {} failed, in {:.1f} seconds."
+          .format(converted_count, bytes_before / 1e6, bytes_after / 1e6, skipped_count, failed_count,
+                  time.perf_counter() - start_time), file=sys.stderr)
+    if failed_count > 0:
+        exit(1)
+
+
+if __name__ == '__main__':
+    """
+    Main program entry point into this program.
+    """
+    main()
@@ -25,6 +25,7 @@ import os
 import snodastools.app.version as version
 import snodastools.util.os_util as os_util
 import snodastools.util.config_util as config_util
+import snodastools.util.prefetch_util as prefetch_util
 import snodastools.util.snodas_util as snodas_util
 import sys
 import time
@@ -66,6 +67,10 @@ from qgis.core import QgsApplication
 # The default setting, False, will delete all parameters except 'Snow Water Equivalent'.
 # The optional setting, True, will move all other parameters to a sub-folder under 1_Download called 'OtherParameters'.
 #
+# PREFETCH_DEPTH:
+#   The number of dates to download in the background, ahead of the date that is being processed.
+#   Set to 0 (default) to download each date just before it is processed.
+#
 # DOWNLOAD_FOLDER:
 #   The name of the download folder. Defaulted to '1_DownloadSNODAS'.
 #   All downloaded SNODAS .tar files are contained here.
@@ -126,6 +131,8 @@ RUN_HIST_TSTOOL: str or None = None
 
 SAVE_ALL_SNODAS_PARAMS: str or None = None
 
+PREFETCH_DEPTH: int = 0
+
 # Command line absolute path to SNODAS Tools implementation root:
 # - this folder will have config as a sub-folder
 command_line_snodas_root: str or None = None
@@ -207,6 +214,8 @@ def set_config_globals(config_map_dict: dict) -> dict:
 
     global SAVE_ALL_SNODAS_PARAMS
 
+    global PREFETCH_DEPTH
+
     # QGIS_HOME = config_util.get_config_prop('ProgramInstall.qgis_pathname')
     SNODAS_ROOT = config_util.get_config_prop('Folders.root_folder')
     if not SNODAS_ROOT:
@@ -240,6 +249,10 @@ def set_config_globals(config_map_dict: dict) -> dict:
 
     SAVE_ALL_SNODAS_PARAMS = config_util.get_config_prop('SNODASParameters.save_all_parameters')
 
+    prefetch_depth = config_util.get_config_prop('SNODAS_Download.prefetch_depth')
+    if prefetch_depth:
+        PREFETCH_DEPTH = int(prefetch_depth)
+
 
 if __name__ == '__main__':
     """
@@ -417,6 +430,17 @@ if __name__ == '__main__':
     # Keeps track of the dates that failed to download.
     list_of_download_fails = []
 
+    # If configured, download upcoming dates in the background while the current date is processed.
+    prefetcher = None
+    prefetch_dates = [datetime.strptime(date, '%Y%m%d') for date in datesToProcess if date != 'None']
+    if PREFETCH_DEPTH > 0 and len(prefetch_dates) > 1:
+        prefetch_transport = snodas_util.create_snodas_transport()
+        prefetcher = prefetch_util.Prefetcher(
+            prefetch_dates,
+            lambda single_date: snodas_util.download_snodas(download_path, single_date, None, prefetch_transport),
+            PREFETCH_DEPTH, prefetch_transport.close)
+        prefetcher.start()
+
     for date in datesToProcess:
 
         # Only process the rest of the script if there are dates that have not previously been processed.
@@ -428,7 +452,11 @@ if __name__ == '__main__':
             # ftp://sidads.colorado.edu/DATASETS/NOAA/G02158/masked/.
             # Returned list contains a download timestamp and information
             # on the values of the configurable optional statistics.
-            returnedList = snodas_util.download_snodas(download_path, date_dateTimeFormat)
+            # If prefetching, wait for the background download of the date to complete.
+            if prefetcher:
+                returnedList = prefetcher.get(date_dateTimeFormat)
+            else:
+                returnedList = snodas_util.download_snodas(download_path, date_dateTimeFormat)
             # Determine whether the date failed to download and store in list_of_download_fails for future use.
             list_of_download_fails.append(returnedList[2])
 
@@ -571,18 +599,13 @@ if __name__ == '__main__':
                     elapsed_zStats = zStats_time_end - zStats_time_start
                     print('elapsed_z_stats time: {:.3f} seconds'.format(elapsed_snowCover))
 
-                    # If desired, zip files of output shapefile (both today's data and latestDate file).
+                    # If desired, zip files of output shapefile for today's data.
+                    # The zip file is compressed in the background and replaced when complete,
+                    # and the latestDate zip file is created from it.
                     if SHP_ZIP.upper() == 'TRUE':
                         for file in os.listdir(results_date_path):
                             if date in file and file.endswith('.shp'):
                                 snodas_util.zip_shapefile(file, results_date_path, DEL_SHP_ORIG)
-                            if 'LatestDate' in file and file.endswith('.shp'):
-                                zip_full_path = results_date_path / 'SnowpackStatisticsByDate_LatestDate.zip'
-
-                                if zip_full_path.exists():
-                                    zip_full_path.unlink()
-
-                                snodas_util.zip_shapefile(file, results_date_path, DEL_SHP_ORIG)
 
                     # If desired, run TSTool for the day.
                     if RUN_DAILY_TSTOOL.upper() == 'TRUE':
@@ -601,12 +624,23 @@ if __name__ == '__main__':
                         'See configuration file. The value of the SaveAllSNODASParameters section is not valid.'
                         'Please type in "True" or "False" and rerun the script.', exc_info=True)
 
+    if prefetcher:
+        # Stop background downloads in case processing ended early.
+        prefetcher.stop()
+
     # Log list_of_download_fails for troubleshooting purposes.
     logger.info('Download fails: {}'.format(list_of_download_fails))
 
+    # Wait for the zip files that are compressed in the background,
+    # because the following steps update and upload the output files.
+    snodas_util.wait_for_compression()
+
     # Remove any duplicates that occurred in the byBasin csv files (this scenario is rare but could happen).
     snodas_util.clean_duplicates_from_by_basin_csv(results_basin_path)
 
+    # Calculate the SWE volume 1-week change from the stored volumes for all dates.
+    snodas_util.update_one_week_change(results_basin_path, results_date_path)
+
     # If the RUN_DAILY_TSTOOL is set to False, run the historical processing of TSTool.
     if 'None' in list_of_download_fails and RUN_HIST_TSTOOL.upper() == 'TRUE':
         # Create SNODAS SWE time series graph with TSTool program.
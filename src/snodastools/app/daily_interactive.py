@@ -20,6 +20,7 @@ The computational functions are located in the snodas_util.py module, which incl
 # Import necessary modules.
 import argparse
 import configparser
+import functools
 import glob
 import logging
 import os
@@ -27,6 +28,8 @@ import snodastools.app.version as version
 import snodastools.util.config_util as config_util
 import snodastools.util.log_util as log_util
 import snodastools.util.os_util as os_util
+import snodastools.util.prefetch_util as prefetch_util
+import snodastools.util.process_pool_util as process_pool_util
 import snodastools.util.snodas_util as snodas_util
 import sys
 import tempfile
@@ -88,6 +91,16 @@ from qgis.core import QgsApplication
 #
 # KEEP_FILES: Whether to keep intermediate files.
 # Set to 'True' to keep all intermediate files or 'False' (default) to clean up to save disk space.
+#
+# STREAM_EXTRACT: Whether to extract the needed SNODAS product files while the .tar file is downloaded.
+# Set to 'True' to stream-extract (the .tar file is not saved) or 'False' (default) to save and then untar the file.
+# Stream extraction is only used when SAVE_ALL_SNODAS_PARAMS is 'False'.
+#
+# PREFETCH_DEPTH: The number of dates to download in the background, ahead of the date that is being processed.
+# Set to 0 (default) to download each date just before it is processed.
+#
+# WORKERS: The number of worker processes used to download and process the rasters for multiple dates in parallel.
+# Set to 1 (default) to process one date at a time, or 0 to use the number of CPUs.
 
 
 # Declare application variables:
@@ -125,6 +138,13 @@ SAVE_ALL_SNODAS_PARAMS: str or None = None
 
 KEEP_FILES: str or None = None
 
+STREAM_EXTRACT: str or None = None
+PREFETCH_DEPTH: int = 0
+WORKERS: int = 1
+
+# QGIS application in a worker process, which is kept so that it is not garbage collected.
+worker_qgs: QgsApplication or None = None
+
 # Command line absolute path to SNODAS Tools implementation root:
 # - this folder will have config as a sub-folder
 command_line_snodas_root: str or None = None
@@ -167,6 +187,45 @@ def arg_parse() -> None:
         command_line_snodas_root = args.snodas
 
 
+def download_and_process_date_rasters(current: date, download_path: Path, set_format_path: Path, clip_path: Path,
+                                      snow_cover_path: Path, extent_shapefile: Path,
+                                      extract_folder: Path or None) -> list:
+    """
+    Download the SNODAS .tar file for a date and process the rasters, called in a worker process.
+    See process_date_rasters for the parameters that are not described here.
+    extract_folder: folder for stream-extracted files, or None to save the .tar file
+    Returns: the list returned by snodas_util.download_snodas
+    """
+    download_metadata = snodas_util.download_snodas(download_path, current, extract_folder)
+
+    # If the optional statistics configuration values are not valid, the calling code prints an error message
+    # and stops processing.
+    for stat in download_metadata[1]:
+        if stat.upper() != 'TRUE' and stat.upper() != 'FALSE':
+            return download_metadata
+
+    process_date_rasters(current, download_path, set_format_path, clip_path, snow_cover_path, extent_shapefile)
+    return download_metadata
+
+
+def init_worker(config_file_path: Path) -> None:
+    """
+    Initialize a worker process that processes dates in parallel.
+    The worker process is started with a new Python interpreter so the configuration file is read again
+    and QGIS is initialized.  GDAL is initialized when the SNODAS Tools modules are imported.
+    Logging is configured by process_pool_util to send log messages to the main process.
+    config_file_path: path to the SNODAS Tools configuration file
+    """
+    global worker_qgs
+
+    config_util.read_config_file(config_file_path)
+    set_config_globals()
+
+    QgsApplication.setPrefixPath('/usr', True)
+    worker_qgs = QgsApplication([], False)
+    worker_qgs.initQgis()
+
+
 def print_version() -> None:
     """
     Print the program version.
@@ -186,6 +245,160 @@ def print_version() -> None:
     print("", file=sys.stderr)
 
 
+def process_date_rasters(current: date, download_path: Path, set_format_path: Path, clip_path: Path,
+                         snow_cover_path: Path, extent_shapefile: Path) -> None:
+    """
+    Process the SNODAS rasters for a date, from the downloaded .tar file to the clipped and projected rasters
+    and the snow cover raster.
+    The steps for a date do not depend on other dates so dates can be processed in parallel,
+    in which case this function is called in a worker process (see download_and_process_date_rasters).
+    current: the date to process
+    download_path: folder containing the downloaded .tar file
+    set_format_path: folder for the extracted and formatted files
+    clip_path: folder for the clipped and projected rasters
+    snow_cover_path: folder for the snow cover rasters
+    extent_shapefile: the extent shapefile used to clip the rasters, which must exist
+    """
+    logger = logging.getLogger(__name__)
+
+    current_date_str = snodas_util.format_date_yyyymmdd(current)
+
+    # Untar current date's data:
+    # - the filename is like:
+    #     SNODAS_20230424.tar
+    # - should be only one file but use a loop to simplify logic and have control over file names below
+    # - the tar file is not zipped because files within the tar file are zipped and are handled below
+    # - the tar file contains multiple SNODAS output data types in separate files
+    for tar_file_path in snodas_util.list_dir(download_path, '*' + current_date_str + '*.tar'):
+        snodas_util.untar_snodas_file(tar_file_path, download_path, set_format_path)
+
+    # Check to see if configuration file 'SAVE_ALL_SNODAS_PARAMS' value is valid:
+    # - if invalid, the remaining steps are not run and the calling code prints an error message
+    if SAVE_ALL_SNODAS_PARAMS.upper() != 'FALSE' and SAVE_ALL_SNODAS_PARAMS.upper() != 'TRUE':
+        return
+
+    if SAVE_ALL_SNODAS_PARAMS.upper() == 'FALSE':
+        # Delete current date's irrelevant files (parameters other than SWE):
+        # - only files with 1034 in the file name are kept
+        # - this substring does not match any valid date so OK to filter it and 'current_date_str'
+        # - use a for loop because multiple files
+        # TODO smalers 2023-04-25 don't know why the following log message is not printed to console or log.
+        logger.info('Start deleting unused data files (data types are not of interest):')
+        for data_file_path in snodas_util.list_dir(set_format_path, '*' + current_date_str + '*'):
+            snodas_util.delete_irrelevant_snodas_files(data_file_path)
+        logger.info('  Finished deleting unused data files.')
+    else:
+        # Move irrelevant files (parameters other than SWE) to 'OtherSNODASParameters':
+        # - want to keep files for data types in addition to SWE
+        # - use a for loop because multiple files
+        # - messages are printed in the called function
+        parameter_path = set_format_path / 'OtherParameters'
+        if not parameter_path.exists():
+            parameter_path.mkdir()
+        for file in snodas_util.list_dir(set_format_path, '*' + current_date_str + '*'):
+            snodas_util.move_irrelevant_snodas_files(file, parameter_path)
+
+    # Extract current date's .gz files:
+    # - use a for loop because multiple files
+    # - each SNODAS parameter and header files are zipped within a .gz file, for example:
+    #     us_ssmv11034tS__T0001TTNATS2023042405HP001.dat.gz
+    #     us_ssmv11034tS__T0001TTNATS2023042405HP001.txt.gz
+    # - there is only one file per zip file so the output is, for example:
+    #     us_ssmv11034tS__T0001TTNATS2023042405HP001.dat
+    #     us_ssmv11034tS__T0001TTNATS2023042405HP001.txt
+    for file in snodas_util.list_dir(set_format_path, '*' + current_date_str + '*.gz'):
+        snodas_util.extract_snodas_gz_file(file)
+
+    # Convert current date's SNODAS SWE .dat file into .bil format:
+    # - this just renames the file without any additional changes, so the output is, for example:
+    #     us_ssmv11034tS__T0001TTNATS2023042405HP001.bil
+    # - use a loop until file names are simpler to deal with and may enable other data types
+    for file in snodas_util.list_dir(set_format_path, '*' + current_date_str + '*.dat'):
+        snodas_util.convert_snodas_dat_to_bil(file)
+
+    # Create current date's custom .hdr file from the .txt file:
+    # - the file name will be like:
+    #     us_ssmv11034tS__T0001TTNATS2023042405HP001.hdr
+    # - to convert a custom .bil file into a .tif file, a custom .hdr with metadata must be created
+    # - refer to the function in the snodas_util.py for more information about the custom .hdr file.
+    # - use a loop until file names are simpler to deal with and may enable other data types
+    for bil_file_path in snodas_util.list_dir(set_format_path, '*' + current_date_str + '*.bil'):
+        snodas_util.create_snodas_hdr_file(bil_file_path)
+
+    # Convert current date's .bil files to .tif files:
+    # - just rename to something like:
+    #     us_ssmv11034tS__T0001TTNATS2023042405HP001.tif
+    # - use a loop until file names are simpler to deal with and may enable other data types
+    for bil_file_path in snodas_util.list_dir(set_format_path, '*' + current_date_str + '*.bil'):
+        snodas_util.convert_snodas_bil_to_tif(bil_file_path, set_format_path)
+
+    # Delete current date's .bil and .hdr files (default unless keeping).
+    if KEEP_FILES.upper() == "TRUE":
+        # Keep the intermediate files, used in troubleshooting.
+        pass
+    else:
+        # Delete current date's .bil and .hdr files.
+        for file in snodas_util.list_dir(set_format_path, ['*.bil', '*.hdr', '*.Hdr']):
+            if current_date_str in str(file):
+                snodas_util.delete_snodas_files(file)
+
+    # Copy the unclipped tif for the current date into CLIP_FOLDER, where it will be clipped:
+    # - input is the TIF from above, something like:
+    #     us_ssmv11034tS__T0001TTNATS2023042405HP001.tif
+    # - output is, for example in '3_ClipToExtent':
+    #     us_ssmv11034tS__T0001TTNATS2023042405HP001.tif
+    # - use a loop until file names are simpler to deal with
+    # - only SWE is copied, other products are clipped to the SWE grid after SWE is projected
+    for tif_file_path in snodas_util.list_dir(set_format_path, '*' + current_date_str + '*.tif'):
+        if snodas_util.get_snodas_product_code(tif_file_path.name) == '1034':
+            snodas_util.copy_snodas_tif_to_clip_folder(tif_file_path, clip_path)
+
+    # Assign datum to current date's .tif file (defaulted to WGS84):
+    # - input name is something like:
+    #     us_ssmv11034tS__T0001TTNATS2003093005HP001.tif
+    # - output is something like:
+    #     20030930_WGS84.tif
+    # - use the specific pattern because if rerunning the same day will have output that does not match
+    #   the required input pattern
+    # - use a loop until file names are simpler to deal with and may enable other data types
+    for tif_file_path in snodas_util.list_dir(clip_path, '*' + current_date_str + '*HP001.tif'):
+        snodas_util.assign_snodas_datum(tif_file_path, clip_path)
+
+    # Clip current date's .tif file to the extent of the basin shapefile.
+    # - unclipped input is, for example:
+    #     20030930_WGS84.tif
+    # - clipped output is, for example:
+    #     Clip_20030930.tif
+    # - use the specific pattern because if rerunning the same day will have output that does not match
+    #   the required input pattern
+    # - use a loop to check for existence and because may enable other data types
+    for tif_file_path in snodas_util.list_dir(clip_path, '*' + current_date_str + '*WGS84.tif'):
+        snodas_util.snodas_raster_clip(tif_file_path, extent_shapefile)
+
+    # Project current date's .tif file into desired projection:
+    # - default to NAD83 UTM Zone 13N for Colorado
+    # - input is, for example:
+    #     Clip_20030930.tif
+    # - output is, for example:
+    #     SNODAS_SWE_ClipAndProj_YYYYMMDD.tif
+    # - use the specific pattern because if rerunning the same day will have output that does not match
+    #   the required input pattern
+    # - use a loop to check for existence and because may enable other data types
+    for tif_file_path in snodas_util.list_dir(clip_path, 'Clip_*' + current_date_str + '*.tif'):
+        snodas_util.assign_snodas_projection(tif_file_path)
+
+    # Clip and project the other configured SNODAS products (for example snow depth) to the SWE grid:
+    # - all products are warped together, for example to:
+    #     SNODAS_SnowDepth_ClipAndProj_YYYYMMDD.tif
+    for tif_file_path in snodas_util.list_dir(clip_path, 'SNODAS_SWE*' + current_date_str + '*.tif'):
+        snodas_util.create_snodas_product_rasters(tif_file_path, set_format_path)
+
+    # Create current date's snow cover binary raster:
+    # - use a loop to check for existence and because may enable other data types
+    for tif_file_path in snodas_util.list_dir(clip_path, 'SNODAS_SWE*' + current_date_str + '*.tif'):
+        snodas_util.snow_coverage(tif_file_path, snow_cover_path)
+
+
 def set_config_globals() -> None:
     """
     Set application global variables using the configuration file properties that were previously read.
@@ -222,6 +435,10 @@ def set_config_globals() -> None:
 
     global KEEP_FILES
 
+    global STREAM_EXTRACT
+    global PREFETCH_DEPTH
+    global WORKERS
+
     # global QGIS_HOME = config_map('ProgramInstall')['qgis_pathname']
 
     SNODAS_ROOT = config_util.get_config_prop('Folders.root_folder')
@@ -261,6 +478,22 @@ def set_config_globals() -> None:
 
     KEEP_FILES = config_util.get_config_prop('Troubleshooting.keep_files')
 
+    STREAM_EXTRACT = config_util.get_config_prop('SNODAS_Download.stream_extract')
+    if not STREAM_EXTRACT:
+        # Default is to save the .tar file.
+        STREAM_EXTRACT = 'False'
+
+    prefetch_depth = config_util.get_config_prop('SNODAS_Download.prefetch_depth')
+    if prefetch_depth:
+        PREFETCH_DEPTH = int(prefetch_depth)
+
+    workers = config_util.get_config_prop('Processing.workers')
+    if workers:
+        WORKERS = int(workers)
+        if WORKERS == 0:
+            # Use all the CPUs.
+            WORKERS = os.cpu_count()
+
 
 def setup_logging(app_name: str, log_file_path: Path) -> None:
     """
@@ -578,297 +811,244 @@ if __name__ == '__main__':
     # Iterate through each day of the user-specified range.
     total_days = (end_date - start_date).days + 1
 
-    current = start_date
-    first_date = True
-    while current <= end_date:
-        if first_date:
-            # First date so 'current' is the initial value.
-            first_date = False
+    # If stream extraction is enabled, the needed files are written directly to the 'set format' folder.
+    if STREAM_EXTRACT.upper() == 'TRUE' and SAVE_ALL_SNODAS_PARAMS.upper() == 'FALSE':
+        extract_folder = set_format_path
+    else:
+        extract_folder = None
+
+    # Create the extent shapefile if not already created.
+    if not extent_shapefile.exists():
+        # Extent shapefile does not exist so attempt to create.
+        logger.info("The extent shapefile does not exist so attempt to create:")
+        logger.info("  {}".format(extent_shapefile))
+        if not BASIN_SHP_PATH:
+            # The basin boundaries shapefile does not exist:
+            # - this is a fatal error
+            logger.error("  The basin shapefile configuration property "
+                         "[BasinBoundaryShapefile] pathname is not defined.")
+            exit(1)
+        basin_shp_path = Path(BASIN_SHP_PATH)
+        if not basin_shp_path.exists():
+            # The source basin shapefile path does not exist:
+            # - this is fatal
+            logger.error("  The basin shapefile does not exist: {}")
+            logger.error("    {}".format(basin_shp_path))
+            logger.error("    Confirm that '[BasinBoundaryShapefile] pathname' is defined "
+                         "in the configuration file.")
+            exit(1)
         else:
-            # Advance the date.
-            current += timedelta(days=1)
-            if current > end_date:
-                break
+            # Basin boundaries shapefile exists so use it to create the extent file.
+            snodas_util.create_extent(BASIN_SHP_PATH, static_path)
+
+    # If configured, download and process the rasters for multiple dates in parallel worker processes:
+    # - the zonal statistics are calculated below in this process, one date at a time,
+    #   because the results for each date are added to the same by basin .csv files
+    # - the SWE volume 1-week change is calculated for all dates after the last date is processed,
+    #   so it does not depend on the order in which the dates are processed
+    # If configured, download upcoming dates in the background while the current date is processed:
+    # - one connection is used for all the background downloads
+    # - not used when processing in parallel because each worker downloads its dates
+    pool = None
+    prefetcher = None
+    if WORKERS > 1 and total_days > 1:
+        logger.info('Processing SNODAS rasters for {} dates using {} worker processes.'.format(total_days, WORKERS))
+        pool = process_pool_util.DateProcessPool(
+            [start_date + timedelta(days=i) for i in range(total_days)],
+            functools.partial(download_and_process_date_rasters, download_path=download_path,
+                              set_format_path=set_format_path, clip_path=clip_path,
+                              snow_cover_path=snow_cover_path, extent_shapefile=extent_shapefile,
+                              extract_folder=extract_folder),
+            WORKERS, init_worker, (config_file_path,))
+        pool.start()
+    elif PREFETCH_DEPTH > 0 and total_days > 1:
+        prefetch_transport = snodas_util.create_snodas_transport()
+        prefetcher = prefetch_util.Prefetcher(
+            [start_date + timedelta(days=i) for i in range(total_days)],
+            lambda single_date: snodas_util.download_snodas(download_path, single_date, extract_folder,
+                                                            prefetch_transport),
+            PREFETCH_DEPTH, prefetch_transport.close)
+        prefetcher.start()
+
+    # Stop the background processing even if processing a date fails,
+    # so that worker processes and threads do not keep running.
+    try:
+        current = start_date
+        first_date = True
+        while current <= end_date:
+            if first_date:
+                # First date so 'current' is the initial value.
+                first_date = False
+            else:
+                # Advance the date.
+                current += timedelta(days=1)
+                if current > end_date:
+                    break
 
-        # The start time is used to calculate the elapsed time of the running script.
-        # The elapsed time will be displayed at the end of the log file.
-        start_time = time.time()
-
-        # Format date into string with format YYYYMMDD:
-        # - the current date is used to match files in folders and name output files
-        current_date_str = snodas_util.format_date_yyyymmdd(current)
-        current_date_tar = 'SNODAS_' + current_date_str + '.tar'
-        logger.info("Processing SNODAS for {}".format(current_date_str))
-        print("Processing SNODAS for current={}, current_date_str={}".format(current, current_date_str))
-
-        # Check to see if this date for data has already been processed in the folder.
-        possible_file = download_path / current_date_tar
-
-        if possible_file.exists():
-            # The download & zonal statistics are rerun:
-            # - print a message explaining that the old files will be overwritten
-            logger.info('This date ({}) has previously been processed.'.format(current_date_str))
-            logger.info('The files will be reprocessed and rewritten.')
-
-        # Download current date SNODAS .tar file from the FTP site using configuration file properties:
-        # - for example:
-        #     ftp://sidads.colorado.edu/DATASETS/NOAA/G02158/masked/
-        # - downloadMetadataList is a list of several pieces of information (see the download function for details)
-        downloadMetadataList = snodas_util.download_snodas(download_path, current)
-
-        failed_dates_lst.append(downloadMetadataList[2])
-
-        # Check to see if configuration values for optional statistics, as defined in the utility function, are valid:
-        #   'calculate_SWE_minimum'
-        #   'calculate_SWE_maximum'
-        #   'calculate_SWE_stdDev'
-        # If valid, the script continues to run.
-        # If invalid, an error message is printed to console and the log file and script is terminated.
-        valid_list = []
-        for stat in downloadMetadataList[1]:
-            if stat.upper() == 'TRUE' or stat.upper() == 'FALSE':
-                valid_list.append(1)
+            # The start time is used to calculate the elapsed time of the running script.
+            # The elapsed time will be displayed at the end of the log file.
+            start_time = time.time()
+
+            # Format date into string with format YYYYMMDD:
+            # - the current date is used to match files in folders and name output files
+            current_date_str = snodas_util.format_date_yyyymmdd(current)
+            current_date_tar = 'SNODAS_' + current_date_str + '.tar'
+            logger.info("Processing SNODAS for {}".format(current_date_str))
+            print("Processing SNODAS for current={}, current_date_str={}".format(current, current_date_str))
+
+            # Check to see if this date for data has already been processed in the folder.
+            possible_file = download_path / current_date_tar
+
+            if possible_file.exists():
+                # The download & zonal statistics are rerun:
+                # - print a message explaining that the old files will be overwritten
+                logger.info('This date ({}) has previously been processed.'.format(current_date_str))
+                logger.info('The files will be reprocessed and rewritten.')
+
+            # Download current date SNODAS .tar file from the FTP site using configuration file properties:
+            # - for example:
+            #     ftp://sidads.colorado.edu/DATASETS/NOAA/G02158/masked/
+            # - downloadMetadataList is a list of several pieces of information (see the download function for details)
+            # - if stream extraction is enabled, the needed files are written directly to the 'set format' folder
+            #   and the untar and delete steps below will not find any files to process
+            # - if prefetching, wait for the background download of the date to complete
+            # - if processing in parallel, wait for the worker process to download and process the rasters for the date
+            if pool:
+                downloadMetadataList = pool.get(current)
+            elif prefetcher:
+                downloadMetadataList = prefetcher.get(current)
             else:
-                valid_list.append(0)
+                downloadMetadataList = snodas_util.download_snodas(download_path, current, extract_folder)
+
+            failed_dates_lst.append(downloadMetadataList[2])
+
+            # Check to see if configuration values for optional statistics, as defined in the utility function,
+            # are valid:
+            #   'calculate_SWE_minimum'
+            #   'calculate_SWE_maximum'
+            #   'calculate_SWE_stdDev'
+            # If valid, the script continues to run.
+            # If invalid, an error message is printed to console and the log file and script is terminated.
+            valid_list = []
+            for stat in downloadMetadataList[1]:
+                if stat.upper() == 'TRUE' or stat.upper() == 'FALSE':
+                    valid_list.append(1)
+                else:
+                    valid_list.append(0)
 
-        if 0 in valid_list:
-            logger.error(
-                'See configuration file. One or more values of the "OptionalZonalStatistics" section is '
-                'not valid. Change values to either "True" or "False" and rerun the script.', exc_info=True)
-            break
+            if 0 in valid_list:
+                logger.error(
+                    'See configuration file. One or more values of the "OptionalZonalStatistics" section is '
+                    'not valid. Change values to either "True" or "False" and rerun the script.', exc_info=True)
+                break
 
-        else:
-            # Untar current date's data:
-            # - the filename is like:
-            #     SNODAS_20230424.tar
-            # - should be only one file but use a loop to simplify logic and have control over file names below
-            # - the tar file is not zipped because files within the tar file are zipped and are handled below
-            # - the tar file contains multiple SNODAS output data types in separate files
-            for tar_file_path in snodas_util.list_dir(download_path, '*' + current_date_str + '*.tar'):
-                snodas_util.untar_snodas_file(tar_file_path, download_path, set_format_path)
-
-            # Check to see if configuration file 'SAVE_ALL_SNODAS_PARAMS' value is valid.
-            # If valid (true or false), the script continues to run.
-            # If invalid, an error message is printed to the console and the log file and the script is terminated.
-            #logger.info('Should save all SNODAS parameter data files? {}'.format(SAVE_ALL_SNODAS_PARAMS))
-            if SAVE_ALL_SNODAS_PARAMS.upper() == 'FALSE' or SAVE_ALL_SNODAS_PARAMS.upper() == 'TRUE':
-
-                if SAVE_ALL_SNODAS_PARAMS.upper() == 'FALSE':
-                    # Delete current date's irrelevant files (parameters other than SWE):
-                    # - only files with 1034 in the file name are kept
-                    # - this substring does not match any valid date so OK to filter it and 'current_date_str'
-                    # - use a for loop because multiple files
-                    # TODO smalers 2023-04-25 don't know why the following log message is not printed to console or log.
-                    logger.info('Start deleting unused data files (data types are not of interest):')
-                    for data_file_path in snodas_util.list_dir(set_format_path, '*' + current_date_str + '*'):
-                        snodas_util.delete_irrelevant_snodas_files(data_file_path)
-                    logger.info('  Finished deleting unused data files.')
-                else:
-                    # Move irrelevant files (parameters other than SWE) to 'OtherSNODASParameters':
-                    # - want to keep files for data types in addition to SWE
-                    # - use a for loop because multiple files
-                    # - messages are printed in the called function
-                    parameter_path = set_format_path / 'OtherParameters'
-                    if not parameter_path.exists():
-                        parameter_path.mkdir()
-                    for file in snodas_util.list_dir(set_format_path, '*' + current_date_str + '*'):
-                        snodas_util.move_irrelevant_snodas_files(file, parameter_path)
-
-                # Extract current date's .gz files:
-                # - use a for loop because multiple files
-                # - each SNODAS parameter and header files are zipped within a .gz file, for example:
-                #     us_ssmv11034tS__T0001TTNATS2023042405HP001.dat.gz
-                #     us_ssmv11034tS__T0001TTNATS2023042405HP001.txt.gz
-                # - there is only one file per zip file so the output is, for example:
-                #     us_ssmv11034tS__T0001TTNATS2023042405HP001.dat
-                #     us_ssmv11034tS__T0001TTNATS2023042405HP001.txt
-                for file in snodas_util.list_dir(set_format_path, '*' + current_date_str + '*.gz'):
-                    snodas_util.extract_snodas_gz_file(file)
-
-                # Convert current date's SNODAS SWE .dat file into .bil format:
-                # - this just renames the file without any additional changes, so the output is, for example:
-                #     us_ssmv11034tS__T0001TTNATS2023042405HP001.bil
-                # - use a loop until file names are simpler to deal with and may enable other data types
-                for file in snodas_util.list_dir(set_format_path, '*' + current_date_str + '*.dat'):
-                    snodas_util.convert_snodas_dat_to_bil(file)
-
-                # Create current date's custom .hdr file from the .txt file:
-                # - the file name will be like:
-                #     us_ssmv11034tS__T0001TTNATS2023042405HP001.hdr
-                # - to convert a custom .bil file into a .tif file, a custom .hdr with metadata must be created
-                # - refer to the function in the snodas_util.py for more information about the custom .hdr file.
-                # - use a loop until file names are simpler to deal with and may enable other data types
-                for bil_file_path in snodas_util.list_dir(set_format_path, '*' + current_date_str + '*.bil'):
-                    snodas_util.create_snodas_hdr_file(bil_file_path)
-
-                # Convert current date's .bil files to .tif files:
-                # - just rename to something like:
-                #     us_ssmv11034tS__T0001TTNATS2023042405HP001.tif
-                # - use a loop until file names are simpler to deal with and may enable other data types
-                for bil_file_path in snodas_util.list_dir(set_format_path, '*' + current_date_str + '*.bil'):
-                    snodas_util.convert_snodas_bil_to_tif(bil_file_path, set_format_path)
-
-                # Delete current date's .bil and .hdr files (default unless keeping).
-                if KEEP_FILES.upper() == "TRUE":
-                    # Keep the intermediate files, used in troubleshooting.
-                    pass
-                else:
-                    # Delete current date's .bil and .hdr files.
-                    for file in snodas_util.list_dir(set_format_path, ['*.bil', '*.hdr', '*.Hdr']):
-                        if current_date_str in str(file):
-                            snodas_util.delete_snodas_files(file)
-
-                # Create the extent shapefile if not already created.
-                if not extent_shapefile.exists():
-                    # Extent shapefile does not exist so attempt to create.
-                    logger.info("The extent shapefile does not exist so attempt to create:")
-                    logger.info("  {}".format(extent_shapefile))
-                    if not BASIN_SHP_PATH:
-                        # The basin boundaries shapefile does not exist:
-                        # - this is a fatal error
-                        logger.error("  The basin shapefile configuration property "
-                                     "[BasinBoundaryShapefile] pathname is not defined.")
-                        exit(1)
+            else:
+                if not pool:
+                    # Process the rasters for the date in this process:
+                    # - if processing in parallel, this was done in a worker process
+                    process_date_rasters(current, download_path, set_format_path, clip_path, snow_cover_path,
+                                         extent_shapefile)
+
+                # Check to see if configuration file 'SAVE_ALL_SNODAS_PARAMS' value is valid.
+                # If valid (true or false), the script continues to run.
+                # If invalid, an error message is printed to the console and the log file and the script is terminated.
+                #logger.info('Should save all SNODAS parameter data files? {}'.format(SAVE_ALL_SNODAS_PARAMS))
+                if SAVE_ALL_SNODAS_PARAMS.upper() == 'FALSE' or SAVE_ALL_SNODAS_PARAMS.upper() == 'TRUE':
+
+                    # Create .csv files for ByBasin and ByDate:
+                    # - use a loop to check for existence and because may enable other data types
+                    # - use the specific pattern because if rerunning the same day will have output that does not match
+                    #   the required input pattern
+                    # - the files will only be created if they don't already exist (otherwise would lose data)
                     basin_shp_path = Path(BASIN_SHP_PATH)
-                    if not basin_shp_path.exists():
-                        # The source basin shapefile path does not exist:
-                        # - this is fatal
-                        logger.error("  The basin shapefile does not exist: {}")
-                        logger.error("    {}".format(basin_shp_path))
-                        logger.error("    Confirm that '[BasinBoundaryShapefile] pathname' is defined "
-                                     "in the configuration file.")
-                        exit(1)
-                    else:
-                        # Basin boundaries shapefile exists so use it to create the extent file.
-                        snodas_util.create_extent(BASIN_SHP_PATH, static_path)
-
-                # Copy the unclipped tif for the current date into CLIP_FOLDER, where it will be clipped:
-                # - input is the TIF from above, something like:
-                #     us_ssmv11034tS__T0001TTNATS2023042405HP001.tif
-                # - output is, for example in '3_ClipToExtent':
-                #     us_ssmv11034tS__T0001TTNATS2023042405HP001.tif
-                # - use a loop until file names are simpler to deal with and may enable other data types
-                for tif_file_path in snodas_util.list_dir(set_format_path, '*' + current_date_str + '*.tif'):
-                    snodas_util.copy_snodas_tif_to_clip_folder(tif_file_path, clip_path)
-
-                # Assign datum to current date's .tif file (defaulted to WGS84):
-                # - input name is something like:
-                #     us_ssmv11034tS__T0001TTNATS2003093005HP001.tif
-                # - output is something like:
-                #     20030930_WGS84.tif
-                # - use the specific pattern because if rerunning the same day will have output that does not match
-                #   the required input pattern
-                # - use a loop until file names are simpler to deal with and may enable other data types
-                for tif_file_path in snodas_util.list_dir(clip_path, '*' + current_date_str + '*HP001.tif'):
-                    snodas_util.assign_snodas_datum(tif_file_path, clip_path)
-
-                # Clip current date's .tif file to the extent of the basin shapefile.
-                # - unclipped input is, for example:
-                #     20030930_WGS84.tif
-                # - clipped output is, for example:
-                #     Clip_20030930.tif
-                # - use the specific pattern because if rerunning the same day will have output that does not match
-                #   the required input pattern
-                # - use a loop to check for existence and because may enable other data types
-                for tif_file_path in snodas_util.list_dir(clip_path, '*' + current_date_str + '*WGS84.tif'):
-                    snodas_util.snodas_raster_clip(tif_file_path, extent_shapefile)
-
-                # Project current date's .tif file into desired projection:
-                # - default to NAD83 UTM Zone 13N for Colorado
-                # - input is, for example:
-                #     Clip_20030930.tif
-                # - output is, for example:
-                #     SNODAS_SWE_ClipAndProj_YYYYMMDD.tif
-                # - use the specific pattern because if rerunning the same day will have output that does not match
-                #   the required input pattern
-                # - use a loop to check for existence and because may enable other data types
-                for tif_file_path in snodas_util.list_dir(clip_path, 'Clip_*' + current_date_str + '*.tif'):
-                    snodas_util.assign_snodas_projection(tif_file_path)
-
-                # Create current date's snow cover binary raster:
-                # - use a loop to check for existence and because may enable other data types
-                for tif_file_path in snodas_util.list_dir(clip_path, 'SNODAS_SWE*' + current_date_str + '*.tif'):
-                     snodas_util.snow_coverage(tif_file_path, snow_cover_path)
-
-                # Create .csv files for ByBasin and ByDate:
-                # - use a loop to check for existence and because may enable other data types
-                # - use the specific pattern because if rerunning the same day will have output that does not match
-                #   the required input pattern
-                # - the files will only be created if they don't already exist (otherwise would lose data)
-                basin_shp_path = Path(BASIN_SHP_PATH)
-                for tif_file_path in snodas_util.list_dir(clip_path, 'SNODAS_SWE*' + current_date_str + '*.tif'):
-                    snodas_util.create_empty_csv_files(tif_file_path, basin_shp_path, results_date_path,
-                                                       results_basin_path)
-
-                # Delete rows from basin CSV files if the date is being reprocessed:
-                # - this ensures that duplicate rows for the current date are not output to results
-                # - use the specific pattern because if rerunning the same day will have output that does not match
-                #   the required input pattern
-                # - use a loop to check for existence and because may enable other data types
-                for tif_file_path in snodas_util.list_dir(clip_path, 'SNODAS_SWE*' + current_date_str + '*.tif'):
-                    snodas_util.delete_by_basin_csv_rows_for_date(tif_file_path, basin_shp_path, results_basin_path)
-
-                # Calculate zonal statistics and export results:
-                # - use the specific pattern because if rerunning the same day will have output that does not match
-                #   the required input pattern
-                for tif_file_path in snodas_util.list_dir(clip_path, 'SNODAS_SWE*' + current_date_str + '*.tif'):
-                    snodas_util.z_stat_and_export(tif_file_path, basin_shp_path, results_basin_path, results_date_path,
-                                                  clip_path, snow_cover_path, current,
-                                                  downloadMetadataList[0], OUTPUT_CRS)
-
-                # If configured, zip the shapefile files (both today's data and latestDate file).
-                if SHP_ZIP.upper() == 'TRUE':
-                    for shp_file_path in snodas_util.list_dir(results_date_path, '*.shp'):
-                        if current_date_str in str(shp_file_path):
-                            snodas_util.zip_shapefile(shp_file_path, results_date_path, DEL_SHP_ORIG)
-                        if 'LatestDate' in str(shp_file_path):
-                            zip_full_path = results_date_path / 'SnowpackStatisticsByDate_LatestDate.zip'
-                            if zip_full_path.exists():
-                                zip_full_path.unlink()
-                            snodas_util.zip_shapefile(shp_file_path, results_date_path, DEL_SHP_ORIG)
-
-                # If configured, the time series will run for each processed date of data.
-                if RUN_DAILY_TSTOOL.upper() == 'TRUE':
-                    snodas_util.create_snodas_swe_graphs()
-
-                # If it is the last date in the range, continue.
-                if current == end_date:
-
-                    # Remove any duplicates that occurred in the byBasin csv files (rare but could happen).
-                    snodas_util.clean_duplicates_from_by_basin_csv(results_basin_path)
-
-                    # If configured, the time series will run for the entire historical range.
-                    if RUN_HIST_TSTOOL.upper() == 'TRUE':
+                    for tif_file_path in snodas_util.list_dir(clip_path, 'SNODAS_SWE*' + current_date_str + '*.tif'):
+                        snodas_util.create_empty_csv_files(tif_file_path, basin_shp_path, results_date_path,
+                                                           results_basin_path)
+
+                    # Delete rows from basin CSV files if the date is being reprocessed:
+                    # - this ensures that duplicate rows for the current date are not output to results
+                    # - use the specific pattern because if rerunning the same day will have output that does not match
+                    #   the required input pattern
+                    # - use a loop to check for existence and because may enable other data types
+                    for tif_file_path in snodas_util.list_dir(clip_path, 'SNODAS_SWE*' + current_date_str + '*.tif'):
+                        snodas_util.delete_by_basin_csv_rows_for_date(tif_file_path, basin_shp_path, results_basin_path)
+
+                    # Calculate zonal statistics and export results:
+                    # - use the specific pattern because if rerunning the same day will have output that does not match
+                    #   the required input pattern
+                    for tif_file_path in snodas_util.list_dir(clip_path, 'SNODAS_SWE*' + current_date_str + '*.tif'):
+                        snodas_util.z_stat_and_export(tif_file_path, basin_shp_path, results_basin_path,
+                                                      results_date_path, clip_path, snow_cover_path, current,
+                                                      downloadMetadataList[0], OUTPUT_CRS)
+
+                    # If configured, zip the shapefile files for today's data:
+                    # - the files are compressed in the background while the next date is processed
+                    # - the zip files are replaced when complete, so the existing zip files are not deleted first
+                    # - the latestDate zip file is created from today's zip file when it is complete
+                    if SHP_ZIP.upper() == 'TRUE':
+                        for shp_file_path in snodas_util.list_dir(results_date_path, '*.shp'):
+                            if current_date_str in str(shp_file_path):
+                                snodas_util.zip_shapefile(shp_file_path, results_date_path, DEL_SHP_ORIG)
+
+                    # If configured, the time series will run for each processed date of data.
+                    if RUN_DAILY_TSTOOL.upper() == 'TRUE':
                         snodas_util.create_snodas_swe_graphs()
 
-                    # Push daily statistics to the web if configuration property is set to 'True'.
-                    if UPLOAD_TO_S3.upper() == 'TRUE':
-                        snodas_util.push_to_aws()
-                    if UPLOAD_TO_GCP.upper() == 'TRUE':
-                        snodas_util.push_to_gcp()
-                    if UPLOAD_TO_S3.upper() != 'TRUE' and UPLOAD_TO_GCP.upper() != 'TRUE':
-                        print('Neither AWS or GCP configuration properties are True. Skipping the push to the cloud.',
-                              file=sys.stderr)
-                        logger.info('Output files from SNODAS_Tools are not pushed to cloud storage '
-                                    'because of settings in configuration file. ', file=sys.stderr)
+                    # If it is the last date in the range, continue.
+                    if current == end_date:
 
-            else:
-                # If config file value SaveAllSNODASParameters is not a valid value ('True' or 'False'),
-                # the remaining script will not run and the following error message will be printed to the console
-                # and to the log file.
-                logger.error('See configuration file. The value of the SaveAllSNODASParameters section is not '
-                             'valid. Change to "True" or "False" and rerun the script.', exc_info=True)
-
-        # Display elapsed time of current date's processing in log.
-        end_time = time.time()
-        elapsed_time = end_time - start_time
-        logger.info('{}: Completed.'.format(current_date_str))
-        logger.info('Elapsed time (date: {}): {} seconds'.format(current_date_str, elapsed_time))
-
-        # TODO: jpkeahey 2021-06-22 - This called the function to mv all files onto the Host OS's shared folder.
-        # if DEV_ENVIRONMENT.upper() == 'TRUE':
-        #     mv_to_shared_dir([download_path, set_format_path, clip_path, snow_cover_path,
-        #                       results_basin_path, results_date_path])
+                        # Wait for the zip files that are compressed in the background,
+                        # because the following steps update and upload the output files.
+                        snodas_util.wait_for_compression()
+
+                        # Remove any duplicates that occurred in the byBasin csv files (rare but could happen).
+                        snodas_util.clean_duplicates_from_by_basin_csv(results_basin_path)
+
+                        # Calculate the SWE volume 1-week change from the stored volumes for all dates:
+                        # - this also fills in the change for dates that follow previously missing dates
+                        snodas_util.update_one_week_change(results_basin_path, results_date_path)
+
+                        # If configured, the time series will run for the entire historical range.
+                        if RUN_HIST_TSTOOL.upper() == 'TRUE':
+                            snodas_util.create_snodas_swe_graphs()
+
+                        # Push daily statistics to the web if configuration property is set to 'True'.
+                        if UPLOAD_TO_S3.upper() == 'TRUE':
+                            snodas_util.push_to_aws()
+                        if UPLOAD_TO_GCP.upper() == 'TRUE':
+                            snodas_util.push_to_gcp()
+                        if UPLOAD_TO_S3.upper() != 'TRUE' and UPLOAD_TO_GCP.upper() != 'TRUE':
+                            print('Neither AWS or GCP configuration properties are True. '
+                                  'Skipping the push to the cloud.', file=sys.stderr)
+                            logger.info('Output files from SNODAS_Tools are not pushed to cloud storage '
+                                        'because of settings in configuration file. ', file=sys.stderr)
+
+                else:
+                    # If config file value SaveAllSNODASParameters is not a valid value ('True' or 'False'),
+                    # the remaining script will not run and the following error message will be printed to the console
+                    # and to the log file.
+                    logger.error('See configuration file. The value of the SaveAllSNODASParameters section is not '
+                                 'valid. Change to "True" or "False" and rerun the script.', exc_info=True)
+
+            # Display elapsed time of current date's processing in log.
+            end_time = time.time()
+            elapsed_time = end_time - start_time
+            logger.info('{}: Completed.'.format(current_date_str))
+            logger.info('Elapsed time (date: {}): {} seconds'.format(current_date_str, elapsed_time))
+
+            # TODO: jpkeahey 2021-06-22 - This called the function to mv all files onto the Host OS's shared folder.
+            # if DEV_ENVIRONMENT.upper() == 'TRUE':
+            #     mv_to_shared_dir([download_path, set_format_path, clip_path, snow_cover_path,
+            #                       results_basin_path, results_date_path])
+    finally:
+        if prefetcher:
+            # Stop background downloads in case processing ended early.
+            prefetcher.stop()
+        if pool:
+            # Stop the worker processes, cancelling dates that have not started in case processing ended early.
+            pool.stop()
+        # Wait for the zip files that are compressed in the background, in case processing ended early.
+        snodas_util.wait_for_compression()
 
     # Close logging including the elapsed time of the running script in seconds.
     elapsed = time.time() - start
@@ -901,10 +1081,10 @@ if __name__ == '__main__':
         for item in failed_dates_lst_updated:
             print(item, file=sys.stderr)
             logger.info('{}'.format(item))
-        print("\nDates that will be affected by assigning the 'SNODAS_SWE_Volume_1WeekChange_acft' attribute 'NULL' "
-              "due to the unsuccessful downloads: ", file=sys.stderr)
-        logger.info("\nDates that will be affected by assigning the 'SNODAS_SWE_Volume_1WeekChange_acft' attribute "
-                    "'NULL' due to the unsuccessful downloads: ")
+        print("\nDates that will have a 'SNODAS_SWE_Volume_1WeekChange_acft' attribute of 'NULL' "
+              "until the unsuccessful downloads are processed: ", file=sys.stderr)
+        logger.info("\nDates that will have a 'SNODAS_SWE_Volume_1WeekChange_acft' attribute of 'NULL' "
+                    "until the unsuccessful downloads are processed: ")
         for item in failed_dates_lst_1Week:
             print(item, file=sys.stderr)
             logger.info('{}'.format(item))
@@ -0,0 +1,156 @@
+"""
+This program runs a local HTTP server that stands in for the NSIDC SNODAS HTTPS site.
+It is used to test and time downloads without accessing NSIDC, for example when offline.
+
+The served folder must use the same layout as the 'masked' folder on the NSIDC site, for example:
+
+  folder/2023/04_Apr/SNODAS_20230424.tar
+
+The server supports what the HTTPS transport uses:
+
+  - HTTP/1.1 keep-alive connections
+  - folder listings (HTML links to files)
+  - 'Range' requests, to resume an interrupted download
+  - 'If-Modified-Since' requests, to skip a file that has not changed
+
+To use the server, run it and then set the following in the SNODAS Tools configuration file:
+
+  [SNODAS_Download]
+  transport = HTTPS
+  https_url = http://localhost:8080/
+
+Run with, for example:
+
+  python -m snodastools.app.http_standin_server --folder /path/to/masked --port 8080
+"""
+
+import argparse
+import http.server
+import os
+import re
+import sys
+import time
+
+from functools import partial
+
+import snodastools.app.version as version
+
+# Block size used when sending file contents.
+BLOCK_SIZE = 8192
+
+
+class StandinRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """
+    Request handler that adds 'Range' requests and an optional transfer rate limit to SimpleHTTPRequestHandler.
+    SimpleHTTPRequestHandler already handles folder listings and 'If-Modified-Since'.
+    """
+
+    # Use HTTP/1.1 so that connections are kept alive.
+    protocol_version = 'HTTP/1.1'
+
+    # Maximum transfer rate in bytes per second, or 0 to not limit.
+    bytes_per_second: int = 0
+
+    def __init__(self, *args, **kwargs):
+        # Number of bytes remaining to send for a 'Range' request, or None to send the whole file.
+        self.range_remaining = None
+        super().__init__(*args, **kwargs)
+
+    def copyfile(self, source, outputfile) -> None:
+        """
+        Copy the file contents to the output, limited to the requested range and transfer rate.
+        """
+        while True:
+            read_size = BLOCK_SIZE
+            if self.range_remaining is not None:
+                read_size = min(read_size, self.range_remaining)
+                if read_size <= 0:
+                    break
+            block = source.read(read_size)
+            if not block:
+                break
+            outputfile.write(block)
+            if self.range_remaining is not None:
+                self.range_remaining -= len(block)
+            if self.bytes_per_second > 0:
+                time.sleep(len(block) / self.bytes_per_second)
+
+    def send_head(self):
+        """
+        Send the response headers, handling a 'Range' request for a file.
+        """
+        self.range_remaining = None
+        range_header = self.headers.get('Range')
+        path = self.translate_path(self.path)
+        if not range_header or not os.path.isfile(path):
+            return super().send_head()
+
+        # Only a single range is supported, for example 'bytes=1000-' or 'bytes=1000-1999'.
+        match = re.fullmatch(r'bytes=(\d+)-(\d*)', range_header.strip())
+        if not match:
+            return super().send_head()
+
+        file_size = os.path.getsize(path)
+        start = int(match.group(1))
+        end = file_size - 1
+        if match.group(2):
+            end = min(int(match.group(2)), file_size - 1)
+        if start >= file_size or start > end:
+            self.send_response(416)
+            self.send_header('Content-Range', 'bytes */{}'.format(file_size))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return None
+
+        file = open(path, 'rb')
+        file.seek(start)
+        self.send_response(206)
+        self.send_header('Content-Type', self.guess_type(path))
+        self.send_header('Content-Range', 'bytes {}-{}/{}'.format(start, end, file_size))
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Last-Modified', self.date_time_string(int(os.path.getmtime(path))))
+        self.end_headers()
+        self.range_remaining = end - start + 1
+        return file
+
+
+def main() -> None:
+    """
+    Parse the command line and run the server until interrupted.
+    """
+    parser = argparse.ArgumentParser(prog='http_standin_server',
+                                     description='Local stand-in server for the NSIDC SNODAS HTTPS site.')
+    parser.add_argument('--version', action="store_true", help='Print program version.')
+    parser.add_argument("--folder", default=".",
+                        help="Folder to serve, with the same layout as the NSIDC 'masked' folder (default is current).")
+    parser.add_argument("--bind", default="127.0.0.1", help="Address to listen on (default is 127.0.0.1).")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on (default is 8080).")
+    parser.add_argument("--bytes-per-second", type=int, default=0,
+                        help="Limit the transfer rate to simulate a slow network (default is no limit).")
+    args = parser.parse_args()
+
+    if args.version:
+        print("http_standin_server version " + version.app_version, file=sys.stderr)
+        exit(0)
+
+    if not os.path.isdir(args.folder):
+        print("Folder does not exist: {}".format(args.folder), file=sys.stderr)
+        exit(1)
+
+    StandinRequestHandler.bytes_per_second = args.bytes_per_second
+    handler = partial(StandinRequestHandler, directory=os.path.abspath(args.folder))
+    server = http.server.ThreadingHTTPServer((args.bind, args.port), handler)
+    print("Serving {} at http://{}:{}/".format(os.path.abspath(args.folder), args.bind, args.port), file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Stopping server.", file=sys.stderr)
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    """
+    Main program entry point into this program.
+    """
+    main()
@@ -0,0 +1,166 @@
+"""
+This module contains functions to read the basin boundary shapefile once and cache the basins in memory.
+
+The basin features (identifiers, names, other attributes, and geometry) are the same for every date,
+so they are read from the shapefile the first time they are needed and are then used for all dates.
+The cached basins are not changed after they are read, so they can be used by multiple threads.
+Per-date processing that needs to add fields to the basins (for example, the zonal statistics)
+uses a new memory layer created from the cached basins, so the shapefile is never edited.
+
+The cache is invalidated by the hash of the shapefile files, so the basins are read again if the shapefile changes.
+The hash is only calculated again if the modification time or size of one of the shapefile files changes.
+"""
+
+import hashlib
+import logging
+import snodastools.util.vector_util as vector_util
+import threading
+
+from pathlib import Path
+
+from qgis.core import (
+    QgsCoordinateReferenceSystem,
+    QgsFeature,
+    QgsField,
+    QgsGeometry,
+    QgsVectorLayer,
+    QgsWkbTypes
+)
+
+# Cache of Basins, by shapefile path.
+basins_cache = {}
+# Cache of the shapefile hash, by shapefile path, with value (file cache keys, hash).
+shapefile_hash_cache = {}
+# Lock to protect the caches because zonal statistics may be run in multiple threads.
+basins_cache_lock = threading.Lock()
+
+
+class Basins(object):
+    """
+    Basins read from the basin boundary shapefile.
+    The data are read once from the layer and are not changed, so they can be used by multiple threads,
+    whereas the layer must only be used by the thread that created it.
+    """
+
+    def __init__(self, layer: QgsVectorLayer, file_hash: str, id_field_name: str,
+                 name_field_name: str = 'LOCAL_NAME'):
+        """
+        layer: the layer to read the basins from
+        file_hash: hash of the shapefile, used to determine whether the cached basins are current
+        id_field_name: name of the basin identifier field
+        name_field_name: name of the basin name field, the identifier is used if the field is not found
+        """
+        self.file_hash = file_hash
+        # Coordinate reference system (WKT) and geometry type (QgsWkbTypes) of the layer.
+        self.crs_wkt = layer.crs().toWkt()
+        self.wkb_type = layer.wkbType()
+        # Tuple of the layer fields (copies).
+        self.fields = tuple(QgsField(field) for field in layer.fields())
+
+        field_names = [field.name() for field in self.fields]
+        id_index = field_names.index(id_field_name)
+        name_index = field_names.index(name_field_name) if name_field_name in field_names else id_index
+
+        feature_ids = []
+        attributes = []
+        geometries = []
+        for feature in layer.getFeatures():
+            feature_ids.append(feature.id())
+            attributes.append(tuple(vector_util.get_json_value(value) for value in feature.attributes()))
+            if feature.hasGeometry():
+                geometries.append(bytes(feature.geometry().asWkb()))
+            else:
+                geometries.append(None)
+
+        # Tuple of feature identifiers in the shapefile, in layer order, which are used by the zonal statistics.
+        self.feature_ids = tuple(feature_ids)
+        # Tuple of basin identifiers and names, in the same order.
+        self.ids = tuple(str(feature_attributes[id_index]) for feature_attributes in attributes)
+        self.names = tuple(str(feature_attributes[name_index]) for feature_attributes in attributes)
+        # Tuple of attribute values (tuple for each basin), with None for NULL values, in the same order.
+        self.attributes = tuple(attributes)
+        # Tuple of WKB geometry (bytes, or None if the basin has no geometry), in the same order.
+        self.geometries = tuple(geometries)
+
+    def create_layer(self, name: str) -> (QgsVectorLayer, dict):
+        """
+        Create a memory layer with a copy of the basins, which can be edited without changing the shapefile.
+        name: name of the layer
+        Returns: tuple of the layer and a dictionary of layer feature identifier to shapefile feature identifier
+        """
+        layer = QgsVectorLayer(QgsWkbTypes.displayString(self.wkb_type), name, 'memory')
+        layer.setCrs(QgsCoordinateReferenceSystem.fromWkt(self.crs_wkt))
+        provider = layer.dataProvider()
+        provider.addAttributes([QgsField(field) for field in self.fields])
+        layer.updateFields()
+
+        features = []
+        for feature_attributes, wkb in zip(self.attributes, self.geometries):
+            feature = QgsFeature(layer.fields())
+            feature.setAttributes(list(feature_attributes))
+            if wkb is not None:
+                geometry = QgsGeometry()
+                geometry.fromWkb(wkb)
+                feature.setGeometry(geometry)
+            features.append(feature)
+        # The added features have the layer feature identifiers, in the same order as the basins.
+        result, added_features = provider.addFeatures(features)
+        if not result:
+            raise RuntimeError('Error adding {} basins to memory layer "{}".'.format(len(features), name))
+        feature_ids = {}
+        for added_feature, feature_id in zip(added_features, self.feature_ids):
+            feature_ids[added_feature.id()] = feature_id
+        return layer, feature_ids
+
+
+def get_basins(shp_file_path: Path, id_field_name: str) -> Basins or None:
+    """
+    Get the basins for a basin boundary shapefile, reading the shapefile if it has not been read
+    or if it has changed since it was read.
+    shp_file_path: the basin boundary shapefile
+    id_field_name: name of the basin identifier field
+    Returns: the basins, or None if the shapefile is not a valid layer
+    """
+    logger = logging.getLogger(__name__)
+
+    path_key = str(shp_file_path.resolve())
+    with basins_cache_lock:
+        file_hash = get_shapefile_hash(shp_file_path)
+        basins = basins_cache.get(path_key)
+        if basins is not None and basins.file_hash == file_hash:
+            return basins
+
+        layer = QgsVectorLayer(str(shp_file_path), 'Basins', 'ogr')
+        if not layer.isValid():
+            logger.warning('  Basin boundary shapefile is not a valid QGS object layer: {}'.format(shp_file_path))
+            return None
+        basins = Basins(layer, file_hash, id_field_name)
+        layer = None
+        logger.info('  Cached {} basins from {}'.format(len(basins.ids), shp_file_path))
+        basins_cache[path_key] = basins
+        return basins
+
+
+def get_shapefile_hash(shp_file_path: Path, extra_values: [str] or None = None) -> str:
+    """
+    Get the hash of a shapefile, which is only calculated again if one of the shapefile files has changed.
+    The cache lock must be held by the caller.
+    shp_file_path: path to the .shp file
+    extra_values: list of other values that are included in the hash, for example output options, or None
+    Returns: the hash as a hexadecimal string
+    """
+    file_keys = tuple(vector_util.get_file_cache_key(shp_file_path.with_suffix(ext))
+                      for ext in ['.shp', '.shx', '.dbf', '.prj', '.cpg']
+                      if shp_file_path.with_suffix(ext).exists())
+    path_key = str(shp_file_path.resolve())
+    cached_file_keys, file_hash = shapefile_hash_cache.get(path_key, (None, None))
+    if cached_file_keys != file_keys:
+        file_hash = vector_util.get_shapefile_hash(shp_file_path)
+        shapefile_hash_cache[path_key] = (file_keys, file_hash)
+    if extra_values:
+        # Combine the cached hash with the other values, without reading the files again.
+        combined_hash = hashlib.sha256(file_hash.encode('utf-8'))
+        for value in extra_values:
+            combined_hash.update(str(value).encode('utf-8'))
+        return combined_hash.hexdigest()
+    return file_hash
@@ -0,0 +1,181 @@
+"""
+This module contains a pool of background threads that compress output files into zip files,
+so that compression overlaps with the processing of the next date.
+
+Compression in zlib, bz2, and lzma releases the Python global interpreter lock, so threads compress in parallel.
+Each zip file is written to a temporary file and then replaces the zip file in one step.
+If the same zip file is submitted more than once (for example, 'LatestDate' files), the zip file
+from the most recent submission is kept, even if the tasks finish in a different order.
+
+Typical use is:
+
+  compression_pool = compress_util.CompressionPool(workers, 'DEFLATE', 6)
+  compression_pool.submit_zip(zip_file_path, [(file_path, arc_name)], delete_folder)
+  ... process the next date ...
+  compression_pool.wait()
+"""
+
+import logging
+import os
+import shutil
+import threading
+import zipfile
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Zip file compression types, by configuration name.
+ZIP_COMPRESSION_TYPES = {
+    'STORED': zipfile.ZIP_STORED,
+    'DEFLATE': zipfile.ZIP_DEFLATED,
+    'BZIP2': zipfile.ZIP_BZIP2,
+    'LZMA': zipfile.ZIP_LZMA
+}
+
+
+def get_zip_compression_type(codec: str) -> int:
+    """
+    Get the zipfile compression type for a codec name.
+    codec: codec name: 'STORED', 'DEFLATE', 'BZIP2', or 'LZMA' (case is ignored)
+    Returns: the zipfile compression type, for example zipfile.ZIP_DEFLATED
+    """
+    compression_type = ZIP_COMPRESSION_TYPES.get(codec.upper())
+    if compression_type is None:
+        raise ValueError('Zip compression must be one of {} (compression={}).'.format(
+            ', '.join(ZIP_COMPRESSION_TYPES.keys()), codec))
+    return compression_type
+
+
+def write_zip(zip_file_path: Path, files: [(Path, str)], codec: str = 'DEFLATE',
+              level: int or None = None) -> Path:
+    """
+    Write files to a temporary zip file in the same folder as the zip file.
+    zip_file_path: path to the zip file, used to name the temporary file
+    files: list of (path to the file, name of the file in the zip file)
+    codec: codec name: 'STORED', 'DEFLATE', 'BZIP2', or 'LZMA'
+    level: compression level for the codec, or None to use the default level
+    Returns: path to the temporary zip file, which should be renamed to the zip file
+    """
+    temp_zip_file_path = zip_file_path.with_name('.{}.{}.{}.tmp'.format(zip_file_path.name, os.getpid(),
+                                                                       threading.get_ident()))
+    try:
+        with zipfile.ZipFile(str(temp_zip_file_path), 'w', get_zip_compression_type(codec),
+                             compresslevel=level) as zip_file:
+            for file_path, arc_name in files:
+                zip_file.write(str(file_path), arc_name)
+    except Exception:
+        # Remove the partial zip file so that it is not left in the output folder.
+        if temp_zip_file_path.exists():
+            temp_zip_file_path.unlink()
+        raise
+    return temp_zip_file_path
+
+
+class CompressionPool(object):
+    """
+    Compress files into zip files in background threads.
+    """
+
+    def __init__(self, workers: int, codec: str = 'DEFLATE', level: int or None = None):
+        """
+        workers: number of background threads, or 0 to compress in the thread that submits the files
+        codec: codec name: 'STORED', 'DEFLATE', 'BZIP2', or 'LZMA'
+        level: compression level for the codec, or None to use the default level
+        """
+        if workers < 0:
+            raise ValueError('Number of compression workers must be at least 0 (workers={}).'.format(workers))
+        # Check the codec before any files are submitted.
+        get_zip_compression_type(codec)
+        self.workers = workers
+        self.codec = codec
+        self.level = level
+
+        # Lock for the following data, which are used by the background threads.
+        self.lock = threading.Lock()
+        # Futures for submitted zip files that have not been waited for.
+        self.futures = []
+        # Submission number of the published zip file, for each zip file.
+        self.published = {}
+        self.submission_count = 0
+
+        self.executor = None
+        if workers > 0:
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='snodas-compress')
+
+    def submit_zip(self, zip_file_path: Path, files: [(Path, str)], delete_folder: Path or None = None,
+                   done_function=None) -> None:
+        """
+        Submit files to compress into a zip file.
+        The files must not be changed until they are compressed, for example by moving or linking them
+        to a folder that is only used for the zip file.
+        zip_file_path: path to the zip file, which is replaced when the files are compressed
+        files: list of (path to the file, name of the file in the zip file)
+        delete_folder: folder containing the files that is deleted after the files are compressed, or None
+        done_function: function to call with no arguments after the zip file is published, or None
+        """
+        with self.lock:
+            self.submission_count += 1
+            submission = self.submission_count
+        if self.executor is None:
+            self._zip(zip_file_path, files, delete_folder, done_function, submission)
+        else:
+            future = self.executor.submit(self._zip, zip_file_path, files, delete_folder, done_function, submission)
+            with self.lock:
+                self.futures.append(future)
+
+    def wait(self) -> int:
+        """
+        Wait for the submitted zip files to be compressed.
+        Errors are logged so that one failed zip file does not stop the other files from being waited for.
+        Returns: the number of zip files that failed
+        """
+        logger = logging.getLogger(__name__)
+
+        with self.lock:
+            futures = self.futures
+            self.futures = []
+        if futures:
+            logger.info('Waiting for {} zip files to be compressed.'.format(len(futures)))
+        error_count = 0
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                logger.warning('  Error compressing zip file: {}'.format(e), exc_info=True)
+                error_count += 1
+        return error_count
+
+    def shutdown(self) -> None:
+        """
+        Wait for the submitted zip files and stop the background threads.
+        """
+        self.wait()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    def _zip(self, zip_file_path: Path, files: [(Path, str)], delete_folder: Path or None, done_function,
+             submission: int) -> None:
+        """
+        Compress files into a zip file, called in a background thread.
+        """
+        logger = logging.getLogger(__name__)
+
+        try:
+            temp_zip_file_path = write_zip(zip_file_path, files, self.codec, self.level)
+            with self.lock:
+                # Only publish the zip file if a more recent submission has not already been published.
+                if submission >= self.published.get(zip_file_path, 0):
+                    os.replace(str(temp_zip_file_path), str(zip_file_path))
+                    self.published[zip_file_path] = submission
+                    published = True
+                else:
+                    temp_zip_file_path.unlink()
+                    published = False
+            if published:
+                logger.info('  Compressed: {}'.format(zip_file_path))
+                if done_function is not None:
+                    done_function()
+        finally:
+            if delete_folder is not None:
+                shutil.rmtree(str(delete_folder), ignore_errors=True)
@@ -0,0 +1,181 @@
+"""
+This module contains functions to record run metrics, such as the time and data volume for each download
+and for publishing the output files.
+Metrics are written to a 'JSON lines' file (one JSON object per line) so that the file can be appended to
+by each run and easily read by other tools, for example:
+
+  {"type": "download", "date": "2023-04-24", "bytes": 4915200, "megabytes_per_second": 3.2, ...}
+"""
+
+import json
+import threading
+
+from datetime import date, datetime
+from pathlib import Path
+
+# Lock used so that records written from multiple threads are not interleaved.
+metrics_file_lock = threading.Lock()
+
+
+class DownloadMetrics(object):
+    """
+    Metrics for the download of one date's SNODAS data.
+    All times are in seconds.
+    """
+
+    def __init__(self, single_date: date, source: str):
+        """
+        single_date: the date of interest
+        source: description of the download source, for example the FTP or HTTPS URL
+        """
+        self.date = single_date
+        self.source = source
+        # The downloaded file name, for example 'SNODAS_20230424.tar'.
+        self.file_name: str or None = None
+        # Time to connect to the server (0 if an open connection was reused).
+        self.connect_seconds: float or None = None
+        # Time to list the remote folder for the date.
+        self.listing_seconds: float or None = None
+        # Time from requesting the file to receiving the first byte of data.
+        self.first_byte_seconds: float or None = None
+        # Time to transfer the file, including the time to the first byte.
+        self.transfer_seconds: float or None = None
+        # Total time for the date, including connecting, listing, and retries.
+        self.total_seconds: float or None = None
+        # Number of bytes transferred (0 if the file was not modified since a previous download).
+        self.bytes: int = 0
+        # Number of retries that were needed.
+        self.retries: int = 0
+        self.success: bool = False
+        self.error: str or None = None
+
+    def format_summary(self) -> str:
+        """
+        Format a one-line summary for the log file.
+        """
+        megabytes_per_second = self.get_megabytes_per_second()
+        return '{} bytes in {} seconds ({} MB/s), connect {} s, listing {} s, first byte {} s, retries {}'.format(
+            self.bytes, format_seconds(self.transfer_seconds),
+            'unknown' if megabytes_per_second is None else '{:.3f}'.format(megabytes_per_second),
+            format_seconds(self.connect_seconds), format_seconds(self.listing_seconds),
+            format_seconds(self.first_byte_seconds), self.retries)
+
+    def get_megabytes_per_second(self) -> float or None:
+        """
+        Returns: the transfer rate in megabytes (1,000,000 bytes) per second, or None if not known.
+        """
+        if not self.transfer_seconds or self.bytes <= 0:
+            return None
+        return self.bytes / self.transfer_seconds / 1000000.0
+
+    def to_dict(self) -> dict:
+        """
+        Returns: a dictionary of the metrics, suitable to write as JSON.
+        """
+        return {
+            'type': 'download',
+            'timestamp': datetime.now().isoformat(),
+            'date': self.date.isoformat(),
+            'source': self.source,
+            'file_name': self.file_name,
+            'success': self.success,
+            'error': self.error,
+            'connect_seconds': round_seconds(self.connect_seconds),
+            'listing_seconds': round_seconds(self.listing_seconds),
+            'first_byte_seconds': round_seconds(self.first_byte_seconds),
+            'transfer_seconds': round_seconds(self.transfer_seconds),
+            'total_seconds': round_seconds(self.total_seconds),
+            'bytes': self.bytes,
+            'megabytes_per_second': None if self.get_megabytes_per_second() is None
+            else round(self.get_megabytes_per_second(), 3),
+            'retries': self.retries
+        }
+
+
+class SyncMetrics(object):
+    """
+    Metrics for the publishing of the output files to a destination (for example, a cloud storage bucket).
+    All times are in seconds.
+    """
+
+    def __init__(self, destination: str):
+        """
+        destination: destination URL or folder
+        """
+        self.destination = destination
+        # Number of files and bytes in the published folders, which would be uploaded by a full copy.
+        self.files: int = 0
+        self.bytes: int = 0
+        # Number of files for which the hash was calculated because the size or modification time changed.
+        self.files_hashed: int = 0
+        # Number of files and bytes that were uploaded because they were new or changed.
+        self.files_uploaded: int = 0
+        self.bytes_uploaded: int = 0
+        # Total time, including listing and hashing the files.
+        self.total_seconds: float or None = None
+        self.success: bool = False
+        self.error: str or None = None
+
+    def format_summary(self) -> str:
+        """
+        Format a one-line summary for the log file.
+        """
+        return 'uploaded {} of {} files, {} of {} bytes ({} bytes saved versus a full copy), ' \
+               'hashed {} files, {} seconds'.format(
+                self.files_uploaded, self.files, self.bytes_uploaded, self.bytes, self.get_bytes_saved(),
+                self.files_hashed, format_seconds(self.total_seconds))
+
+    def get_bytes_saved(self) -> int:
+        """
+        Returns: the number of bytes that were not uploaded compared to uploading all files.
+        """
+        return self.bytes - self.bytes_uploaded
+
+    def to_dict(self) -> dict:
+        """
+        Returns: a dictionary of the metrics, suitable to write as JSON.
+        """
+        return {
+            'type': 'sync',
+            'timestamp': datetime.now().isoformat(),
+            'destination': self.destination,
+            'success': self.success,
+            'error': self.error,
+            'files': self.files,
+            'bytes': self.bytes,
+            'files_hashed': self.files_hashed,
+            'files_uploaded': self.files_uploaded,
+            'bytes_uploaded': self.bytes_uploaded,
+            'bytes_saved': self.get_bytes_saved(),
+            'total_seconds': round_seconds(self.total_seconds)
+        }
+
+
+def append_metrics_record(metrics_file: Path, record: dict) -> None:
+    """
+    Append a record to a metrics file, creating the file (and its folder) if necessary.
+    metrics_file: full path to the metrics file
+    record: dictionary to write as a single line of JSON
+    """
+    with metrics_file_lock:
+        metrics_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(metrics_file, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+
+def format_seconds(seconds: float or None) -> str:
+    """
+    Format seconds for a log message.
+    """
+    if seconds is None:
+        return 'unknown'
+    return '{:.3f}'.format(seconds)
+
+
+def round_seconds(seconds: float or None) -> float or None:
+    """
+    Round seconds to milliseconds for output.
+    """
+    if seconds is None:
+        return None
+    return round(seconds, 3)
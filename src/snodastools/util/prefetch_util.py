@@ -0,0 +1,108 @@
+"""
+This module contains a prefetcher that downloads upcoming dates in a background thread,
+so that downloading (network) overlaps with processing (CPU) of the current date.
+
+The prefetcher downloads the dates in order and hands the results to the processing loop through a queue.
+At most 'depth' dates are downloaded ahead of the date that is being processed, so that disk use is limited.
+For example, with depth = 2, dates N+1 and N+2 are downloaded while date N is processed.
+
+Typical use in a processing loop is:
+
+  prefetcher = prefetch_util.Prefetcher(dates, download_function, depth)
+  prefetcher.start()
+  for single_date in dates:
+      download_result = prefetcher.get(single_date)
+      ... process single_date ...
+  prefetcher.stop()
+"""
+
+import logging
+import queue
+import threading
+
+from datetime import date
+
+
+class Prefetcher(object):
+    """
+    Download dates in a background thread, ahead of the date that is being processed.
+    """
+
+    def __init__(self, dates: [date], download_function, depth: int, finish_function=None):
+        """
+        dates: list of dates to download, in the order that they will be processed
+        download_function: function called in the background thread as download_function(single_date),
+            which returns the download result for the date
+        depth: maximum number of dates to download ahead of the date being processed (must be at least 1)
+        finish_function: function called in the background thread after the last download,
+            for example to close a connection, or None
+        """
+        if depth < 1:
+            raise ValueError('Prefetch depth must be at least 1 (depth={}).'.format(depth))
+        self.dates = list(dates)
+        self.download_function = download_function
+        self.depth = depth
+        self.finish_function = finish_function
+
+        # Queue of (date, result, exception) for downloaded dates.
+        self.download_queue = queue.Queue()
+        # Slots for dates that can be downloaded ahead, released as the processing loop gets each date.
+        self.slots = threading.Semaphore(depth)
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='snodas-prefetch', daemon=True)
+
+    def get(self, single_date: date):
+        """
+        Get the download result for a date, waiting until it has been downloaded.
+        Dates must be requested in the order that was passed to the constructor.
+        If the download raised an exception, the exception is raised here.
+        single_date: the date of interest
+        Returns: the result from download_function(single_date)
+        """
+        downloaded_date, result, exception = self.download_queue.get()
+        # Allow another date to be downloaded.
+        self.slots.release()
+        if downloaded_date != single_date:
+            raise RuntimeError('Prefetched date {} does not match the requested date {}.'.format(
+                downloaded_date, single_date))
+        if exception is not None:
+            raise exception
+        return result
+
+    def start(self) -> None:
+        """
+        Start downloading in the background thread.
+        """
+        self.thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop downloading, for example if processing ended early.
+        A download that is in progress is allowed to finish, but no more dates are started.
+        """
+        self.stop_event.set()
+        # Release a slot in case the background thread is waiting for one.
+        self.slots.release()
+
+    def _run(self) -> None:
+        """
+        Download the dates, called in the background thread.
+        """
+        logger = logging.getLogger(__name__)
+
+        try:
+            for single_date in self.dates:
+                # Wait until the processing loop is not too far behind.
+                self.slots.acquire()
+                if self.stop_event.is_set():
+                    break
+                logger.info('Prefetching SNODAS data for {}'.format(single_date))
+                try:
+                    result = self.download_function(single_date)
+                    self.download_queue.put((single_date, result, None))
+                except Exception as e:
+                    # Pass the exception to the processing loop.
+                    self.download_queue.put((single_date, None, e))
+        finally:
+            if self.finish_function is not None:
+                self.finish_function()
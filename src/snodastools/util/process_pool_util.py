@@ -0,0 +1,155 @@
+"""
+This module contains a process pool that processes dates in parallel, in separate processes,
+and returns the results in date order.
+
+Each date is processed independently by 'process_function' in a worker process.
+The processing loop gets the results in the order of the dates, so that steps that depend on previous dates
+(for example, appending to time series files) can be done in order in the main process.
+At most 'depth' dates are submitted ahead of the date that the processing loop is waiting for,
+so that disk use for intermediate files is limited.
+
+Worker processes are started with the 'spawn' method, rather than forking the main process,
+because GDAL and QGIS are not safe to use after a fork.
+Each worker calls 'initializer' once when it starts, for example to read the configuration file and
+initialize QGIS.  Log records from the workers are sent to the main process and are handled by the
+main process loggers, so that all messages are written to the same log file.
+
+Typical use in a processing loop is:
+
+  pool = process_pool_util.DateProcessPool(dates, process_function, workers, initializer, initargs)
+  pool.start()
+  for single_date in dates:
+      result = pool.get(single_date)
+      ... process single_date results in order ...
+  pool.stop()
+"""
+
+import logging
+import logging.handlers
+import multiprocessing
+
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+
+class DateProcessPool(object):
+    """
+    Process dates in parallel worker processes, returning the results in date order.
+    """
+
+    def __init__(self, dates: [date], process_function, workers: int, initializer=None, initargs: tuple = (),
+                 depth: int or None = None):
+        """
+        dates: list of dates to process, in the order that results will be requested
+        process_function: module-level function called in a worker process as process_function(single_date),
+            which returns the result for the date (must be possible to pickle the function and result)
+        workers: number of worker processes (must be at least 1)
+        initializer: module-level function called once in each worker process as initializer(*initargs), or None
+        initargs: arguments for the initializer
+        depth: maximum number of dates to submit ahead of the date being requested,
+            or None to use twice the number of workers
+        """
+        if workers < 1:
+            raise ValueError('Number of workers must be at least 1 (workers={}).'.format(workers))
+        if depth is None:
+            depth = 2 * workers
+        if depth < workers:
+            raise ValueError('Depth ({}) must be at least the number of workers ({}).'.format(depth, workers))
+        self.dates = list(dates)
+        self.process_function = process_function
+        self.workers = workers
+        self.initializer = initializer
+        self.initargs = initargs
+        self.depth = depth
+
+        # Futures for submitted dates, by date.
+        self.futures = {}
+        # Position in 'dates' of the next date to submit.
+        self.next_index = 0
+
+        context = multiprocessing.get_context('spawn')
+        # Queue for log records from the workers, handled in the main process by the listener.
+        self.log_queue = context.Queue()
+        self.log_listener = logging.handlers.QueueListener(self.log_queue, _LogRecordHandler())
+        self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                                            initargs=(self.log_queue, initializer, initargs))
+
+    def get(self, single_date: date):
+        """
+        Get the result for a date, waiting until it has been processed.
+        Dates must be requested in the order that was passed to the constructor.
+        If processing raised an exception, the exception is raised here.
+        single_date: the date of interest
+        Returns: the result from process_function(single_date)
+        """
+        future = self.futures.pop(single_date, None)
+        if future is None:
+            raise RuntimeError('Date {} was not submitted for processing.'.format(single_date))
+        try:
+            return future.result()
+        finally:
+            # Submit another date to replace the one that was requested.
+            self._submit(1)
+
+    def start(self) -> None:
+        """
+        Start the log listener and submit the first dates.
+        """
+        self.log_listener.start()
+        self._submit(self.depth)
+
+    def stop(self) -> None:
+        """
+        Stop processing, for example if the processing loop ended early.
+        Dates that are being processed are allowed to finish, but dates that have not started are cancelled.
+        """
+        for future in self.futures.values():
+            future.cancel()
+        self.futures.clear()
+        self.executor.shutdown(wait=True)
+        self.log_listener.stop()
+
+    def _submit(self, count: int) -> None:
+        """
+        Submit the next dates for processing.
+        count: the maximum number of dates to submit
+        """
+        logger = logging.getLogger(__name__)
+
+        for i in range(count):
+            if self.next_index >= len(self.dates):
+                break
+            single_date = self.dates[self.next_index]
+            self.next_index += 1
+            logger.info('Submitting SNODAS date {} for processing.'.format(single_date))
+            self.futures[single_date] = self.executor.submit(self.process_function, single_date)
+
+
+class _LogRecordHandler(logging.Handler):
+    """
+    Handler for log records received from the worker processes,
+    which passes each record to the main process logger with the same name.
+    """
+
+    def handle(self, record: logging.LogRecord) -> None:
+        logger = logging.getLogger(record.name)
+        if logger.isEnabledFor(record.levelno):
+            logger.handle(record)
+
+
+def _init_worker(log_queue, initializer, initargs: tuple) -> None:
+    """
+    Initialize a worker process, called once when the process starts.
+    log_queue: queue to send log records to the main process
+    initializer: function to call after logging is initialized, or None
+    initargs: arguments for the initializer
+    """
+    # Send all log records to the main process, which filters them using its logging configuration.
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    root_logger.setLevel(logging.DEBUG)
+
+    if initializer is not None:
+        initializer(*initargs)
@@ -0,0 +1,78 @@
+"""
+This module contains functions to publish output files so that readers never see partially written files.
+
+Output files are written to a staging folder and then moved to the output folder with os.replace(),
+which replaces an existing file in one step if the folders are on the same file system.
+The staging folder is created next to the output folder so that it is on the same file system,
+but is not included when the output folder is copied (for example, to a cloud storage bucket).
+
+Files that are copies of other files, such as the 'LatestDate' files, are published as hard links,
+so that no data are copied.  If hard links are not supported by the file system, the file is copied.
+"""
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+from pathlib import Path
+
+
+def create_staging_folder(folder: Path) -> Path:
+    """
+    Create a staging folder for files that will be published to a folder.
+    folder: the folder to which files will be published
+    Returns: the path to the new staging folder, which is on the same file system as the folder
+    """
+    return Path(tempfile.mkdtemp(prefix='.' + folder.name + '-staging-', dir=str(folder.parent)))
+
+
+def link_file(src_file_path: Path, dst_file_path: Path) -> None:
+    """
+    Publish a file as a hard link to another file, replacing the destination file if it exists.
+    If a hard link cannot be created, the file is copied.
+    src_file_path: the existing file
+    dst_file_path: the file to publish
+    """
+    logger = logging.getLogger(__name__)
+
+    temp_file_path = dst_file_path.with_name('.' + dst_file_path.name + '.tmp')
+    if temp_file_path.exists():
+        temp_file_path.unlink()
+    try:
+        os.link(str(src_file_path), str(temp_file_path))
+    except OSError as e:
+        logger.debug('  Unable to create hard link ({}), copying: {}'.format(e, src_file_path))
+        shutil.copyfile(str(src_file_path), str(temp_file_path))
+    os.replace(str(temp_file_path), str(dst_file_path))
+
+
+def publish_folder(staging_folder: Path, folder: Path) -> [Path]:
+    """
+    Publish the files in a staging folder to a folder and remove the staging folder.
+    Each file replaces the file with the same name in the folder.
+    staging_folder: the staging folder from create_staging_folder()
+    folder: the folder to which files are published
+    Returns: list of the published files
+    """
+    published_file_paths = []
+    for staged_file_path in sorted(staging_folder.iterdir()):
+        if staged_file_path.is_file():
+            file_path = folder / staged_file_path.name
+            os.replace(str(staged_file_path), str(file_path))
+            published_file_paths.append(file_path)
+    shutil.rmtree(str(staging_folder), ignore_errors=True)
+    return published_file_paths
+
+
+def write_json(file_path: Path, data: dict) -> None:
+    """
+    Publish a JSON file, replacing the file if it exists.
+    file_path: the file to publish
+    data: the data to write
+    """
+    temp_file_path = file_path.with_name('.' + file_path.name + '.tmp')
+    with open(temp_file_path, 'w', encoding='utf-8') as json_file:
+        json.dump(data, json_file, indent=2)
+    os.replace(str(temp_file_path), str(file_path))
@@ -0,0 +1,244 @@
+"""
+This module contains functions to retry SNODAS transfers that fail because of network or server problems.
+
+Errors are classified as:
+
+  TRANSIENT - the request may succeed if retried (timeouts, dropped connections, busy server)
+  MISSING   - the requested folder or file does not exist, so retrying will not help
+  FATAL     - any other error, which is passed on to the caller
+
+Transient errors are retried with exponential backoff and random jitter, up to a number of retries and an
+overall deadline.  A circuit breaker stops requests for a while if the server fails repeatedly
+(for example, when the NSIDC site is down), so that each remaining date fails quickly rather than waiting
+through all of its retries.
+"""
+
+import errno
+import ftplib
+import http.client
+import logging
+import random
+import socket
+import threading
+import time
+
+import snodastools.util.transport_util as transport_util
+
+# Error classifications returned by classify_error().
+TRANSIENT = 'TRANSIENT'
+MISSING = 'MISSING'
+FATAL = 'FATAL'
+
+# Operating system error numbers for network problems that are treated as transient.
+NETWORK_ERRNOS = (errno.ENETDOWN, errno.ENETUNREACH, errno.ENETRESET, errno.EHOSTDOWN, errno.EHOSTUNREACH,
+                  errno.ECONNABORTED)
+
+
+class CircuitBreaker(object):
+    """
+    Circuit breaker for a server.
+    After 'failure_threshold' consecutive failures the circuit is 'open' and requests fail immediately.
+    After 'reset_seconds', one request is allowed ('half-open'):
+    if it succeeds the circuit is closed, and if it fails the circuit is opened again.
+    Other requests fail immediately while the trial request is in progress.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        """
+        failure_threshold: number of consecutive failures to open the circuit, or 0 to never open the circuit
+        reset_seconds: seconds to wait before allowing a request after the circuit is opened
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failure_count = 0
+        # Time that the circuit was opened, from time.monotonic(), or None if the circuit is closed.
+        self.open_time: float or None = None
+        # Whether the half-open trial request has been allowed and has not yet succeeded or failed.
+        self.trial_in_progress = False
+        # Lock because the circuit breaker may be used by a background download thread.
+        self.lock = threading.Lock()
+
+    def cancel_trial(self) -> None:
+        """
+        Cancel the trial request without closing or opening the circuit,
+        for example if the request failed because of a local error, so that another trial request is allowed.
+        """
+        with self.lock:
+            self.trial_in_progress = False
+
+    def check(self) -> bool:
+        """
+        Check whether a request is allowed.
+        The caller must call record_success(), record_failure(), or cancel_trial() when a trial request completes.
+        Returns: True if the request is the half-open trial request, False if the circuit is closed
+        Raises CircuitOpenError if the circuit is open or another request is the trial request.
+        """
+        with self.lock:
+            if self.open_time is None:
+                return False
+            if self.trial_in_progress:
+                raise CircuitOpenError(0, trial_in_progress=True)
+            open_seconds = time.monotonic() - self.open_time
+            if open_seconds < self.reset_seconds:
+                raise CircuitOpenError(self.reset_seconds - open_seconds)
+            # Half-open: allow one trial request.  The circuit is opened again immediately if it fails.
+            self.failure_count = self.failure_threshold - 1
+            self.trial_in_progress = True
+            return True
+
+    def record_failure(self) -> None:
+        """
+        Record a failure, opening the circuit if the threshold is reached.
+        """
+        logger = logging.getLogger(__name__)
+
+        with self.lock:
+            self.trial_in_progress = False
+            self.failure_count += 1
+            if 0 < self.failure_threshold <= self.failure_count:
+                if self.open_time is None:
+                    logger.warning('  {} consecutive failures, no requests will be made for {} seconds.'.format(
+                        self.failure_count, self.reset_seconds))
+                self.open_time = time.monotonic()
+
+    def record_success(self) -> None:
+        """
+        Record a success, closing the circuit.
+        """
+        with self.lock:
+            self.trial_in_progress = False
+            self.failure_count = 0
+            self.open_time = None
+
+
+class CircuitOpenError(Exception):
+    """
+    Exception raised when a request is not made because the circuit breaker is open.
+    """
+
+    def __init__(self, remaining_seconds: float, trial_in_progress: bool = False):
+        if trial_in_progress:
+            message = 'Server has failed repeatedly, requests are paused until a trial request completes.'
+        else:
+            message = 'Server has failed repeatedly, requests are paused for {:.0f} more seconds.'.format(
+                remaining_seconds)
+        super().__init__(message)
+        self.remaining_seconds = remaining_seconds
+        self.trial_in_progress = trial_in_progress
+
+
+class RetriesExhaustedError(Exception):
+    """
+    Exception raised when a transient error persists after all retries, or the deadline is reached.
+    """
+
+    def __init__(self, retries: int, last_error: Exception):
+        super().__init__('Failed after {} retries: {}'.format(retries, last_error))
+        self.retries = retries
+        self.last_error = last_error
+
+
+class RetryPolicy(object):
+    """
+    Retry policy using exponential backoff with jitter and an overall deadline.
+    """
+
+    def __init__(self, retries: int, wait_seconds: float, max_wait_seconds: float, deadline_seconds: float):
+        """
+        retries: maximum number of retries after the first attempt
+        wait_seconds: wait before the first retry, which doubles for each additional retry
+        max_wait_seconds: maximum wait between retries
+        deadline_seconds: maximum total time for all attempts, including waits
+        """
+        self.retries = retries
+        self.wait_seconds = wait_seconds
+        self.max_wait_seconds = max_wait_seconds
+        self.deadline_seconds = deadline_seconds
+
+    def get_wait_seconds(self, retry: int) -> float:
+        """
+        Get the time to wait before a retry.
+        Random jitter (50-100% of the backoff) is used so that retries from multiple processes are spread out.
+        retry: the retry number, starting at 1
+        """
+        backoff_seconds = min(self.max_wait_seconds, self.wait_seconds * (2 ** (retry - 1)))
+        return backoff_seconds * random.uniform(0.5, 1.0)
+
+
+def call_with_retries(function, policy: RetryPolicy, circuit_breaker: CircuitBreaker or None = None,
+                      before_retry=None):
+    """
+    Call a function, retrying if it raises a transient error.
+    Missing and fatal errors are raised immediately.
+    function: function to call with no arguments
+    policy: the retry policy
+    circuit_breaker: circuit breaker for the server, or None to not use a circuit breaker
+    before_retry: function called as before_retry(exception) before each retry, for example to reconnect, or None
+    Returns: tuple of (function result, number of retries)
+    Raises: RetriesExhaustedError if all retries fail, CircuitOpenError if the circuit breaker is open,
+        or the exception raised by the function for missing and fatal errors
+    """
+    logger = logging.getLogger(__name__)
+
+    start_time = time.monotonic()
+    retry = 0
+    while True:
+        trial = False
+        if circuit_breaker is not None:
+            trial = circuit_breaker.check()
+        try:
+            result = function()
+        except Exception as e:
+            if classify_error(e) != TRANSIENT:
+                if trial:
+                    # The error is not a server failure, so allow another trial request.
+                    circuit_breaker.cancel_trial()
+                raise
+            if trial:
+                # The trial request failed, so open the circuit again rather than retrying.
+                circuit_breaker.record_failure()
+                raise RetriesExhaustedError(retry, e) from e
+            retry += 1
+            wait_seconds = policy.get_wait_seconds(retry)
+            if retry > policy.retries or (time.monotonic() - start_time + wait_seconds) > policy.deadline_seconds:
+                if circuit_breaker is not None:
+                    circuit_breaker.record_failure()
+                raise RetriesExhaustedError(retry - 1, e) from e
+            logger.warning('  Transient error ({}), retry {} of {} in {:.1f} seconds.'.format(
+                e, retry, policy.retries, wait_seconds))
+            if before_retry is not None:
+                before_retry(e)
+            time.sleep(wait_seconds)
+        else:
+            if circuit_breaker is not None:
+                circuit_breaker.record_success()
+            return result, retry
+
+
+def classify_error(error: Exception) -> str:
+    """
+    Classify an error from a transfer.
+    error: the exception that was raised
+    Returns: TRANSIENT, MISSING, or FATAL
+    """
+    if isinstance(error, ftplib.error_perm):
+        # 550 is used for a folder or file that does not exist.
+        if str(error).startswith('550'):
+            return MISSING
+        return FATAL
+    elif isinstance(error, ftplib.error_temp):
+        # 4xx replies, for example 421 too many connections.
+        return TRANSIENT
+    elif isinstance(error, transport_util.HttpStatusError):
+        if error.status in (404, 410):
+            return MISSING
+        elif error.status in (408, 429) or error.status >= 500:
+            return TRANSIENT
+        return FATAL
+    elif isinstance(error, (socket.timeout, TimeoutError, ConnectionError, EOFError, http.client.HTTPException,
+                            ftplib.error_reply, ftplib.error_proto, transport_util.TruncatedTransferError)):
+        return TRANSIENT
+    elif isinstance(error, socket.gaierror) or (isinstance(error, OSError) and error.errno in NETWORK_ERRNOS):
+        # Other network errors, for example host not reachable.  Local file errors are fatal.
+        return TRANSIENT
+    return FATAL
@@ -11,25 +11,45 @@ Both automated and interactive scripts call the same functions defined in this m
 'daily_interactive.py' processes historical dates of SNODAS data and outputs the results
 in multiple geometries (geoJSON and shapefile) and multiple .csv files
 (one .csv file for the processing date and one .csv file for EACH basin in the input vector shapefile).
+
+The functions use the full paths that are passed to them and do not change the working directory,
+so that dates can be processed at the same time by threads.
+Output files that are shared by all dates (for example, the by basin .csv files) are updated while holding a lock.
 """
 
 # Import necessary modules.
 import configparser
 import csv
 import errno
-import ftplib
-import glob
+import functools
 import gzip
+import io
+import json
 import logging
+import numpy as np
 import os
+import re
+import shutil
+import snodastools.util.basin_util as basin_util
+import snodastools.util.compress_util as compress_util
 import snodastools.util.config_util as config_util
+import snodastools.util.metrics_util as metrics_util
 import snodastools.util.os_util as os_util
+import snodastools.util.publish_util as publish_util
 import snodastools.util.qgis_version_util as qgis_version_util
+import snodastools.util.retry_util as retry_util
+import snodastools.util.sync_util as sync_util
+import snodastools.util.transport_util as transport_util
+import snodastools.util.vector_util as vector_util
+import snodastools.util.zonal_util as zonal_util
 import subprocess
 import sys
 import tarfile
+import tempfile
+import threading
 import time
 import zipfile
+import zlib
 
 # TODO smalers 2023-03-01 could catch an ImportError exception but application probably needs to just exit.
 if (qgis_version_util.get_qgis_version_int(1) >= 3) and (qgis_version_util.get_qgis_version_int(2) <= 10):
@@ -45,33 +65,38 @@ elif (qgis_version_util.get_qgis_version_int(1) >= 3) and (qgis_version_util.get
     #import osgeo.osr as osre
     import osgeo.osr as osr
 
-from datetime import date, datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
 from logging.config import fileConfig
 from pathlib import Path
 from shutil import copy, copyfile
 
 from PyQt5.QtCore import QVariant
-from qgis.analysis import (
-    QgsRasterCalculator,
-    QgsRasterCalculatorEntry,
-    QgsZonalStatistics
-)
 from qgis.core import (
-    QgsCoordinateReferenceSystem,
     QgsCoordinateTransformContext,
     QgsExpression,
     QgsExpressionContext,
     QgsExpressionContextScope,
     QgsField,
-    QgsRasterLayer,
-    QgsVectorLayer,
-    QgsVectorFileWriter
+    QgsVectorLayer
 )
 sys.path.append('/usr/share/qgis/python/plugins')
 
 # If set to False, the module data have not been initialized by the init_snodas_util() function.
 # If set to True, the moudle data have been initialized in the init_snodas_util() function.
 init_snodas_util_called: bool = False
+# Lock so that the module data are only initialized once if functions are called from multiple threads.
+init_snodas_util_lock = threading.Lock()
+
+# Lock for the output files that are shared by dates (the by basin .csv files, ListOfDates.txt and the
+# LatestDate files), so that multiple dates can be processed at the same time by threads.
+# A reentrant lock is used because functions that hold the lock call other functions that use it.
+results_files_lock = threading.RLock()
+
+# Pool that compresses the output zip files in background threads, created by get_compression_pool().
+compression_pool: compress_util.CompressionPool or None = None
+# Lock so that only one compression pool is created if functions are called from multiple threads.
+compression_pool_lock = threading.Lock()
 
 # Assigns the values from the configuration file to the python variables.
 # See below for description of each variable obtained by the configuration file.
@@ -103,22 +128,89 @@ init_snodas_util_called: bool = False
 #   Daily zonal SWE maximum statistic will be calculated if this value is 'True'.
 # CALCULATE_SWE_STD_DEV:
 #   Daily zonal SWE standard deviation statistic will be calculated if this value is 'True'.
+# ZONAL_STATISTICS_ENGINE:
+#   'PROJECTED' (default) to project the clipped SNODAS grid to CALCULATE_STATS_PROJECTION for the statistics,
+#   or 'GEOGRAPHIC' to calculate the statistics on the native WGS84 grid, with cells weighted by area.
+# ZONAL_STATISTICS_SPARSE_FRACTION:
+#   Maximum fraction of the cells with data that have nonzero SWE for which only the nonzero cells are processed
+#   (for example in the snow-free season), or 0 to always process all cells.
+# ZONAL_STATISTICS_CACHE_FOLDER:
+#   Folder in which the basin cells with data are saved for each version of the SNODAS valid-cell mask,
+#   or None to only cache in memory.
+# SNOW_COVER_THRESHOLDS_MM:
+#   List of SWE thresholds (mm) for which an additional snow cover percent (SWE > threshold) is calculated.
 # CELL_SIZE_X:
 #   The spatial resolution of the SNODAS (CALCULATE_STATS_PROJECTION) cells' x-axis (in meters).
 # CELL_SIZE_Y:
 #   The spatial resolution of the SNODAS (CALCULATE_STATS_PROJECTION) cells' y-axis (in meters).
 # GEOJSON_PRECISION:
 #   The number of decimal places (precision) used in the output GeoJSON geometry.
+# GEOJSON_SIMPLIFY_TOLERANCES:
+#   List of tolerances (in output CRS units, as configured) for which simplified basin geometry files are written,
+#   with a compact daily properties file that references the geometry files, or an empty list to not write them.
+# FLATGEOBUF:
+#   Whether the daily FlatGeobuf file, with a spatial index, is written ('True') or not ('False', default).
+# TOPOJSON:
+#   Whether the daily TopoJSON file is written ('True') or not ('False', default).
+# TOPOJSON_QUANTIZATION:
+#   The number of quantized positions in each dimension of the TopoJSON coordinates.
+# SNOWCOVER_TIF:
+#   Whether the snow cover GeoTIFF is written as an output product ('True', default) or not ('False').
+#   The snow cover statistics are calculated from the SWE raster, so the snow cover GeoTIFF is not needed for them.
+# SNOWCOVER_TIF_COMPRESSION:
+#   The compression used for the snow cover GeoTIFF: 'DEFLATE' (default), 'LZW', or 'NONE'.
+# ZIP_COMPRESSION:
+#   The compression used for the output zip files: 'DEFLATE' (default), 'BZIP2', 'LZMA', or 'STORED'.
+# ZIP_COMPRESSION_LEVEL:
+#   The compression level for ZIP_COMPRESSION, or None to use the default level.
+# COMPRESSION_WORKERS:
+#   The number of background threads that compress the output zip files,
+#   or 0 to compress in the processing thread.
+# SNOWCOVER_TIF_NBITS:
+#   The number of bits per cell of the snow cover GeoTIFF: 1 (default) or 8 (Byte).
+# GCP_BUCKET_URL:
+#   The Google Cloud Storage URL (or local folder) to which the output files are published by push_to_gcp(),
+#   uploading only new and changed files, or None to run GCP_SHELL_SCRIPT_PATH.
+# GCP_SHELL_SCRIPT_PATH:
+#   The full pathname to the shell script that copies the output files to Google Cloud Storage,
+#   used if GCP_BUCKET_URL is not configured.
+# S3_BUCKET_URL:
+#   The Amazon S3 URL (or local folder) to which the output files are published by push_to_aws(),
+#   uploading only new and changed files, or None to run AWS_BATCH_PATH.
+# AWS_PROFILE:
+#   The AWS profile used to upload to S3_BUCKET_URL, or None to use the default profile.
+# SYNC_MANIFEST_FOLDER:
+#   The folder for the manifests of the published files (one for each destination).
 # TSTOOL_INSTALL_PATH:
 #   The full pathname to the TSTool program.
 # TSToolBatchFile:
 #   The full pathname to the TSTool Batch file responsible for creating the time-series graphs.
 # AEA_CONIC_STRING:
 #   USA_Albers_Equal_Area projection in WKT (Proj4) - for use in Linux systems
+# SNODAS_PRODUCT_CODES:
+#   The SNODAS product codes to keep from the downloaded .tar file, for example '1034' for SWE.
+#   SWE (1034) is always included because it is needed for the zonal statistics.
+#   Other codes in SNODAS_PRODUCTS are clipped to the SWE grid and their basin mean is output.
+# SNODAS_PRODUCTS:
+#   SNODAS products that can be processed, with key of product code and value a list of:
+#   [name used in file and column names, shapefile field prefix (5 characters or less), units,
+#   scale factor to convert the stored integer to the units (see the NSIDC SNODAS user guide)]
+# SNODAS_TRANSPORT:
+#   The transport used to download the data, 'FTP' (default) or 'HTTPS'.
+# SNODAS_HTTPS_URL:
+#   The URL of the folder on the SNODAS HTTPS site that contains the SNODAS masked datasets.
+# DOWNLOAD_METRICS_FILE:
+#   The full path to the JSON lines file to which download (and sync) metrics are appended,
+#   or None to only log the metrics.
+# DOWNLOAD_RETRY_POLICY:
+#   The retry policy for transient download errors, from the [SNODAS_Download] retry properties.
+# DOWNLOAD_CIRCUIT_BREAKER:
+#   The circuit breaker that pauses downloads if the server fails repeatedly.
 
 TSTOOL_INSTALL_PATH: str or None = None
 TSTOOL_SNODAS_GRAPHS_PATH: str or None = None
 AWS_BATCH_PATH: str or None = None
+GCP_SHELL_SCRIPT_PATH: str or None = None
 
 HOST: str or None = None
 USERNAME: str or None = None
@@ -134,13 +226,47 @@ CELL_SIZE_X: str or None = None
 CELL_SIZE_Y: str or None = None
 
 GEOJSON_PRECISION: str or None = None
+GEOJSON_SIMPLIFY_TOLERANCES: [str] = []
+FLATGEOBUF: str = 'False'
+TOPOJSON: str = 'False'
+TOPOJSON_QUANTIZATION: int = 100000
 GEOJSON_ZIP: str or None = None
+SNOWCOVER_TIF: str = 'True'
+SNOWCOVER_TIF_COMPRESSION: str = 'DEFLATE'
+SNOWCOVER_TIF_NBITS: int = 1
+ZIP_COMPRESSION: str = 'DEFLATE'
+ZIP_COMPRESSION_LEVEL: int or None = None
+COMPRESSION_WORKERS: int = 1
 TSGRAPH_WEEKLY_UPDATE: str or None = None
 TSGRAPH_WEEKLY_UPDATE_DATE: str or None = None
+GCP_BUCKET_URL: str or None = None
+S3_BUCKET_URL: str or None = None
+AWS_PROFILE: str or None = None
+SYNC_MANIFEST_FOLDER: str or None = None
 
 CALCULATE_SWE_MIN: str or None = None
 CALCULATE_SWE_MAX: str or None = None
 CALCULATE_SWE_STD_DEV: str or None = None
+SNOW_COVER_THRESHOLDS_MM: [float] = []
+ZONAL_STATISTICS_ENGINE: str = 'PROJECTED'
+ZONAL_STATISTICS_SPARSE_FRACTION: float = 0.1
+ZONAL_STATISTICS_CACHE_FOLDER: str or None = None
+
+SNODAS_PRODUCT_CODES: [str] = ['1034']
+SNODAS_PRODUCTS: dict = {
+    '1034': ['SWE', 'SWE', 'mm', 1.0],
+    '1036': ['SnowDepth', 'Depth', 'mm', 1.0],
+    '1038': ['SnowPackTemperature', 'Temp', 'K', 1.0],
+    '1039': ['BlowingSnowSublimation', 'BSubl', 'mm', 0.01],
+    '1044': ['SnowMelt', 'Melt', 'mm', 0.01],
+    '1050': ['SnowPackSublimation', 'Subl', 'mm', 0.01]
+}
+
+SNODAS_TRANSPORT: str = 'FTP'
+SNODAS_HTTPS_URL: str or None = None
+DOWNLOAD_METRICS_FILE: str or None = None
+DOWNLOAD_RETRY_POLICY: retry_util.RetryPolicy or None = None
+DOWNLOAD_CIRCUIT_BREAKER: retry_util.CircuitBreaker or None = None
 
 AEA_CONIC_STRING: str or None =\
     "+proj=aea +lat_1=29.5 +lat_2=45.5 +lat_0=37.5 +lon_0=-96 +x_0=0 +y_0=0 +datum=NAD83 +units=m +no_defs"
@@ -154,94 +280,158 @@ CALCULATE_STATS_PROJ_WKT = calculate_statistics_projection_srs.ExportToWkt()
 now = datetime.now()
 
 
-def download_snodas(download_dir: Path, single_date: date) -> list:
+def create_snodas_transport() -> transport_util.SnodasTransport:
+    """
+    Create the transport used to download SNODAS data, as configured by [SNODAS_Download] transport.
+    Returns: a transport_util.FtpTransport or transport_util.HttpsTransport
     """
-    Access the SNODAS FTP site and download the .tar file of single_date.
+    # Initialize this module (if it has not already been done) so that configuration data are available.
+    init_snodas_util()
+
+    if SNODAS_TRANSPORT == 'HTTPS':
+        if not SNODAS_HTTPS_URL:
+            raise ValueError('[SNODAS_Download] https_url must be set when transport = HTTPS.')
+        return transport_util.HttpsTransport(SNODAS_HTTPS_URL)
+    elif SNODAS_TRANSPORT == 'FTP':
+        # Configuration should have something like:
+        #   host = sidads.colorado.edu
+        #   username = anonymous
+        #   password = None
+        #   folder_path = /DATASETS/NOAA/G02158/masked/
+        #   null_value = -9999
+        return transport_util.FtpTransport(HOST, USERNAME, PASSWORD, SNODAS_FTP_FOLDER)
+    else:
+        raise ValueError('Unknown [SNODAS_Download] transport "{}", must be FTP or HTTPS.'.format(SNODAS_TRANSPORT))
+
+
+def download_snodas(download_dir: Path, single_date: date, extract_folder: Path or None = None,
+                    transport: transport_util.SnodasTransport or None = None) -> list:
+    """
+    Access the SNODAS FTP or HTTPS site and download the .tar file of single_date.
     The .tar file saves to the specified download_dir folder.
+    If extract_folder is specified, the .tar file is not saved.  Instead, the .tar file is read as a stream
+    while it is transferred and only the SNODAS_PRODUCT_CODES files are extracted (and gunzipped) into extract_folder.
     download_dir: full path name to the location where the downloaded SNODAS rasters are stored
     single_date: the date of interest
+    extract_folder: full path name to the folder for stream-extracted files, or None to save the .tar file
+    transport: an open transport to reuse for several dates, or None to create (and close) a transport
+        as configured by [SNODAS_Download] transport
+    Returns: list of [timestamp, optional statistics, failed date (or 'None'), metrics_util.DownloadMetrics]
     """
 
-    start_time = datetime.now()
+    start_time = time.perf_counter()
     logger = logging.getLogger(__name__)
     logger.info('Start downloading SNODAS tar for {}'.format(single_date))
 
     # Initialize this module (if it has not already been done) so that configuration data are available.
     init_snodas_util()
 
-    # Connect to FTP server.
-    # Code format for the following block of code in reference to:
-    # http://www.informit.com/articles/article.aspx?p=686162&seqNum=7 and
-    # http://stackoverflow.com/questions/5230966/python-ftp-download-all-files-in-directory
-    ftp = ftplib.FTP(HOST, USERNAME, PASSWORD)
-
-    logger.info('  Connected to FTP server {}. Saving in {}'.format(HOST, single_date))
-
-    # Change to the top-level folder within FTP site storing the SNODAS masked data,
-    # configuration should have something like:
-    #   host = sidads.colorado.edu
-    #   username = anonymous
-    #   password = None
-    #   folder_path = /DATASETS/NOAA/G02158/masked/
-    #   null_value = -9999
-
-    # TODO smalers 2023-04-25 need to implement retries to handle TimeoutError.
-    retries = 10
-    retry_wait_seconds = 5
-
-    ftp.cwd(SNODAS_FTP_FOLDER)
-
-
-    # For example: /DATASETS/NOAA/G02158/masked/
-    os.chdir(download_dir)
-
-    # Change into the folder containing the data from single_date's year (4-digits).
-    ftp.cwd(str(single_date.year) + '/')
-
-    # Change into the folder containing the data from single_date's month (e.g., 01_Jan).
-    month_folder = single_date.strftime('%m') + "_" + single_date.strftime('%b') + '/'
-    ftp.cwd(month_folder)
+    close_transport = False
+    if transport is None:
+        transport = create_snodas_transport()
+        close_transport = True
+    metrics = metrics_util.DownloadMetrics(single_date, transport.get_description())
 
     # Get the day value as 2-digit zero-padded (e.g., 02).
     day = single_date.strftime('%d')
 
-    # Iterate through files in FTP folder and save single_date's data as a file in download folder.
-    # Create empty list to track whether a download is available.
-    no_download_available = []
-    filenames = ftp.nlst()
-    for file in filenames:
-        if file.endswith('{}.tar'.format(day)):
-            # Open the local file to receive the output, same name as the remote, like:
-            #   SNODAS_20230424.tar
-            local_file = open(file, 'wb')
-            # RETR file = retrieve file
-            # local_file.write = function called for each block, so in this case write the binary data
-            # Use a block size that seems to be recommended.
-            block_size = 8192
-            ftp.retrbinary('RETR ' + file, local_file.write, blocksize=block_size)
-
-            logger.info('  Downloaded {}'.format(single_date))
-            # If SNODAS data is available for download, append a '1'.
-            no_download_available.append(1)
-            local_file.close()
-        else:
-            # If SNODAS data is not available for download, append a '0'.
-            no_download_available.append(0)
+    def download_attempt() -> list:
+        """
+        Make one attempt to download the date, called again by retry_util.call_with_retries() for transient errors.
+        Returns: list of 1 (file downloaded) and 0 (file skipped) for the remote files
+        """
+        # Iterate through files in the remote folder for the date (e.g., 2023/04_Apr/)
+        # and save single_date's data as a file in download folder.
+        # Create empty list to track whether a download is available.
+        no_download_available = []
+
+        # Connecting takes no time if an open transport was passed in.
+        step_start_time = time.perf_counter()
+        transport.connect()
+        metrics.connect_seconds = time.perf_counter() - step_start_time
+        logger.info('  Connected to {}. Saving in {}'.format(transport.get_description(), download_dir))
+
+        step_start_time = time.perf_counter()
+        filenames = transport.list_date_files(single_date)
+        metrics.listing_seconds = time.perf_counter() - step_start_time
+        for file in filenames:
+            if file.endswith('{}.tar'.format(day)):
+                metrics.file_name = file
+                step_start_time = time.perf_counter()
+                if extract_folder:
+                    # Extract the product files while the .tar file is being transferred:
+                    # - the tar file is read sequentially so only the needed files are written to disk
+                    # - a .tar or .gz error while reading the stream means that the transfer was cut off,
+                    #   so it is raised as a transfer error that is retried
+                    with transport.open_stream(single_date, file) as stream:
+                        try:
+                            stream_extract_snodas_tar(stream, extract_folder, SNODAS_PRODUCT_CODES)
+                        except (tarfile.ReadError, zlib.error, gzip.BadGzipFile) as e:
+                            raise transport_util.TruncatedTransferError(
+                                '{} from {}'.format(file, transport.get_description()), e) from e
+                    logger.info('  Downloaded and extracted {} to: {}'.format(single_date, extract_folder))
+                else:
+                    # Save to a local file with the same name as the remote, like:
+                    #   SNODAS_20230424.tar
+                    transport.download_file(single_date, file, download_dir / file)
+                    logger.info('  Downloaded {}'.format(single_date))
+                metrics.transfer_seconds = time.perf_counter() - step_start_time
+                metrics.first_byte_seconds = transport.first_byte_seconds
+                metrics.bytes = transport.bytes_transferred
+                # If SNODAS data is available for download, append a '1'.
+                no_download_available.append(1)
+            else:
+                # If SNODAS data is not available for download, append a '0'.
+                no_download_available.append(0)
+        return no_download_available
 
+    try:
+        # Retry transient errors:
+        # - close the connection before retrying because it may be in a bad state
+        # - a stream extraction restarts from the beginning and overwrites the partial files
+        # - an HTTPS download resumes from the partial '.part' file
+        no_download_available, metrics.retries = retry_util.call_with_retries(
+            download_attempt, DOWNLOAD_RETRY_POLICY, DOWNLOAD_CIRCUIT_BREAKER,
+            before_retry=lambda error: transport.close())
+    except (retry_util.RetriesExhaustedError, retry_util.CircuitOpenError) as e:
+        # Fail the date but allow other dates to be processed.
+        if isinstance(e, retry_util.RetriesExhaustedError):
+            metrics.retries = e.retries
+        logger.error('  Download failed for {}: {}'.format(single_date, e))
+        metrics.error = str(e)
+        no_download_available = []
+    except Exception as e:
+        if retry_util.classify_error(e) == retry_util.MISSING:
+            # The folder or file for the date does not exist, for example for a future date.
+            logger.warning('  SNODAS data are not available for {}: {}'.format(single_date, e))
+            metrics.error = str(e)
+            no_download_available = []
+        else:
+            # Record the metrics for the failed download before passing on the error.
+            metrics.error = str(e)
+            metrics.total_seconds = time.perf_counter() - start_time
+            write_download_metrics(metrics)
+            raise
+    finally:
+        if close_transport:
+            transport.close()
+
+    metrics.total_seconds = time.perf_counter() - start_time
     if 1 not in no_download_available:
         # List only contains zeros so was not able to download.
         # Report error if download marker '1' is not in the list.
         logger.error('  Download unsuccessful for {}'.format(single_date), exc_info=True)
+        if not metrics.error:
+            metrics.error = 'No file available for date.'
         failed_date = single_date
 
     else:
         # Report success if download marker '1' is in the list.
-        end_time = datetime.now()
-        download_time = end_time - start_time
         print('Download complete for {}.'.format(single_date), file=sys.stderr)
-        logger.info('  Download complete for {}, took {} ms.'.format(
-            single_date, int(download_time.microseconds/1000)))
+        logger.info('  Download complete for {}, took {:.3f} seconds.'.format(single_date, metrics.total_seconds))
+        metrics.success = True
         failed_date = 'None'
+    write_download_metrics(metrics)
 
     # Set a timestamp to later export to the statistical results:
     # - this helps data users know when the data for a date was last updated
@@ -255,7 +445,7 @@ def download_snodas(download_dir: Path, single_date: date) -> list:
         CALCULATE_SWE_STD_DEV
     ]
 
-    return [timestamp, opt_stats, failed_date]
+    return [timestamp, opt_stats, failed_date, metrics]
 
 
 def format_date_yyyymmdd(date: date) -> str:
@@ -280,6 +470,84 @@ def format_date_yyyymmdd(date: date) -> str:
     return day_string
 
 
+def get_compression_pool() -> compress_util.CompressionPool:
+    """
+    Get the pool that compresses the output zip files in background threads, creating the pool if necessary.
+    Returns: the compression pool
+    """
+    global compression_pool
+
+    # Initialize this module (if it has not already been done) so that configuration data are available.
+    init_snodas_util()
+
+    with compression_pool_lock:
+        if compression_pool is None:
+            compression_pool = compress_util.CompressionPool(COMPRESSION_WORKERS, ZIP_COMPRESSION,
+                                                             ZIP_COMPRESSION_LEVEL)
+        return compression_pool
+
+
+def get_snodas_product_code(file_name: str) -> str or None:
+    """
+    Get the SNODAS product code from a SNODAS data file name.
+    For example, 'us_ssmv11034tS__T0001TTNATS2023042405HP001.dat.gz' is product '1034' (SWE).
+    file_name: SNODAS file name (without path)
+    Returns: the 4-digit product code as a string, or None if the file name does not match the SNODAS convention.
+    """
+    match = re.search(r'ssmv\d(\d{4})', file_name)
+    if match:
+        return match.group(1)
+    else:
+        return None
+
+
+def get_optional_output_fields() -> [[str, str, int]]:
+    """
+    Get the optional output fields that are added to the standard output fields,
+    for the snow cover thresholds and the SNODAS products other than SWE.
+    Returns: list of [csv field name, shapefile field name, number of decimals]
+    """
+    optional_fields = []
+    for csv_field_name, shp_field_name in get_snow_cover_threshold_fields().values():
+        optional_fields.append([csv_field_name, shp_field_name, 2])
+    for csv_field_name, shp_field_name in get_snodas_product_fields().values():
+        optional_fields.append([csv_field_name, shp_field_name, 1])
+    return optional_fields
+
+
+def get_snodas_product_fields() -> dict:
+    """
+    Get the field names for the basin mean of the SNODAS products other than SWE that are processed,
+    which are the SNODAS_PRODUCT_CODES that are in SNODAS_PRODUCTS.
+    Returns: dictionary with key of product code and value a list of [csv field name, shapefile field name],
+        for example {'1036': ['SNODAS_SnowDepth_Mean_mm', 'Depth_mean']}
+    """
+    product_fields = {}
+    for product_code in SNODAS_PRODUCT_CODES:
+        if product_code != '1034' and product_code in SNODAS_PRODUCTS:
+            name, shp_prefix, units, scale = SNODAS_PRODUCTS[product_code]
+            product_fields[product_code] = ['SNODAS_{}_Mean_{}'.format(name, units), '{}_mean'.format(shp_prefix)]
+    return product_fields
+
+
+def get_snow_cover_threshold_fields() -> dict:
+    """
+    Get the field names for the snow cover percent of each SWE threshold in SNOW_COVER_THRESHOLDS_MM.
+    The shapefile field name is limited to 10 characters, so is abbreviated, for example 'SC10_pct' for 10 mm.
+    Returns: dictionary with key of threshold (mm) and value a list of [csv field name, shapefile field name],
+        for example {10.0: ['SNODAS_SnowCover_10mm_percent', 'SC10_pct']}
+    """
+    threshold_fields = {}
+    for threshold in SNOW_COVER_THRESHOLDS_MM:
+        # Format without trailing zeros and use 'p' for the decimal point, for example 2.5 -> '2p5'.
+        threshold_str = '{:g}'.format(threshold)
+        threshold_fields[threshold] = [
+            'SNODAS_SnowCover_{}mm_percent'.format(threshold_str),
+            'SC{}_pct'.format(threshold_str.replace('.', 'p'))
+        ]
+    return threshold_fields
+
+
 def init_snodas_util():
     """
     Initialize this confirmation module.
@@ -290,6 +558,7 @@ def init_snodas_util():
     global TSTOOL_INSTALL_PATH
     global TSTOOL_SNODAS_GRAPHS_PATH
     global AWS_BATCH_PATH
+    global GCP_SHELL_SCRIPT_PATH
 
     global HOST
     global USERNAME
@@ -305,58 +574,182 @@ def init_snodas_util():
     global CELL_SIZE_Y
 
     global GEOJSON_PRECISION
+    global GEOJSON_SIMPLIFY_TOLERANCES
+    global FLATGEOBUF
+    global TOPOJSON
+    global TOPOJSON_QUANTIZATION
     global GEOJSON_ZIP
+    global SNOWCOVER_TIF
+    global SNOWCOVER_TIF_COMPRESSION
+    global SNOWCOVER_TIF_NBITS
+    global ZIP_COMPRESSION
+    global ZIP_COMPRESSION_LEVEL
+    global COMPRESSION_WORKERS
     global TSGRAPH_WEEKLY_UPDATE
     global TSGRAPH_WEEKLY_UPDATE_DATE
+    global GCP_BUCKET_URL
+    global S3_BUCKET_URL
+    global AWS_PROFILE
+    global SYNC_MANIFEST_FOLDER
 
     global CALCULATE_SWE_MIN
     global CALCULATE_SWE_MAX
     global CALCULATE_SWE_STD_DEV
-
-    if init_snodas_util_called:
-        # Already initialized.
-        return
-    else:
-        # Initialize module data.
-        TSTOOL_INSTALL_PATH = config_util.get_config_prop("ProgramInstall.tstool_path")
-        if not TSTOOL_INSTALL_PATH:
-            # Old syntax.
-            TSTOOL_INSTALL_PATH = config_util.get_config_prop("ProgramInstall.tstool_pathname")
-        TSTOOL_SNODAS_GRAPHS_PATH = config_util.get_config_prop(
-            "ProgramInstall.tstool_create_snodas_graphs_command_file")
-        if not TSTOOL_SNODAS_GRAPHS_PATH:
-            # Old syntax.
+    global SNOW_COVER_THRESHOLDS_MM
+    global ZONAL_STATISTICS_ENGINE
+    global ZONAL_STATISTICS_SPARSE_FRACTION
+    global ZONAL_STATISTICS_CACHE_FOLDER
+
+    global SNODAS_PRODUCT_CODES
+
+    global SNODAS_TRANSPORT
+    global SNODAS_HTTPS_URL
+    global DOWNLOAD_METRICS_FILE
+    global DOWNLOAD_RETRY_POLICY
+    global DOWNLOAD_CIRCUIT_BREAKER
+
+    # Lock so that initialization is only done once if called from multiple threads.
+    with init_snodas_util_lock:
+        if init_snodas_util_called:
+            # Already initialized.
+            return
+        else:
+            # Initialize module data.
+            TSTOOL_INSTALL_PATH = config_util.get_config_prop("ProgramInstall.tstool_path")
+            if not TSTOOL_INSTALL_PATH:
+                # Old syntax.
+                TSTOOL_INSTALL_PATH = config_util.get_config_prop("ProgramInstall.tstool_pathname")
             TSTOOL_SNODAS_GRAPHS_PATH = config_util.get_config_prop(
-                "ProgramInstall.tstool_create-snodas-graphs_pathname")
-        AWS_BATCH_PATH = config_util.get_config_prop("ProgramInstall.aws_batch_pathname")
-
-        HOST = config_util.get_config_prop("SNODAS_FTPSite.host")
-        USERNAME = config_util.get_config_prop("SNODAS_FTPSite.username")
-        PASSWORD = config_util.get_config_prop("SNODAS_FTPSite.password")
-        SNODAS_FTP_FOLDER = config_util.get_config_prop("SNODAS_FTPSite.folder_path")
-        NULL_VAL = config_util.get_config_prop("SNODAS_FTPSite.null_value")
-
-        ID_FIELD_NAME = config_util.get_config_prop("BasinBoundaryShapefile.basin_id_fieldname")
-
-        # TODO smalers 2022-04-25 SNODAS Tools 2.0 code forced EPSGS.  Now allow in config file.
-        #CLIP_PROJECTION = "EPSG:" + config_util.get_config_prop("Projections.datum_epsg")
-        #CALCULATE_STATS_PROJECTION = "EPSG:" + config_util.get_config_prop("Projections.calcstats_proj_epsg")
-        CLIP_PROJECTION = config_util.get_config_prop("Projections.datum_crs")
-        CALCULATE_STATS_PROJECTION = config_util.get_config_prop("Projections.calcstats_crs")
-        CELL_SIZE_X = float(config_util.get_config_prop("Projections.calculate_cellsize_x"))
-        CELL_SIZE_Y = float(config_util.get_config_prop("Projections.calculate_cellsize_y"))
-
-        GEOJSON_PRECISION = config_util.get_config_prop("OutputLayers.geojson_precision")
-        GEOJSON_ZIP = config_util.get_config_prop("OutputLayers.geojson_zip")
-        TSGRAPH_WEEKLY_UPDATE = config_util.get_config_prop("OutputLayers.tsgraph_weekly_update")
-        TSGRAPH_WEEKLY_UPDATE_DATE = config_util.get_config_prop("OutputLayers.tsgraph_weekly_update_date")
-
-        CALCULATE_SWE_MIN = config_util.get_config_prop("OptionalZonalStatistics.calculate_swe_minimum")
-        CALCULATE_SWE_MAX = config_util.get_config_prop("OptionalZonalStatistics.calculate_swe_maximum")
-        CALCULATE_SWE_STD_DEV = config_util.get_config_prop("OptionalZonalStatistics.calculate_swe_standard_deviation")
-
-        # Indicate that initialization has occurred.
-        init_snodas_util_called = True
+                "ProgramInstall.tstool_create_snodas_graphs_command_file")
+            if not TSTOOL_SNODAS_GRAPHS_PATH:
+                # Old syntax.
+                TSTOOL_SNODAS_GRAPHS_PATH = config_util.get_config_prop(
+                    "ProgramInstall.tstool_create-snodas-graphs_pathname")
+            AWS_BATCH_PATH = config_util.get_config_prop("ProgramInstall.aws_batch_pathname")
+            GCP_SHELL_SCRIPT_PATH = config_util.get_config_prop("ProgramInstall.gcp_shell_script_pathname")
+
+            HOST = config_util.get_config_prop("SNODAS_FTPSite.host")
+            USERNAME = config_util.get_config_prop("SNODAS_FTPSite.username")
+            PASSWORD = config_util.get_config_prop("SNODAS_FTPSite.password")
+            SNODAS_FTP_FOLDER = config_util.get_config_prop("SNODAS_FTPSite.folder_path")
+            NULL_VAL = config_util.get_config_prop("SNODAS_FTPSite.null_value")
+
+            ID_FIELD_NAME = config_util.get_config_prop("BasinBoundaryShapefile.basin_id_fieldname")
+
+            # TODO smalers 2022-04-25 SNODAS Tools 2.0 code forced EPSGS.  Now allow in config file.
+            #CLIP_PROJECTION = "EPSG:" + config_util.get_config_prop("Projections.datum_epsg")
+            #CALCULATE_STATS_PROJECTION = "EPSG:" + config_util.get_config_prop("Projections.calcstats_proj_epsg")
+            CLIP_PROJECTION = config_util.get_config_prop("Projections.datum_crs")
+            CALCULATE_STATS_PROJECTION = config_util.get_config_prop("Projections.calcstats_crs")
+            CELL_SIZE_X = float(config_util.get_config_prop("Projections.calculate_cellsize_x"))
+            CELL_SIZE_Y = float(config_util.get_config_prop("Projections.calculate_cellsize_y"))
+
+            GEOJSON_PRECISION = config_util.get_config_prop("OutputLayers.geojson_precision")
+            GEOJSON_ZIP = config_util.get_config_prop("OutputLayers.geojson_zip")
+            geojson_simplify_tolerances = config_util.get_config_prop("OutputLayers.geojson_simplify_tolerances")
+            if geojson_simplify_tolerances:
+                GEOJSON_SIMPLIFY_TOLERANCES = [tolerance.strip() for tolerance in geojson_simplify_tolerances.split(",")
+                                               if tolerance.strip()]
+            for tolerance in GEOJSON_SIMPLIFY_TOLERANCES:
+                if float(tolerance) <= 0:
+                    raise ValueError('GeoJSON simplify tolerance must be greater than 0 (tolerance={}).'.format(
+                        tolerance))
+            flatgeobuf = config_util.get_config_prop("OutputLayers.flatgeobuf")
+            if flatgeobuf:
+                FLATGEOBUF = flatgeobuf
+            topojson = config_util.get_config_prop("OutputLayers.topojson")
+            if topojson:
+                TOPOJSON = topojson
+            topojson_quantization = config_util.get_config_prop("OutputLayers.topojson_quantization")
+            if topojson_quantization:
+                TOPOJSON_QUANTIZATION = int(topojson_quantization)
+            snowcover_tif = config_util.get_config_prop("OutputLayers.snowcover_tif")
+            if snowcover_tif:
+                SNOWCOVER_TIF = snowcover_tif
+            snowcover_tif_compression = config_util.get_config_prop("OutputLayers.snowcover_tif_compression")
+            if snowcover_tif_compression:
+                SNOWCOVER_TIF_COMPRESSION = snowcover_tif_compression.upper()
+            snowcover_tif_nbits = config_util.get_config_prop("OutputLayers.snowcover_tif_nbits")
+            if snowcover_tif_nbits:
+                SNOWCOVER_TIF_NBITS = int(snowcover_tif_nbits)
+            zip_compression = config_util.get_config_prop("OutputLayers.zip_compression")
+            if zip_compression:
+                ZIP_COMPRESSION = zip_compression.upper()
+            # Check that the compression is valid.
+            compress_util.get_zip_compression_type(ZIP_COMPRESSION)
+            zip_compression_level = config_util.get_config_prop("OutputLayers.zip_compression_level")
+            if zip_compression_level:
+                ZIP_COMPRESSION_LEVEL = int(zip_compression_level)
+            compression_workers = config_util.get_config_prop("OutputLayers.compression_workers")
+            if compression_workers:
+                COMPRESSION_WORKERS = int(compression_workers)
+            TSGRAPH_WEEKLY_UPDATE = config_util.get_config_prop("OutputLayers.tsgraph_weekly_update")
+            TSGRAPH_WEEKLY_UPDATE_DATE = config_util.get_config_prop("OutputLayers.tsgraph_weekly_update_date")
+            GCP_BUCKET_URL = config_util.get_config_prop("OutputLayers.gcp_bucket_url")
+            S3_BUCKET_URL = config_util.get_config_prop("OutputLayers.s3_bucket_url")
+            AWS_PROFILE = config_util.get_config_prop("OutputLayers.aws_profile")
+            SYNC_MANIFEST_FOLDER = config_util.get_config_prop("OutputLayers.sync_manifest_folder")
+            if not SYNC_MANIFEST_FOLDER:
+                processed_data_folder = config_util.get_config_prop("Folders.processed_data_folder")
+                if processed_data_folder:
+                    SYNC_MANIFEST_FOLDER = str(Path(processed_data_folder) / 'SyncManifests')
+
+            CALCULATE_SWE_MIN = config_util.get_config_prop("OptionalZonalStatistics.calculate_swe_minimum")
+            CALCULATE_SWE_MAX = config_util.get_config_prop("OptionalZonalStatistics.calculate_swe_maximum")
+            CALCULATE_SWE_STD_DEV = config_util.get_config_prop(
+                "OptionalZonalStatistics.calculate_swe_standard_deviation")
+            # Snow cover thresholds, for example "0, 10, 50".
+            snow_cover_thresholds = config_util.get_config_prop("OptionalZonalStatistics.snow_cover_thresholds_mm")
+            if snow_cover_thresholds:
+                SNOW_COVER_THRESHOLDS_MM = sorted({float(threshold) for threshold in snow_cover_thresholds.split(",")
+                                                   if threshold.strip()})
+            for threshold in SNOW_COVER_THRESHOLDS_MM:
+                if threshold < 0 or len(get_snow_cover_threshold_fields()[threshold][1]) > 10:
+                    raise ValueError('Snow cover threshold must be between 0 and 9999 mm (threshold={}).'.format(
+                        threshold))
+
+            engine = config_util.get_config_prop("ZonalStatistics.engine")
+            if engine:
+                ZONAL_STATISTICS_ENGINE = engine.strip().upper()
+            if ZONAL_STATISTICS_ENGINE not in ('PROJECTED', 'GEOGRAPHIC'):
+                raise ValueError('Zonal statistics engine must be PROJECTED or GEOGRAPHIC (engine={}).'.format(
+                    ZONAL_STATISTICS_ENGINE))
+            sparse_fraction = config_util.get_config_prop("ZonalStatistics.sparse_fraction")
+            if sparse_fraction:
+                ZONAL_STATISTICS_SPARSE_FRACTION = float(sparse_fraction)
+            ZONAL_STATISTICS_CACHE_FOLDER = config_util.get_config_prop("ZonalStatistics.cache_folder")
+
+            # Product codes to keep, for example "1034, 1036":
+            # - SWE is always kept since it is needed for the statistics
+            product_codes = config_util.get_config_prop("SNODASParameters.product_codes")
+            if product_codes:
+                SNODAS_PRODUCT_CODES = [code.strip() for code in product_codes.split(",") if code.strip()]
+            if '1034' not in SNODAS_PRODUCT_CODES:
+                SNODAS_PRODUCT_CODES.insert(0, '1034')
+            for product_code in SNODAS_PRODUCT_CODES:
+                if product_code not in SNODAS_PRODUCTS:
+                    logging.getLogger(__name__).warning(
+                        'SNODAS product {} is kept but is not processed (processed products are {}).'.format(
+                            product_code, ', '.join(SNODAS_PRODUCTS.keys())))
+
+            transport = config_util.get_config_prop("SNODAS_Download.transport")
+            if transport:
+                SNODAS_TRANSPORT = transport.strip().upper()
+            SNODAS_HTTPS_URL = config_util.get_config_prop("SNODAS_Download.https_url")
+            DOWNLOAD_METRICS_FILE = config_util.get_config_prop("SNODAS_Download.metrics_file")
+
+            # Retry transient download errors, with defaults if not configured.
+            DOWNLOAD_RETRY_POLICY = retry_util.RetryPolicy(
+                int(config_util.get_config_prop("SNODAS_Download.retries") or 5),
+                float(config_util.get_config_prop("SNODAS_Download.retry_wait_seconds") or 5),
+                float(config_util.get_config_prop("SNODAS_Download.retry_max_wait_seconds") or 120),
+                float(config_util.get_config_prop("SNODAS_Download.retry_deadline_seconds") or 900))
+            DOWNLOAD_CIRCUIT_BREAKER = retry_util.CircuitBreaker(
+                int(config_util.get_config_prop("SNODAS_Download.circuit_breaker_failures") or 3),
+                float(config_util.get_config_prop("SNODAS_Download.circuit_breaker_reset_seconds") or 600))
+
+            # Indicate that initialization has occurred.
+            init_snodas_util_called = True
 
 
 def list_dir(path: Path, pattern: str or [str]) -> [Path]:
@@ -406,6 +799,48 @@ def read_dat_txt_properties ( txt_file_path: Path ):
     return properties
 
 
+def stream_extract_snodas_tar(stream, folder_output: Path, product_codes: [str]) -> [Path]:
+    """
+    Extract SNODAS product files from a .tar stream without first saving the .tar file.
+    The stream is read sequentially (tarfile 'r|' mode) so that it can be a network stream.
+    Only members for the requested product codes are written and .gz members are gunzipped as they are read,
+    so the output is, for example, 'us_ssmv11034tS__T0001TTNATS2023042405HP001.dat'.
+    stream: binary file-like object positioned at the start of the .tar data
+    folder_output: full pathname to the folder where the extracted files are written
+    product_codes: list of SNODAS product codes to extract, for example ['1034']
+    Returns: list of extracted file paths
+    """
+
+    logger = logging.getLogger(__name__)
+    logger.info('Start stream extracting products {} to: {}'.format(product_codes, folder_output))
+
+    extracted_files = []
+    with tarfile.open(fileobj=stream, mode='r|') as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            member_name = Path(member.name).name
+            if get_snodas_product_code(member_name) not in product_codes:
+                # Not needed:
+                # - the stream will skip over the member data when the next member is requested
+                logger.debug('  Skipping: {}'.format(member_name))
+                continue
+            member_file = tar.extractfile(member)
+            if member_name.endswith('.gz'):
+                # Remove the .gz extension and decompress while reading.
+                output_file_path = folder_output / Path(member_name).stem
+                with gzip.GzipFile(fileobj=member_file) as in_file, open(output_file_path, 'wb') as out_file:
+                    shutil.copyfileobj(in_file, out_file)
+            else:
+                output_file_path = folder_output / member_name
+                with open(output_file_path, 'wb') as out_file:
+                    shutil.copyfileobj(member_file, out_file)
+            extracted_files.append(output_file_path)
+            logger.info('  Extracted: {}'.format(output_file_path))
+
+    return extracted_files
+
+
 def untar_snodas_file(file: Path, folder_input: Path, folder_output: Path) -> None:
     """
     Untar downloaded SNODAS .tar file and extract the contained files to the folder_output.
@@ -421,40 +856,65 @@ def untar_snodas_file(file: Path, folder_input: Path, folder_output: Path) -> No
 
     logger.info('Start untarring {}'.format(file_full))
 
-    # Open .tar file.
-    tar = tarfile.open(file_full)
-
-    # Change working directory to output folder.
-    os.chdir(folder_output)
-
     # Extract .tar file and save contents in output directory.
-    tar.extractall()
-
-    # Close .tar file.
-    tar.close()
+    with tarfile.open(file_full) as tar:
+        tar.extractall(path=str(folder_output))
 
     logger.info('  Untarred: {}'.format(file_full))
     logger.info('  Output folder: {}'.format(folder_output))
 
+
+def wait_for_compression() -> None:
+    """
+    Wait for the output zip files that are being compressed in the background.
+    Call before the output files are updated for all dates or uploaded, and at the end of a run.
+    """
+    with compression_pool_lock:
+        pool = compression_pool
+    if pool is not None:
+        pool.wait()
+
+
+def write_download_metrics(metrics: metrics_util.DownloadMetrics) -> None:
+    """
+    Log the download metrics for a date and append them to the DOWNLOAD_METRICS_FILE, if configured.
+    metrics: the download metrics for a date
+    """
+    logger = logging.getLogger(__name__)
+
+    logger.info('  Download metrics for {}: {}'.format(metrics.date, metrics.format_summary()))
+    if DOWNLOAD_METRICS_FILE:
+        try:
+            metrics_util.append_metrics_record(Path(DOWNLOAD_METRICS_FILE), metrics.to_dict())
+        except OSError:
+            # Metrics should not cause processing to fail.
+            logger.warning('  Unable to write download metrics to: {}'.format(DOWNLOAD_METRICS_FILE),
+                           exc_info=True)
+
 # TODO smalers 2023-04-25 alphabeize methods once know that everthing is working.
 # Everything above is alphabetized.  Everything below is not.
 
 
 def delete_irrelevant_snodas_files(file: Path) -> None:
     """
-    Delete file if not identified by the unique SWE ID.
+    Delete file if not identified by one of the configured product codes.
     The SNODAS .tar files contain many SNODAS datasets.
-    For this project, the parameter of interest is SWE, uniquely named with ID '1034'.
+    For this project, the parameter of interest is SWE, uniquely named with ID '1034',
+    and additional products can be configured with the 'SNODASParameters.product_codes' property.
     If the configuration file is set to 'False' for the value of the 'SaveAllSNODASParameters' section,
-    then the parameters other than SWE are deleted.
+    then the other parameters are deleted.
     file: file extracted from the downloaded SNODAS .tar file
     """
 
+    # Initialize this module (if it has not already been done) so that configuration data are available.
+    init_snodas_util()
+
     logger = logging.getLogger(__name__)
 
-    # Check for unique identifier '1034'.
-    if '1034' in str(file):
-        logger.info('  Keeping SWE (1034) file: {}'.format(file))
+    # Check for the product code, for example '1034'.
+    product_code = get_snodas_product_code(Path(file).name)
+    if product_code in SNODAS_PRODUCT_CODES:
+        logger.info('  Keeping product ({}) file: {}'.format(product_code, file))
     else:
         # Delete file.
         file.unlink()
@@ -463,22 +923,28 @@ def delete_irrelevant_snodas_files(file: Path) -> None:
 
 def move_irrelevant_snodas_files(file: str, folder_output: Path) -> None:
     """
-    Move file to the 'OtherParameters' folder if not identified by the unique SWE ID, '1034'.
+    Move file to the 'OtherParameters' folder if not identified by one of the configured product codes.
     The SNODAS .tar files contain many SNODAS datasets.
-    For current SNODAS Tools, the parameter of interest is SWE, uniquely named with ID '1034'.
+    For current SNODAS Tools, the parameter of interest is SWE, uniquely named with ID '1034',
+    and additional products can be configured with the 'SNODASParameters.product_codes' property.
     If the configuration file is set to 'True' for the value of the 'SaveAllSNODASParameters' section,
-    then the parameters other than SWE are moved to the '2_SetFormat/OtherParameters' sub-folder, for example.
+    then the other parameters are moved to the '2_SetFormat/OtherParameters' sub-folder, for example.
     These files are not currently processed.
     file: file extracted from the downloaded SNODAS .tar file
     folder_output: full pathname to folder where the other-than-SWE files are contained, OtherParameters
     """
+
+    # Initialize this module (if it has not already been done) so that configuration data are available.
+    init_snodas_util()
+
     logger = logging.getLogger(__name__)
 
     logger.info('Start moving file {}'.format(file))
 
-    # Check for unique identifier '1034'.
-    if '1034' in file:
-        logger.info('  Not moving SWE 1034 file: {}.'.format(file))
+    # Check for the product code, for example '1034'.
+    product_code = get_snodas_product_code(Path(file).name)
+    if product_code in SNODAS_PRODUCT_CODES:
+        logger.info('  Not moving product {} file: {}.'.format(product_code, file))
     else:
         # Move copy of file to folder_output. Delete original file from original location.
         copy(file, folder_output)
@@ -511,10 +977,9 @@ def extract_snodas_gz_file(file: Path) -> None:
 
     # This block of script was based off of the script from the following resource:
     # http://stackoverflow.com/questions/20635245/using-gzip-module-with-python
-    in_file = gzip.open(str(file), 'r')
-    with open(file.stem, 'wb') as out_file:
+    # The extracted file is in the same folder as the .gz file, without the .gz extension.
+    with gzip.open(str(file), 'r') as in_file, open(file.with_name(file.stem), 'wb') as out_file:
         out_file.write(in_file.read())
-    in_file.close()
 
     # Delete the .gz file.
     file.unlink()
@@ -1013,6 +1478,8 @@ def assign_snodas_projection(tif_file_path: Path) -> None:
     """
     Project clipped raster from its original datum (defaulted to WGS84) to desired projection
     (defaulted to Albers Equal Area).
+    If ZONAL_STATISTICS_ENGINE is 'GEOGRAPHIC', the raster is not projected and is only renamed,
+    because the statistics are calculated on the native grid.
     file: clipped file with original projection to be projected into desired projection
     clip_folder: full pathname of folder for both the originally clipped rasters and the projected clipped rasters
     """
@@ -1033,6 +1500,13 @@ def assign_snodas_projection(tif_file_path: Path) -> None:
         file_full_input = tif_file_path
         file_full_output = tif_file_path.parent / new_name
 
+        if ZONAL_STATISTICS_ENGINE == 'GEOGRAPHIC':
+            # Keep the native grid, which avoids resampling the SWE values.
+            file_full_input.replace(file_full_output)
+            logger.info('  Not projected (zonal statistics engine is GEOGRAPHIC), renamed to: {}'.format(
+                file_full_output.name))
+            return
+
         # Re-project the clipped SNODAS .tif files from original projection to desired projection.
         if os_util.is_linux_os():
             # This is potentially another way to perform the algorithm using the processing module.
@@ -1106,18 +1580,96 @@ def assign_snodas_projection(tif_file_path: Path) -> None:
     return
 
 
+def create_snodas_product_rasters(swe_tif_file_path: Path, folder_input: Path) -> [Path]:
+    """
+    Create clipped and projected rasters for the SNODAS products other than SWE, aligned with the SWE raster.
+    All products for the date are read together through a virtual raster (one band per product)
+    and are clipped and projected with one gdal.Warp to the grid of the SWE raster,
+    so the products use the same cells as SWE and the basin cells determined for SWE are reused.
+    The output is, for example, 'SNODAS_SnowDepth_ClipAndProj_YYYYMMDD.tif', in the same folder as the SWE raster.
+    The values are the stored SNODAS integers (see the SNODAS_PRODUCTS scale factor).
+    swe_tif_file_path: the SWE raster, with name similar to 'SNODAS_SWE_ClipAndProj_YYYYMMDD.tif'
+    folder_input: full pathname to the folder containing the national product .tif files,
+        for example 'us_ssmv11036tS__T0001TTNATS2023042405HP001.tif'
+    Returns: list of the created raster files
+    """
+
+    # Initialize this module (if it has not already been done) so that configuration data are available.
+    init_snodas_util()
+
+    logger = logging.getLogger(__name__)
+
+    date_name = swe_tif_file_path.name[23:31]
+    product_fields = get_snodas_product_fields()
+    product_tif_file_paths = {}
+    for tif_file_path in sorted(list_dir(folder_input, '*' + date_name + '*.tif')):
+        product_code = get_snodas_product_code(tif_file_path.name)
+        if product_code in product_fields:
+            product_tif_file_paths[product_code] = tif_file_path
+    if not product_tif_file_paths:
+        return []
+
+    logger.info('Start clipping and projecting SNODAS products {} to the grid of: {}'.format(
+        ', '.join(product_tif_file_paths.keys()), swe_tif_file_path))
+
+    # Get the SWE grid.
+    swe_ds = gdal.Open(str(swe_tif_file_path))
+    geotransform = swe_ds.GetGeoTransform()
+    width = swe_ds.RasterXSize
+    height = swe_ds.RasterYSize
+    projection = swe_ds.GetProjection()
+    swe_ds = None
+    output_bounds = (geotransform[0], geotransform[3] + height * geotransform[5],
+                     geotransform[0] + width * geotransform[1], geotransform[3])
+
+    # Read all products together and warp them in one pass:
+    # - the national grids are identical so can be stacked as bands
+    # - the geographic engine uses the native grid so cells are copied without resampling
+    vrt_path = '/vsimem/SNODAS_Products_{}.vrt'.format(date_name)
+    vrt_ds = gdal.BuildVRT(vrt_path, [str(path) for path in product_tif_file_paths.values()], separate=True)
+    resample_alg = 'near' if ZONAL_STATISTICS_ENGINE == 'GEOGRAPHIC' else 'bilinear'
+    warped_ds = gdal.Warp('', vrt_ds, format='MEM', srcSRS=CLIP_PROJECTION, dstSRS=projection,
+                          outputBounds=output_bounds, width=width, height=height, resampleAlg=resample_alg,
+                          srcNodata=NULL_VAL, dstNodata=NULL_VAL)
+    vrt_ds = None
+    gdal.Unlink(vrt_path)
+
+    # Write each product band to its own file.
+    product_rasters = []
+    for band, product_code in enumerate(product_tif_file_paths.keys(), start=1):
+        output_file_path = swe_tif_file_path.parent / 'SNODAS_{}_ClipAndProj_{}.tif'.format(
+            SNODAS_PRODUCTS[product_code][0], date_name)
+        gdal.Translate(str(output_file_path), warped_ds, format='GTiff', bandList=[band], noData=NULL_VAL)
+        product_rasters.append(output_file_path)
+        logger.info('  Created: {}'.format(output_file_path))
+    warped_ds = None
+
+    return product_rasters
+
+
 def snow_coverage(tif_file_path: Path, folder_output: Path) -> None:
     """
     Create binary .tif raster indicating snow coverage.
     If a pixel in the input file is > 0 (there is snow on the ground) then the new raster's pixel value is assigned '1'.
-    If a pixel in the input raster is 0 or a null value (there is no snow on the ground),
-    then the new raster's pixel value is assigned '0'.
-    The output raster is used to calculate the percent of daily snow coverage for each basin.
+    If a pixel in the input raster is 0 (there is no snow on the ground), then the new raster's pixel value is assigned '0'.
+    If a pixel in the input raster is a null value, then the new raster's pixel is nodata.
+    The raster is written as a compressed 1-bit or Byte GeoTIFF (see SNOWCOVER_TIF_COMPRESSION and SNOWCOVER_TIF_NBITS).
+    The raster is an output product only.  The snow cover statistics are calculated in z_stat_and_export
+    from the SWE raster, so the raster is not created if SNOWCOVER_TIF is 'False'.
     tif_file_path: daily SNODAS SWE .tif raster, with name similar to 'SNODAS_SWE_ClipAndProj_YYYYMMDD.tif'
     folder_output: full pathname to the folder where the newly created binary snow cover raster is stored
     """
 
+    # Initialize this module (if it has not already been done) so that configuration data are available.
+    init_snodas_util()
+
     logger = logging.getLogger(__name__)
+
+    if SNOWCOVER_TIF.upper() != 'TRUE':
+        logger.info('Not creating snow coverage raster (snowcover_tif = {}) for {}'.format(
+            SNOWCOVER_TIF, tif_file_path))
+        return
+
     logger.info('Start creating snow coverage for {}'.format(tif_file_path))
 
     # Check for projected SNODAS rasters.
@@ -1126,50 +1678,18 @@ def snow_coverage(tif_file_path: Path, folder_output: Path) -> None:
         # Set name of snow cover .tif file, something like:
         #   SNODAS_SnowCover_ClipAndProj_YYYYMMDD.tif
         snow_file = 'SNODAS_SnowCover_ClipAndProj_' + tif_file_path.name[23:]
-
-        # Set full pathname variables for input into later raster calculator options.
-        file_full_input = tif_file_path
         file_full_output_snow = folder_output / snow_file
 
         # Check for previous processing of file.
-        if Path(file_full_input).exists():
+        if file_full_output_snow.exists():
             logger.info('  {} has been previously created. Overwriting.'.format(snow_file))
 
-        # Create QGS object raster layer for input.
-        logger.info('  Creating a QGS raster object layer for: {}'.format(tif_file_path))
-        raster_layer = QgsRasterLayer(str(file_full_input), '{}'.format(tif_file_path))
+        # Threshold the SWE array in memory and write the mask.
+        raster = zonal_util.read_raster(tif_file_path)
+        zonal_util.write_snow_cover_tif(zonal_util.create_snow_cover_mask(raster), raster, file_full_output_snow,
+                                        SNOWCOVER_TIF_COMPRESSION, SNOWCOVER_TIF_NBITS)
 
-        # Check for valid file within QGS environment.
-        if raster_layer.isValid():
-
-            # Set name (without extension) for input into the raster calculator expression.
-            # '@1' means the calculation occurs on band 1 of the raster.
-            raster_input = tif_file_path.name[0:31]
-            raster_calc_name = raster_input + '@1'
-
-            # Set variables for raster calculator options/settings.
-            # See`: http://gis.stackexchange.com/questions/141659/qgis-from-console-raster-algebra
-            resulting_layer = QgsRasterCalculatorEntry()
-            resulting_layer.ref = raster_calc_name
-            resulting_layer.raster = raster_layer
-            resulting_layer.bandNumber = 1
-            entries = [resulting_layer]
-
-            # Set raster calculator options/settings (expression, output path, output type, output extent,
-            # output width, output height, entries, context).
-            # The TranformContext is needed to use the most up-to-date.
-            context = QgsCoordinateTransformContext()
-            calc = QgsRasterCalculator('({})>0'.format(raster_calc_name), '{}'.format(file_full_output_snow), 'GTiff',
-                                       raster_layer.extent(), raster_layer.width(), raster_layer.height(), entries,
-                                       context)
-
-            # Begin calculation.
-            calc.processCalculation()
-
-            logger.info('  Snow calculations complete for: {}'.format(file_full_output_snow))
-
-        else:
-            logger.warning('  Not a valid object raster layer: {}'.format(tif_file_path))
+        logger.info('  Snow calculations complete for: {}'.format(file_full_output_snow))
     else:
         logger.warning("  File does not start with 'SNODAS_SWE_ClipAndProj_'. No raster calculation took place.".format(
             tif_file_path))
@@ -1198,19 +1718,16 @@ def create_empty_csv_files(tif_file_path: Path, boundaries_file_path: Path,
     logger = logging.getLogger(__name__)
     logger.info('Start creating empty csv files for: {}'.format(tif_file_path))
 
-    # Create QGS object vector layer for the basins.
-    basins_layer = QgsVectorLayer(str(boundaries_file_path), 'Reprojected Basins', 'ogr')
+    # Get the basins, which are read from the shapefile once and cached.
+    basins = basin_util.get_basins(boundaries_file_path, ID_FIELD_NAME)
 
     # Check to determine if the shapefile is valid as an object.
     # If this test shows that the shapefile is not a valid vector file,
     # the script does not run the zonal statistic processing (located in the 'else' block of code).
     # If the user gets the following error message, it is important to address the initialization of the QGIS resources.
-    if not basins_layer.isValid():
+    if basins is None:
         logger.warning('  Basin boundary shapefile is not a valid QGS object layer.')
     else:
-        # Get the current directory.
-        curr_dir = Path.cwd()
-
         # Retrieve date of current file.
         # Filename: 'SNODAS_SWE_ClipAndProj_YYYYMMDD'.
         # File[22:30] pulls the 'YYYYMMDD' section.
@@ -1241,49 +1758,45 @@ def create_empty_csv_files(tif_file_path: Path, boundaries_file_path: Path,
         if CALCULATE_SWE_STD_DEV.upper() == 'TRUE':
             fieldnames.extend(['SNODAS_SWE_StdDev_in', 'SNODAS_SWE_StdDev_mm'])
 
+        for csv_field_name, shp_field_name, decimals in get_optional_output_fields():
+            fieldnames.append(csv_field_name)
+
         # Create string variable for name of .csv output file by date. Name: SnowpackStatisticsByDate_YYYYMMDD.csv.
         results_date = 'SnowpackStatisticsByDate_' + date_name + '.csv'
         results_date_path = csv_by_date_folder / results_date
 
         if not results_date_path.exists():
-            # Set directory where the output .csv daily files are stored (by date).
-            os.chdir(csv_by_date_folder)
-
             logger.info('  Creating result CSV: {}'.format(results_date_path))
 
             # Create .csv file with the appropriate fieldnames as the info in the header row (by date).
-            with open(results_date, 'w') as csv_file:
+            with open(results_date_path, 'w') as csv_file:
                 if os_util.is_linux_os():
                     writer = csv.DictWriter(csv_file, fieldnames=fieldnames, delimiter=",")
                 else:
                     writer = csv.DictWriter(csv_file, fieldnames=fieldnames, delimiter=",", lineterminator='\n')
                 writer.writeheader()
 
-        # Iterate through each basin of the basin boundary shapefile.
-        for feature in basins_layer.getFeatures():
+        # Iterate through each basin of the basin boundary shapefile:
+        # - lock because the by basin files are shared by all dates
+        with results_files_lock:
+            for basin_id in basins.ids:
 
-            # Create str variable for the name of output .csv file byBasin.
-            # Name: SnowpackStatisticsByBasin_LOCALID.csv.
-            results_basin = 'SnowpackStatisticsByBasin_' + feature[ID_FIELD_NAME] + '.csv'
-            results_basin_path = csv_by_basin_folder / results_basin
+                # Create str variable for the name of output .csv file byBasin.
+                # Name: SnowpackStatisticsByBasin_LOCALID.csv.
+                results_basin = 'SnowpackStatisticsByBasin_' + basin_id + '.csv'
+                results_basin_path = csv_by_basin_folder / results_basin
 
-            # Check to see if the output file has already been created.
-            # If so, the script moves onto the raster processing.
-            # If not, a .csv file is created with the appropriate fieldnames as the info in the header row (by basin).
-            if not results_basin_path.exists():
+                # Check to see if the output file has already been created.
+                # If so, the script moves onto the raster processing.
+                # If not, a .csv file is created with the appropriate fieldnames as the info in the header row
+                # (by basin).
+                if not results_basin_path.exists():
+                    logger.info('  Creating CSV file: {}'.format(results_basin_path))
 
-                # Set directory where the output .csv daily files are stored (by basin).
-                os.chdir(csv_by_basin_folder)
-
-                logger.info('  Creating CSV file: {}'.format(results_basin_path))
-
-                # Create .csv file with appropriate fieldnames as the header row (by date).
-                with open(results_basin, 'w') as csv_file:
-                    writer = csv.DictWriter(csv_file, fieldnames=fieldnames, delimiter=",")
-                    writer.writeheader()
-
-                # Return directory back to original.
-                os.chdir(curr_dir)
+                    # Create .csv file with appropriate fieldnames as the header row (by date).
+                    with open(results_basin_path, 'w') as csv_file:
+                        writer = csv.DictWriter(csv_file, fieldnames=fieldnames, delimiter=",")
+                        writer.writeheader()
 
     logger.info('  Finished creating empty csv files for: {}'.format(tif_file_path))
 
@@ -1307,15 +1820,15 @@ def delete_by_basin_csv_rows_for_date(tif_file_path: Path, boundaries_file_path:
     logger = logging.getLogger(__name__)
     logger.info('Start deleting repeated rows in ByBasin file for: {}'.format(tif_file_path))
 
-    # Create a QGS object vector layer for the boundaries.
-    basins_layer = QgsVectorLayer(str(boundaries_file_path), 'Reprojected Basins', 'ogr')
+    # Get the basins, which are read from the shapefile once and cached.
+    basins = basin_util.get_basins(boundaries_file_path, ID_FIELD_NAME)
 
     # Check to determine if the shapefile is valid as an object.
     # If this test shows that the shapefile is not a valid vector file,
     # the script does not run the zonal statistic processing (located in the 'else' block of code).
     # If the user gets the  following error message,
     # it is important to address the initialization of the QGIS resources.
-    if not basins_layer.isValid():
+    if basins is None or not basins.ids:
         logger.warning('  Basin boundary shapefile is not a valid QGS object layer.')
     else:
         # Retrieve date of current file.
@@ -1323,88 +1836,77 @@ def delete_by_basin_csv_rows_for_date(tif_file_path: Path, boundaries_file_path:
         # File[22:30] is pulling the 'YYYYMMDD' section.
         date_name = tif_file_path.name[23:31]
 
-        # Iterate through each basin of the basin boundary shapefile.
-        for feature in basins_layer.getFeatures():
-            # Create string variable to be used as the name for the .csv output file (by basin):
-            # - this is just a template string populated from the first feature
-            results_basin_file = 'SnowpackStatisticsByBasin_' + feature[ID_FIELD_NAME] + '.csv'
-            break
-
-        # Set directory where the output .csv daily files are stored (by basin).
-        os.chdir(csv_by_basin_folder)
-        # Check to see if the daily raster has already been processed:
-        # - the first CSV file is read and put into file_contents
-        # - then it is immediately closed so there are no issues trying to close it later
-        # - this assumes that the first basin is successfully processed and can be relied on for the check
-        results_basin_path = csv_by_basin_folder / results_basin_file
-        file_handler = open(results_basin_path)
-        # Read the entire file into 'file_contents'.
-        file_contents = file_handler.read()
-        file_handler.close()
-
-        need_to_edit = False
-
-        # TODO smalers 2023-04-25 not sure that the check on extension is needed with the current code:
-        # - maybe was put in to guard against some unexpected behavior?
-        if date_name in file_contents and str(tif_file_path).endswith('.tif'):
-            # Found the tif_file_path date in the file so need to edit
-            need_to_edit = True
-            logger.info('  Date {} appears to have been previously been processed based on check of:')
-            logger.info('    {}'.format(results_basin_path))
-            logger.info("  Removing data for this date from all 'ByBasin' csv files so new results can be added.")
-        if '\n\n' in file_contents:
-            # Not sure why blank lines are in the csv.
-            logger.info('  Found blank lines so need to edit to remove:')
-            logger.info('    {}'.format(results_basin_path))
-            need_to_edit = True
-        if '\r\n\r\n' in file_contents:
-            # Not sure why blank lines are in the csv.
-            logger.info('  Found blank lines so need to edit to remove:')
-            logger.info('    {}'.format(results_basin_path))
-            need_to_edit = True
-
-        if need_to_edit:
-
-            # Iterate through each basin of the basin boundary shapefile.
-            for feature in basins_layer.getFeatures():
-
-                # Create string variable to be used as the name for the input and output .csv file (by basin).
-                results_basin_orig_path = csv_by_basin_folder / \
-                                          ('SnowpackStatisticsByBasin_' + feature[ID_FIELD_NAME] + '.csv')
-                results_basin_edit_path = csv_by_basin_folder / \
-                                          ('SnowpackStatisticsByBasin_' + feature[ID_FIELD_NAME] + 'edit.csv')
-
-                logger.info('  Removing {} rows:'.format(date_name))
-                logger.info('    read from: {}'.format(results_basin_orig_path))
-                logger.info('      save to: {}'.format(results_basin_edit_path))
-
-                # Open input_file and output_file files. Input will be read and output_file will be written.
-                input_file = open(results_basin_orig_path, 'r')
-                output_file = open(results_basin_edit_path, 'w')
-
-                # If the first column in the input_file row is 'tif_file_path' date,
-                # the row is not written to the new file.
-                writer = csv.writer(output_file)
-                for row in csv.reader(input_file):
-                    if len(row) == 0:
-                        # Empty row, don't write.
-                        continue
-                    else:
-                        if row[0] != date_name:
-                            writer.writerow(row)
-                input_file.close()
-                output_file.close()
-
-                # Delete original, now inaccurate, csv ByBasin file.
-                try:
-                    results_basin_orig_path.unlink()
-                except OSError as e:
-                    logger.error('  Error deleting file: {}'.format(results_basin_orig_path))
-                    logger.error('  Exception: {}'.format(e))
+        # Create string variable to be used as the name for the .csv output file (by basin):
+        # - this is just a template string populated from the first basin
+        results_basin_file = 'SnowpackStatisticsByBasin_' + basins.ids[0] + '.csv'
+
+        # Lock because the by basin files are shared by all dates.
+        with results_files_lock:
+            # Check to see if the daily raster has already been processed:
+            # - the first CSV file is read and put into file_contents
+            # - then it is immediately closed so there are no issues trying to close it later
+            # - this assumes that the first basin is successfully processed and can be relied on for the check
+            results_basin_path = csv_by_basin_folder / results_basin_file
+            file_handler = open(results_basin_path)
+            # Read the entire file into 'file_contents'.
+            file_contents = file_handler.read()
+            file_handler.close()
+
+            need_to_edit = False
+
+            # TODO smalers 2023-04-25 not sure that the check on extension is needed with the current code:
+            # - maybe was put in to guard against some unexpected behavior?
+            if date_name in file_contents and str(tif_file_path).endswith('.tif'):
+                # Found the tif_file_path date in the file so need to edit
+                need_to_edit = True
+                logger.info('  Date {} appears to have been previously been processed based on check of:')
+                logger.info('    {}'.format(results_basin_path))
+                logger.info("  Removing data for this date from all 'ByBasin' csv files so new results can be added.")
+            if '\n\n' in file_contents:
+                # Not sure why blank lines are in the csv.
+                logger.info('  Found blank lines so need to edit to remove:')
+                logger.info('    {}'.format(results_basin_path))
+                need_to_edit = True
+            if '\r\n\r\n' in file_contents:
+                # Not sure why blank lines are in the csv.
+                logger.info('  Found blank lines so need to edit to remove:')
+                logger.info('    {}'.format(results_basin_path))
+                need_to_edit = True
+
+            if need_to_edit:
+
+                # Iterate through each basin of the basin boundary shapefile.
+                for basin_id in basins.ids:
+
+                    # Create string variable to be used as the name for the input and output .csv file (by basin).
+                    results_basin_orig_path = csv_by_basin_folder / ('SnowpackStatisticsByBasin_' + basin_id + '.csv')
+                    results_basin_edit_path = csv_by_basin_folder / \
+                                              ('SnowpackStatisticsByBasin_' + basin_id + 'edit.csv')
+
+                    logger.info('  Removing {} rows:'.format(date_name))
+                    logger.info('    read from: {}'.format(results_basin_orig_path))
+                    logger.info('      save to: {}'.format(results_basin_edit_path))
+
+                    # Open input_file and output_file files. Input will be read and output_file will be written.
+                    input_file = open(results_basin_orig_path, 'r')
+                    output_file = open(results_basin_edit_path, 'w')
+
+                    # If the first column in the input_file row is 'tif_file_path' date,
+                    # the row is not written to the new file.
+                    writer = csv.writer(output_file)
+                    for row in csv.reader(input_file):
+                        if len(row) == 0:
+                            # Empty row, don't write.
+                            continue
+                        else:
+                            if row[0] != date_name:
+                                writer.writerow(row)
+                    input_file.close()
+                    output_file.close()
 
-                # Rename the new edited csv ByBasin file to its original name of SnowpackStatisticsByBasin_ +
-                # feature[ID_FIELD_NAME] + '.csv'
-                Path(results_basin_edit_path).rename(results_basin_orig_path)
+                    # Replace the original, now inaccurate, csv ByBasin file with the new edited file, in one step
+                    # so that the file is never missing.
+                    os.replace(results_basin_edit_path, results_basin_orig_path)
 
     logger.info('  Finished {}'.format(tif_file_path))
 
@@ -1413,6 +1915,9 @@ def zip_shapefile(shp_file_path: Path, csv_by_date_folder: Path, delete_original
     """
     Code block from http://emilsarcpython.blogspot.com/2015/10/zipping-shapefiles-with-python.html
     List of file extensions included in the shapefile.
+    The files are compressed in the background (see get_compression_pool()) and the zip file is replaced
+    when it is complete.  Call wait_for_compression() to wait for the zip file.
+    The 'LatestDate' files are updated when the zip file is complete, so do not zip the 'LatestDate' shapefile.
     shp_file_path: the output shapefile (any extension). All other extensions will be included by means of the function.
     csv_by_date_folder: full pathname of folder containing the results by date (.csv files, GeoJSON, and shapefiles)
     delete_original: Boolean string to determine if the original unzipped shapefile files should be deleted.
@@ -1434,27 +1939,25 @@ def zip_shapefile(shp_file_path: Path, csv_by_date_folder: Path, delete_original
     # Get the file name without the extension.
     in_name = shp_file_path.stem
     file_to_zip = csv_by_date_folder / (in_name + '.zip')
-    # The third argument for zipfile - ZIP_DEFLATED - is what actually compresses the file.
-    # Otherwise, the file is essentially copied.
-    zip_file = zipfile.ZipFile(str(file_to_zip), 'w', zipfile.ZIP_DEFLATED)
-
-    # Empty list to store files to delete.
-    files_to_delete = []
-
-    for fl in os.listdir(csv_by_date_folder):
-        for extension in extensions:
-            if fl == (in_name + extension):
-                # Get full pathname of file.
-                in_file = csv_by_date_folder / fl
-                files_to_delete += [str(in_file)]
-                zip_file.write(str(in_file), fl)
-                break
-    zip_file.close()
 
-    # Delete unzipped shapefile files, if configured.
-    if delete_original.upper() == 'TRUE':
-        for fl in files_to_delete:
-            Path(fl).unlink()
+    # Move or link the shapefile files to a folder that is only used for the zip file,
+    # so that the files do not change while they are compressed in the background:
+    # - moving deletes the unzipped shapefile files, if configured
+    zip_folder = publish_util.create_staging_folder(csv_by_date_folder)
+    files_to_zip = []
+    for extension in extensions:
+        in_file = csv_by_date_folder / (in_name + extension)
+        if in_file.exists():
+            zip_folder_file = zip_folder / in_file.name
+            if delete_original.upper() == 'TRUE':
+                os.replace(in_file, zip_folder_file)
+            else:
+                publish_util.link_file(in_file, zip_folder_file)
+            files_to_zip.append((zip_folder_file, in_file.name))
+
+    # The 'LatestDate' zipped shapefile is created from the zip file when it is complete.
+    get_compression_pool().submit_zip(file_to_zip, files_to_zip, zip_folder,
+                                      functools.partial(update_latest_date_files, csv_by_date_folder))
 
 
 def z_stat_and_export(tif_file_path: Path, boundaries_file_path: Path,
@@ -1473,6 +1976,7 @@ def z_stat_and_export(tif_file_path: Path, boundaries_file_path: Path,
     csv_by_basin_folder: full pathname to the folder containing results by basin (.csv file)
     clip_folder: full pathname to the folder containing all daily clipped, projected .tif SNODAS rasters
     snow_cover_folder: full pathname to the folder containing all binary snow coverage rasters
+        (not used because the snow cover is calculated from the SWE raster)
     today_date: date of processed SNODAS data
     timestamp: the download timestamp in datetime format (returned in download_snodas function)
     output_crs: the desired projection of the output shapefile and GeoJSON (configured in configuration file),
@@ -1492,9 +1996,6 @@ def z_stat_and_export(tif_file_path: Path, boundaries_file_path: Path,
     # exported and then deleted from the shapefile.
     d = {}
 
-    # Hold current directory in a variable, curr_dir, to be called at the end of the script.
-    curr_dir = Path.cwd()
-
     # Determine the date for current file:
     # - file example: SNODAS_SWE_ClipAndProj_YYYYMMDD.tif
     # - file name using range [23:31]: YYYYMMDD
@@ -1526,13 +2027,30 @@ def z_stat_and_export(tif_file_path: Path, boundaries_file_path: Path,
     if CALCULATE_SWE_STD_DEV.upper() == 'TRUE':
         fieldnames.extend(['SNODAS_SWE_StdDev_in', 'SNODAS_SWE_StdDev_mm'])
 
-    # Create a layer for the input shapefile (for example, the Colorado River Basin projected shapefile).
-    vector_layer = QgsVectorLayer(str(boundaries_file_path), 'Reprojected Basins', 'ogr')
+    # Snow cover percent for each optional SWE threshold and mean of each additional SNODAS product.
+    snow_cover_threshold_fields = get_snow_cover_threshold_fields()
+    snodas_product_fields = get_snodas_product_fields()
+    optional_output_fields = get_optional_output_fields()
+    for csv_field_name, shp_field_name, decimals in optional_output_fields:
+        fieldnames.append(csv_field_name)
+
+    # Create a memory layer from the basins of the input shapefile
+    # (for example, the Colorado River Basin projected shapefile):
+    # - the basins are read from the shapefile once and cached, and are not changed
+    # - the statistics fields are added to the memory layer so that the shapefile is not modified
+    #   and multiple dates can be processed at the same time
+    # - the memory layer has different feature identifiers, so source_feature_ids is used to look up
+    #   the zonal statistics and the cached geometry, which use the shapefile feature identifiers
+    vector_layer = None
+    source_feature_ids = None
+    basins = basin_util.get_basins(boundaries_file_path, ID_FIELD_NAME)
+    if basins is not None:
+        vector_layer, source_feature_ids = basins.create_layer('Reprojected Basins')
 
     # Check validity of shapefile as a QGS object. If this test shows that the vector is not a valid vector file,
     # the script does not run the zonal statistic processing (located in the 'else' block of code).
     # Address the initialization of the QGIS resources if received following error message.
-    if not vector_layer.isValid():
+    if vector_layer is None or not vector_layer.isValid():
         logger.warning('  Vector shapefile is not a valid QGS object layer: {}'.format(boundaries_file_path))
 
     else:
@@ -1546,43 +2064,63 @@ def z_stat_and_export(tif_file_path: Path, boundaries_file_path: Path,
             e_std = None
             e_swe_s_dev_in = None
 
-            # Set directory to the directory where the output .csv daily files are contained (by basin).
-            os.chdir(csv_by_basin_folder)
-
             # Create date value of the working dictionary.
             d['Date_YYYYMMDD'] = date_name
 
             logger.info('  Start processing zonal statistics.')
 
-            # Retrieve the date for 7 days before today and convert to string format (YYYYMMDD).
-            week_ago_date = today_date - timedelta(days=7)
-            week_ago_str = format_date_yyyymmdd(week_ago_date)
-
-            # Create string variable with week_ago_str to be used as the title for the .csv output file (by bate).
-            results_date_csv = 'SnowpackStatisticsByDate_' + week_ago_str + '.csv'
-            results_date_csv_full_path = csv_by_date_folder / results_date_csv
-
-            # Set full pathname of rasters for later input into the zonal stat tool.
-            snow_file = 'SNODAS_SnowCover_ClipAndProj_' + date_name + '.tif'
+            # Set full pathname of the raster for input into the zonal statistics.
             raster_path_h = clip_folder / tif_file_path.name
-            raster_path_s = snow_cover_folder / snow_file
 
             # Open vector_layer for editing.
             vector_layer.startEditing()
 
-            # Create the raster layer, needed by QgsZonalStatistics.
-            raster_layer = QgsRasterLayer(str(raster_path_h))
-            snow_raster_layer = QgsRasterLayer(str(raster_path_s))
-
-            # Set input object options for the zonal stat tool - Mean.
-            # input shapefile: must be a valid QGS vector layer.
-            # input raster: Must be a valid QGS raster layer.
-            # field prefix (string): Prefix of the attribute field header containing the zonal statistics.
-            # band (integer): Band of raster in which the calculations are processed.
-            # statistics type: Zonal statistic to be calculated.
-
-            zonal_stats = QgsZonalStatistics(vector_layer, raster_layer, "SWE_", 1, QgsZonalStatistics.Mean)
-            zonal_stats.calculateStatistics(None)
+            # Read the SWE raster into memory and calculate the zonal statistics for all basins in one pass:
+            # - the snow cover (SWE > 0) is derived from the same array so the snow cover raster is not read
+            # - the snow cover for the optional SWE thresholds is also counted from the same array
+            # - the basin cells are cached so the basins are only rasterized once for the grid
+            # - the basin cells with data (effective area) are cached for each version of the SNODAS nodata mask
+            raster = zonal_util.read_raster(raster_path_h)
+            cache_folder = Path(ZONAL_STATISTICS_CACHE_FOLDER) if ZONAL_STATISTICS_CACHE_FOLDER else None
+            # - for the GEOGRAPHIC engine, cells are weighted by area relative to a projected cell
+            basin_cells = zonal_util.get_valid_basin_cells(boundaries_file_path, raster, cache_folder,
+                                                           abs(CELL_SIZE_X * CELL_SIZE_Y))
+            # - if most cells have no snow (summer), only the nonzero cells are processed
+            basin_stats = zonal_util.calculate_zonal_statistics(
+                raster, basin_cells, zonal_util.create_snow_cover_mask(raster), SNOW_COVER_THRESHOLDS_MM,
+                ZONAL_STATISTICS_SPARSE_FRACTION)
+
+            # Calculate the statistics for the additional SNODAS products, which use the same grid as SWE,
+            # so the basin cells are reused.
+            product_stats = {}
+            for product_code in snodas_product_fields.keys():
+                product_tif_file_path = clip_folder / 'SNODAS_{}_ClipAndProj_{}.tif'.format(
+                    SNODAS_PRODUCTS[product_code][0], date_name)
+                if not product_tif_file_path.exists():
+                    logger.warning('  SNODAS product {} raster does not exist: {}'.format(
+                        product_code, product_tif_file_path))
+                    continue
+                product_raster = zonal_util.read_raster(product_tif_file_path)
+                product_basin_cells = zonal_util.get_valid_basin_cells(boundaries_file_path, product_raster,
+                                                                       cache_folder, abs(CELL_SIZE_X * CELL_SIZE_Y))
+                # - only the mean is used for the products, so the snow cover is not calculated
+                product_stats[product_code] = zonal_util.calculate_zonal_statistics(
+                    product_raster, product_basin_cells, None, None, ZONAL_STATISTICS_SPARSE_FRACTION)
+
+            # Fields for the zonal statistics, named as previously created by QgsZonalStatistics:
+            # - key: attribute field name
+            # - value: key in the zonal_util statistics dictionary
+            zonal_fields = {
+                'SWE_mean': 'mean',
+                'Cellcount': 'count',
+                'SCoversum': 'snow_count'
+            }
+            if CALCULATE_SWE_MIN.upper() == 'TRUE':
+                zonal_fields['SWE_min'] = 'min'
+            if CALCULATE_SWE_MAX.upper() == 'TRUE':
+                zonal_fields['SWE_max'] = 'max'
+            if CALCULATE_SWE_STD_DEV.upper() == 'TRUE':
+                zonal_fields['SWE_stdev'] = 'stdev'
 
             # output_dict - key: csv field name value: [shapefile attribute field name, attribute field type
             # ('None' for outputs of zonal statistics because a new field does not need to be created)]
@@ -1609,12 +2147,39 @@ def z_stat_and_export(tif_file_path: Path, boundaries_file_path: Path,
                 output_dict.update({'SNODAS_SWE_StdDev_mm': ['SWE_stdev', 'None'],
                                    'SNODAS_SWE_StdDev_in': ['SWESDev_in', QVariant.Double]})
 
+            for csv_field_name, shp_field_name, decimals in optional_output_fields:
+                output_dict[csv_field_name] = [shp_field_name, QVariant.Double]
+
             # Create new fields in shapefile attribute table. Ignore fields that are already populated by zstats plugin.
             for key, value in output_dict.items():
                 if value[1] != 'None':
                     new_field = QgsField(value[0], value[1])
                     vector_layer.dataProvider().addAttributes([new_field])
 
+            # Create the zonal statistics fields and set the values for each basin.
+            for field_name in zonal_fields.keys():
+                vector_layer.dataProvider().addAttributes([QgsField(field_name, QVariant.Double)])
+            vector_layer.updateFields()
+            for feature in vector_layer.getFeatures():
+                source_feature_id = source_feature_ids[feature.id()]
+                stats = basin_stats.get(source_feature_id)
+                for field_name, stat_name in zonal_fields.items():
+                    feature[field_name] = None if stats is None else stats[stat_name]
+                # Snow cover percent for the optional SWE thresholds, from the cell counts.
+                for threshold, (csv_field_name, shp_field_name) in snow_cover_threshold_fields.items():
+                    if stats is None or not stats['count']:
+                        feature[shp_field_name] = None
+                    else:
+                        feature[shp_field_name] = stats['threshold_snow_count'][threshold] / stats['count'] * 100
+                # Mean of the additional SNODAS products, converted from the stored integer to the units.
+                for product_code, (csv_field_name, shp_field_name) in snodas_product_fields.items():
+                    basin_product_stats = product_stats.get(product_code, {}).get(source_feature_id)
+                    if basin_product_stats is None or basin_product_stats['mean'] is None:
+                        feature[shp_field_name] = None
+                    else:
+                        feature[shp_field_name] = basin_product_stats['mean'] * SNODAS_PRODUCTS[product_code][3]
+                vector_layer.updateFeature(feature)
+
             # Set raster calculator expression to populate the 'Mean' field. This field calculates mm.
             # Change the QGSExpression if different units are desired.
             e_mean = QgsExpression('SWE_mean')
@@ -1624,11 +2189,6 @@ def z_stat_and_export(tif_file_path: Path, boundaries_file_path: Path,
             e_swe_mean_in = QgsExpression('SWE_mean / 25.4')
 
             if CALCULATE_SWE_MIN.upper() == 'TRUE':
-                # Set input object options for the zonal stat tool (Minimum).
-                zonal_stats = QgsZonalStatistics(vector_layer, raster_layer, "SWE_", 1, QgsZonalStatistics.Min)
-                # Call zonal stat tool to start processing.
-                zonal_stats.calculateStatistics(None)
-
                 # Set raster calculator expression to populate the 'Min' field.
                 e_min = QgsExpression('SWE_min')
 
@@ -1636,11 +2196,6 @@ def z_stat_and_export(tif_file_path: Path, boundaries_file_path: Path,
                 e_swe_min_in = QgsExpression('SWE_min  / 25.4')
 
             if CALCULATE_SWE_MAX.upper() == 'TRUE':
-                # Set input object options for zonal stat tool (Maximum).
-                zonal_stats = QgsZonalStatistics(vector_layer, raster_layer, "SWE_", 1, QgsZonalStatistics.Max)
-                # Call zonal stat tool to start processing.
-                zonal_stats.calculateStatistics(None)
-
                 # Set raster calculator expression to populate the 'Max' field.
                 e_max = QgsExpression('SWE_max')
 
@@ -1648,30 +2203,12 @@ def z_stat_and_export(tif_file_path: Path, boundaries_file_path: Path,
                 e_swe_max_in = QgsExpression('SWE_max / 25.4')
 
             if CALCULATE_SWE_STD_DEV.upper() == 'TRUE':
-                # Set input object options for the zonal stat tool (Standard Deviation).
-                zonal_stats = QgsZonalStatistics(vector_layer, raster_layer, "SWE_", 1, QgsZonalStatistics.StDev)
-                # Call zonal stat tool to start processing.
-                zonal_stats.calculateStatistics(None)
-
                 # Set raster calculator expression to populate the 'Std Dev' field.
                 e_std = QgsExpression('SWE_stdev')
 
                 # Set the raster calculator expression to populate the 'SWESDev_in' field.
                 e_swe_s_dev_in = QgsExpression('SWE_stdev / 25.4')
 
-            # Set input object options for the zonal stat tool (Count of Total Basin Cells).
-            zonal_stats = QgsZonalStatistics(vector_layer, raster_layer, "Cell", 1, QgsZonalStatistics.Count)
-            # Call zonal stat tool to start processing.
-            zonal_stats.calculateStatistics(None)
-
-            # Set input object options for the zonal stat tool (Sum of snow cover raster).
-            zonal_stats = QgsZonalStatistics(vector_layer, snow_raster_layer, "SCover", 1, QgsZonalStatistics.Sum)
-            # Call zonal stat tool to start processing.
-            zonal_stats.calculateStatistics(None)
-
-            # Update changes to fields of shapefile.
-            vector_layer.updateFields()
-
             # Set raster calculator expression to populate the 'Area_sqmi' field.
             # The area of the cell (square meters) multiplied by the count of basin cells.
             # There are 2589988.10 sq meters in 1 sq mile.
@@ -1686,19 +2223,16 @@ def z_stat_and_export(tif_file_path: Path, boundaries_file_path: Path,
             # There are 640 acres in 1 square mile. There are 304.8 mm in 1 foot.
             v = QgsExpression('Area_sqmi * SWE_mean * 640 / 304.8')
 
+            # The 'SWEVolC_af' field (1-week change in volume) is NULL here.
+            # It is calculated from the stored volumes after the dates are processed (see update_one_week_change),
+            # so that dates can be processed in any order.
+            c = QgsExpression('NULL')
+
             # Create an empty array to hold the components of the zonal stats calculations dictionary.
-            # This array is copied to the .csv output file and then erased only to be filled again
-            # with the next daily raster's dictionary calculations (by date).
-            # There are two arrays in this function, array_date and array_basin.
-            # The main difference is that the array_basin only holds one dictionary at a time before it writes
-            # to a .csv file (one dictionary per basin and then the information is deleted).
-            # The array_date holds multiple dictionaries at one time (one dictionary per basin).
-            # The information in the array is only deleted after the date changes).
+            # The array_date holds one dictionary per basin and is written to the by date .csv file
+            # and the by basin .csv files after all basins are processed.
             array_date = []
 
-            # Set directory to the directory where the output .csv daily files are stored (by basin).
-            os.chdir(csv_by_basin_folder)
-
             # Define output coordinate reference system.
             if output_crs.find(":") >= 0:
                 # Use as is.
@@ -1710,36 +2244,6 @@ def z_stat_and_export(tif_file_path: Path, boundaries_file_path: Path,
             # Iterate through each basin of the basin boundary shapefile.
             for feature in vector_layer.getFeatures():
 
-                # Check to see if the SNODAS data has already been processed for the week_ago date.
-                os.chdir(csv_by_date_folder)
-
-                # If so, get the volume value from last week for each basin.
-                # The for loop iterates over the basins and calculates the one-week-change in volume statistic.
-                if results_date_csv_full_path.exists():
-                    with open(results_date_csv) as csv_file:
-                        reader = csv.DictReader(csv_file)
-                        has_rows = False
-                        for row in reader:
-                            has_rows = True
-                            if row['{}'.format(ID_FIELD_NAME)] == feature[ID_FIELD_NAME]:
-                                week_ago_value = row['SNODAS_SWE_Volume_acft']
-                                break
-
-                        if not has_rows:
-                            logger.warning('The DictReader is empty.')
-
-                    # Set raster calculator expression to populate 'SWEVolC_af' field.
-                    # 'SWEVol_af' from today ('SWEVol_af' from 7 days ago).
-                    c = QgsExpression('SWEVol_af - {}'.format(week_ago_value))
-
-                else:
-                    c = QgsExpression('noData')
-
-                os.chdir(csv_by_basin_folder)
-
-                # Create string variable to be used as the title for the output .csv file (by basin).
-                results_basin = 'SnowpackStatisticsByBasin_' + feature[ID_FIELD_NAME] + '.csv'
-
                 # Create dictionary that sets rounding properties (to what decimal place) for each field.
                 # Key is the field name.
                 # Value[0] is the preset raster calculator expression.
@@ -1762,6 +2266,8 @@ def z_stat_and_export(tif_file_path: Path, boundaries_file_path: Path,
                 if CALCULATE_SWE_STD_DEV.upper() == 'TRUE':
                     rounding_props['SWE_stdev'] = [e_std, 0]
                     rounding_props['SWESDev_in'] = [e_swe_s_dev_in, 1]
+                for csv_field_name, shp_field_name, decimals in optional_output_fields:
+                    rounding_props[shp_field_name] = [QgsExpression(shp_field_name), decimals]
 
                 # Perform raster calculations for each field.
                 for key, value in rounding_props.items():
@@ -1791,9 +2297,6 @@ def z_stat_and_export(tif_file_path: Path, boundaries_file_path: Path,
                 # Update features of basin shapefile.
                 vector_layer.updateFeature(feature)
 
-                # Create empty array (basin) to hold the components of the zonal stats calculations.
-                array_basin = []
-
                 # Append stats to dictionary 'd'.
                 d['Updated_Timestamp'] = timestamp
 
@@ -1808,234 +2311,157 @@ def z_stat_and_export(tif_file_path: Path, boundaries_file_path: Path,
                             d[key] = feature[ID_FIELD_NAME]
 
                 # Append current dictionary to the empty basin array.
-                # This array is exported to the output .csv file at the end of this 'for' loop.
-                array_basin.append(d.copy())
-
-                # Append current dictionary to the empty basin array.
-                # This array is exported to the output .csv file outside of this 'for' loop.
+                # This array is exported to the output .csv files (by date and by basin) outside of this 'for' loop.
                 array_date.append(d.copy())
 
-                # Export the daily date array to a .csv file. Overwrite the .csv file if it already exists.
-                # See: http://stackoverflow.com/questions/28555112/export-a-simple-dictionary-into-excel-file-in-python
-                with open(results_basin, 'a') as csv_file:
-                    csv_writer = csv.DictWriter(csv_file, delimiter=",", fieldnames=fieldnames)
-                    for row in array_basin:
-                        csv_writer.writerow(row)
-                # Read and sort every line but the header.
-                with open(results_basin, 'r') as full_csv_file:
-                    csv_file_contents = list(full_csv_file)
-                    csv_file_contents[1:] = sorted(csv_file_contents[1:])
-                # Write the sorted list to the file.
-                with open(results_basin, 'w') as sorted_csv_file:
-                    for item in csv_file_contents:
-                        sorted_csv_file.write('{}'.format(item))
-
-            # Close edits and save changes to the shapefile.
+            # Close edits and save the statistics to the per-date memory layer (the shapefile is not changed).
             vector_layer.commitChanges()
 
-            # Delete attribute fields of the shapefile used in the calculations
-            # but not important for export to final product shapefile.
-            cell_count_index = vector_layer.dataProvider().fieldNameIndex('CellCount')
-            s_cover_sum_index = vector_layer.dataProvider().fieldNameIndex('SCoversum')
-            vector_layer.dataProvider().deleteAttributes([cell_count_index, s_cover_sum_index])
-
-            # Update shapefile with its newly-named attribute fields.
-            vector_layer.updateFields()
-
-            # Create daily shapefile and daily geoJSON.
+            # Attribute fields of the layer used in the calculations but not important for export to final products.
+            exclude_field_names = ['Cellcount', 'SCoversum']
+
+            # Output field names, which are mapped when each file is written, so that the layer is not edited:
+            # - the shapefile uses short field names
+            # - the GeoJSON uses the same field names as the .csv files
+            shapefile_field_names = {
+                'SWE_mean': 'SWEMean_mm',
+                'SWE_min': 'SWEMin_mm',
+                'SWE_max': 'SWEMax_mm',
+                'SWE_stdev': 'SWESDev_mm'
+            }
+            geojson_field_names = {}
+            for csv_field_name, (shp_field_name, field_type) in output_dict.items():
+                if shp_field_name != csv_field_name:
+                    geojson_field_names[shp_field_name] = csv_field_name
+
+            # Read the output attributes once into a table that is not changed,
+            # so that the output files can be written concurrently (the layer can only be used by this thread).
+            geojson_table = vector_util.FeatureTable(vector_layer, geojson_field_names, exclude_field_names,
+                                                     source_feature_ids)
+            array_date = tuple(array_date)
+
+            # The basin geometry is the same for every date so it is projected and serialized once
+            # for the input shapefile and then combined with the properties for the date:
+            # - the geometry is read from the layer so is done in this thread
+            geometry_fragments = vector_util.get_geojson_geometry_fragments(vector_layer, boundaries_file_path,
+                                                                            output_crs, GEOJSON_PRECISION,
+                                                                            source_feature_ids)
+            topology_fragments = None
+            if TOPOJSON.upper() == 'TRUE':
+                topology_fragments = vector_util.get_topojson_fragments(vector_layer, boundaries_file_path,
+                                                                        output_crs, GEOJSON_PRECISION,
+                                                                        TOPOJSON_QUANTIZATION, source_feature_ids)
+            geometry_files = None
+            if GEOJSON_SIMPLIFY_TOLERANCES and geometry_fragments is not None:
+                # The simplified basin geometry files are only written when the basin boundary shapefile changes.
+                geometry_files = write_simplified_geometry_files(vector_layer, source_feature_ids,
+                                                                 boundaries_file_path, csv_by_date_folder,
+                                                                 output_crs, geometry_fragments)
+
+            # Create daily shapefile and daily geoJSON:
+            # - the files are written to a staging folder and are published to the by date folder when complete,
+            #   so that readers (for example, the upload scripts) do not see partially written files
+            staging_folder = publish_util.create_staging_folder(csv_by_date_folder)
             shapefile_name = 'SnowpackStatisticsByDate_' + date_name + '.shp'
             geojson_name = 'SnowpackStatisticsByDate_' + date_name + '.geojson'
-            shapefile_name_full = csv_by_date_folder / shapefile_name
-            geojson_name_full = csv_by_date_folder / geojson_name
-
-            # Rename attribute field names defaulted by QGS Zonal Stat tool to the desired field name.
-            swe_mean_index = vector_layer.dataProvider().fieldNameIndex('SWE_mean')
-            vector_layer.dataProvider().renameAttributes({swe_mean_index: 'SWEMean_mm'})
-
-            if CALCULATE_SWE_MIN.upper() == 'TRUE':
-                swe_min_index = vector_layer.dataProvider().fieldNameIndex('SWE_min')
-                vector_layer.dataProvider().renameAttributes({swe_min_index: 'SWEMin_mm'})
-
-            if CALCULATE_SWE_MAX.upper() == 'TRUE':
-                swe_max_index = vector_layer.dataProvider().fieldNameIndex('SWE_max')
-                vector_layer.dataProvider().renameAttributes({swe_max_index: 'SWEMax_mm'})
+            shapefile_name_full = staging_folder / shapefile_name
+            geojson_name_full = staging_folder / geojson_name
 
-            if CALCULATE_SWE_STD_DEV.upper() == 'TRUE':
-                s_std_dev_index = vector_layer.dataProvider().fieldNameIndex('SWE_stdev')
-                vector_layer.dataProvider().renameAttributes({s_std_dev_index: 'SWESDev_mm'})
-
-            vector_layer.updateFields()
-            vector_layer.commitChanges()
-
-            # Write the GeoJSON file.
-            # - IGNORE `Unexpected Argument` error for layerOptions. This value is appropriate and functions properly.
-            # - irritatingly, must request the GeoJSON 2 format using RFC7946=YES
-            layer_options = [
-                'COORDINATE_PRECISION={}'.format(GEOJSON_PRECISION),
-                'RFC7946=YES',
-                'WRITE_NAME=NO'
-            ]
-            QgsVectorFileWriter.writeAsVectorFormat(layer=vector_layer,
-                                                    fileName=str(geojson_name_full),
-                                                    fileEncoding="utf-8",
-                                                    destCRS=QgsCoordinateReferenceSystem(output_crs),
-                                                    driverName="GeoJSON",
-                                                    layerOptions=layer_options)
-
-            # Write the shapefile.
-            QgsVectorFileWriter.writeAsVectorFormat(layer=vector_layer,
-                                                    fileName=str(shapefile_name_full),
-                                                    fileEncoding="utf-8",
-                                                    destCRS=QgsCoordinateReferenceSystem(output_crs),
-                                                    driverName="ESRI Shapefile")
-
-            # Change fieldnames of output GeoJSON file. Envelop GeoJSON file as a QGS object vector layer.
-            # new_name = geojson_name.replace(".geojson", "_intermediate.geojson")
-            # int_geojson_name_full = csv_by_date / new_name
-            # geojson_name_full.rename(int_geojson_name_full)
-
-            vector_file_geojson = QgsVectorLayer(str(geojson_name_full), 'GeoJsonStatistics', 'ogr')
-
-            # Rename attribute fields of GeoJSON.
-            if not os_util.is_linux_os():
-
-                # Open vector_file for editing.
-                vector_file_geojson.startEditing()
-
-                # Rename attribute field names defaulted by QGS Zonal Stat tool to the desired field name.
-                fields = {
-                    'SWEMean_mm': 'SNODAS_SWE_Mean_mm',
-                    'SWEVolC_af': 'SNODAS_SWE_Volume_1WeekChange_acft',
-                    'SWEMean_in': 'SNODAS_SWE_Mean_in',
-                    'Area_sqmi': 'SNODAS_EffectiveArea_sqmi',
-                    'SWEVol_af': 'SNODAS_SWE_Volume_acft',
-                    'SCover_pct': 'SNODAS_SnowCover_percent'
+            try:
+                # Output branches that only use the table are written in background threads.
+                # Output branches that use the layer are written in this thread at the same time.
+                # The file with the by date .csv header row is created by create_empty_csv_files()
+                # and is appended to in staging.
+                results_date = csv_by_date_folder / ('SnowpackStatisticsByDate_' + date_name + '.csv')
+                thread_branches = {
+                    'csv_by_date': functools.partial(write_by_date_csv_file, results_date,
+                                                     staging_folder / results_date.name, fieldnames, array_date),
+                    'csv_by_basin': functools.partial(write_by_basin_csv_files, csv_by_basin_folder, fieldnames,
+                                                      array_date)
                 }
-
-                if CALCULATE_SWE_MIN.upper() == 'TRUE':
-                    fields.update({'SWEMin_mm': 'SNODAS_SWE_Min_mm', 'SWEMin_in': 'SNODAS_SWE_Min_in'})
-
-                if CALCULATE_SWE_MAX.upper() == 'TRUE':
-                    fields.update({'SWEMax_mm': 'SNODAS_SWE_Max_mm', 'SWEMax_in': 'SNODAS_SWE_Max_in'})
-
-                if CALCULATE_SWE_STD_DEV.upper() == 'TRUE':
-                    fields.update({'SWESDev_mm': 'SNODAS_SWE_StdDev_mm', 'SWESDev_in': 'SNODAS_SWE_StdDev_in'})
-
-                for key, value in fields.items():
-                    index = vector_file_geojson.dataProvider().fieldNameIndex(key)
-                    vector_file_geojson.dataProvider().renameAttributes({index: value})
-
-                # Update the changes to the field names and remove the intermediate GeoJSON file
-                # (with shapefile fieldnames).
-                vector_file_geojson.updateFields()
-                commit_status = vector_file_geojson.commitChanges()
-                if commit_status:
-                    logger.info('Layer changes committed.')
+                main_thread_branches = {
+                    'shapefile': functools.partial(vector_util.write_vector_layer, vector_layer, shapefile_name_full,
+                                                   "ESRI Shapefile", output_crs, shapefile_field_names,
+                                                   exclude_field_names)
+                }
+                if geometry_fragments is not None:
+                    thread_branches['geojson'] = functools.partial(vector_util.write_geojson, geojson_table,
+                                                                   geojson_name_full, geometry_fragments)
                 else:
-                    logger.warning('Layer commit failed.')
-
-            # Write the GeoJSON file.
-            # - IGNORE `Unexpected Argument` error for layerOptions. This value is appropriate and functions properly.
-            # - irritatingly, must request the GeoJSON 2 format
-            layer_options = [
-                'COORDINATE_PRECISION={}'.format(GEOJSON_PRECISION),
-                'RFC7946=YES',
-                'WRITE_NAME=NO'
-            ]
-            QgsVectorFileWriter.writeAsVectorFormat(layer=vector_file_geojson,
-                                                    fileName=str(geojson_name_full),
-                                                    fileEncoding="utf-8",
-                                                    destCRS=QgsCoordinateReferenceSystem(output_crs),
-                                                    driverName="GeoJSON",
-                                                    layerOptions=layer_options)
-
-            # Rename attribute fields of GeoJSON.
-            if os_util.is_linux_os():
-                change_field_names(str(geojson_name_full))
-
-            if GEOJSON_ZIP.upper() == 'TRUE':
-                with zipfile.ZipFile(str(geojson_name_full) + '.zip', 'w', zipfile.ZIP_DEFLATED) as my_zip:
-                    my_zip.write(geojson_name_full)
-                # Delete the uncompressed geojson file.
-                geojson_name_full.unlink()
-
-            # Close the vector_file_geojson so that the vector_layer can open.
-            # print('int_geojson_name_full: {}'.format(int_geojson_name_full))
-            # int_geojson_name_full.unlink()
-            vector_layer.startEditing()
-
-            # Delete attribute fields of the shapefile related to the daily calculated zonal statistics.
-            field_names = [
-                'SWEMean_mm',
-                'SCover_pct',
-                'SWEMean_in',
-                'Area_sqmi',
-                'SWEVolC_af',
-                'SWEVol_af'
-            ]
-            if CALCULATE_SWE_MIN.upper() == 'TRUE':
-                field_names.extend(['SWEMin_mm', 'SWEMin_in'])
-            if CALCULATE_SWE_MAX.upper() == 'TRUE':
-                field_names.extend(['SWEMax_mm', 'SWEMax_in'])
-            if CALCULATE_SWE_STD_DEV.upper() == 'TRUE':
-                field_names.extend(['SWESDev_mm', 'SWESDev_in'])
-
-            for item in field_names:
-                index = vector_layer.dataProvider().fieldNameIndex(item)
-                vector_layer.dataProvider().deleteAttributes([index])
-
-            # Update shapefile with its newly-deleted attribute fields.
-            vector_layer.updateFields()
-            vector_layer.commitChanges()
-
-            # Create a string variable to be used as the title for the .csv output file (by date).
-            results_date = 'SnowpackStatisticsByDate_' + date_name + '.csv'
-
-            # Set directory to the directory where the output .csv daily files are contained (by date).
-            os.chdir(csv_by_date_folder)
-
-            # Update text file, ListOfDates.txt, with list of dates represented by csv files in the ByDate folder.
-            array = glob.glob("*.csv")
-            array.sort(reverse=True)
-            array_recent_date = []
-
-            with open("ListOfDates.txt", 'w') as output_file:
-                for filename in array:
-                    if filename.endswith("LatestDate.csv") is False and "Upstream" not in str(filename):
-                        date = filename[25:33]
-                        try:
-                            int(date)
-                            array_recent_date.append(date)
-                            output_file.write(date + "\n")
-                        except ValueError:
-                            continue
-
-            # Export the daily date array to a .csv file. Overwrite the .csv file if it already exists.
-            # See: http://stackoverflow.com/questions/28555112/export-a-simple-dictionary-into-excel-file-in-python
-            with open(results_date, 'a') as csv_file:
-                csv_writer = csv.DictWriter(csv_file, delimiter=",", fieldnames=fieldnames)
-                for row in array_date:
-                    csv_writer.writerow(row)
-
-            # Get most recent processed SNODAS date & make a copy called 'SnowpackStatisticsByDate_LatestDate.csv'
-            # and 'SnowpackStatisticsByDate_LatestDate.geojson' and 'SnowpackStatisticsByDate_LatestDate.zip/.shp'.
-            most_recent_date = str(max(array_recent_date))
-            src = 'SnowpackStatisticsByDate_' + most_recent_date + '.csv'
-            dst = 'SnowpackStatisticsByDate_LatestDate.csv'
-            copyfile(str(csv_by_date_folder / src), str(csv_by_date_folder / dst))
-            src = 'SnowpackStatisticsByDate_' + most_recent_date + '.geojson'
-            dst = 'SnowpackStatisticsByDate_LatestDate.geojson'
-            copyfile(str(csv_by_date_folder / src), str(csv_by_date_folder / dst))
-            # List of extensions referring to the output shapefile.
-            ext_list = ['.cpg', '.dbf', '.prj', '.qpj', '.shp', '.shx']
-            for item in ext_list:
-                src = 'SnowpackStatisticsByDate_' + most_recent_date + item
-                dst = 'SnowpackStatisticsByDate_LatestDate' + item
-                if Path(src).exists():
-                    copyfile(str(csv_by_date_folder / src), str(csv_by_date_folder / dst))
-
-            # Return working directory back to its original setting before the script began.
-            os.chdir(curr_dir)
+                    # The geometry could not be cached so write the layer
+                    # (irritatingly, must request the GeoJSON 2 format using RFC7946=YES).
+                    layer_options = [
+                        'COORDINATE_PRECISION={}'.format(GEOJSON_PRECISION),
+                        'RFC7946=YES',
+                        'WRITE_NAME=NO'
+                    ]
+                    main_thread_branches['geojson'] = functools.partial(vector_util.write_vector_layer, vector_layer,
+                                                                        geojson_name_full, "GeoJSON", output_crs,
+                                                                        geojson_field_names, exclude_field_names,
+                                                                        layer_options)
+                if FLATGEOBUF.upper() == 'TRUE' and geometry_fragments is not None:
+                    # The FlatGeobuf file has a spatial index so that clients can read only the basins in view.
+                    thread_branches['flatgeobuf'] = functools.partial(
+                        vector_util.write_flatgeobuf, geojson_table,
+                        staging_folder / ('SnowpackStatisticsByDate_' + date_name + '.fgb'), geometry_fragments,
+                        output_crs)
+                if topology_fragments is not None:
+                    # The boundaries shared by basins are stored once as arcs in the TopoJSON topology.
+                    thread_branches['topojson'] = functools.partial(
+                        vector_util.write_topojson, geojson_table,
+                        staging_folder / ('SnowpackStatisticsByDate_' + date_name + '.topojson'), topology_fragments,
+                        'basins')
+                if geometry_files is not None:
+                    # The compact daily properties file references the simplified basin geometry files.
+                    thread_branches['properties_json'] = functools.partial(
+                        vector_util.write_properties_json, geojson_table,
+                        staging_folder / ('SnowpackStatisticsByDate_' + date_name + '.json'), geometry_files,
+                        ID_FIELD_NAME)
+
+                # Write the output branches and wait for all of them to complete before publishing.
+                write_output_branches(thread_branches, main_thread_branches)
+
+                if GEOJSON_ZIP.upper() == 'TRUE':
+                    # Move the GeoJSON file out of staging to a folder that is only used for the zip file,
+                    # so that the uncompressed file is not published and the file is compressed in the background:
+                    # - the LatestDate files are updated when the zip file is complete
+                    zip_folder = publish_util.create_staging_folder(csv_by_date_folder)
+                    os.replace(geojson_name_full, zip_folder / geojson_name)
+                    get_compression_pool().submit_zip(csv_by_date_folder / (geojson_name + '.zip'),
+                                                      [(zip_folder / geojson_name, geojson_name)], zip_folder,
+                                                      functools.partial(update_latest_date_files, csv_by_date_folder))
+
+                # Lock because the following files are shared by all dates.
+                with results_files_lock:
+                    # Publish the files for the date.
+                    publish_util.publish_folder(staging_folder, csv_by_date_folder)
+                    staging_folder = None
+
+                    # Update text file, ListOfDates.txt, with list of dates represented by csv files
+                    # in the ByDate folder.
+                    array = [csv_file_path.name for csv_file_path in csv_by_date_folder.glob("*.csv")]
+                    array.sort(reverse=True)
+
+                    list_of_dates_file = csv_by_date_folder / "ListOfDates.txt"
+                    temp_list_of_dates_file = csv_by_date_folder / ".ListOfDates.txt.tmp"
+                    with open(temp_list_of_dates_file, 'w') as output_file:
+                        for filename in array:
+                            if filename.endswith("LatestDate.csv") is False and "Upstream" not in str(filename):
+                                date = filename[25:33]
+                                try:
+                                    int(date)
+                                    output_file.write(date + "\n")
+                                except ValueError:
+                                    continue
+                    os.replace(temp_list_of_dates_file, list_of_dates_file)
+
+                    # Publish the most recent processed SNODAS date files as 'SnowpackStatisticsByDate_LatestDate.*'.
+                    update_latest_date_files(csv_by_date_folder)
+            finally:
+                # Remove the staging folder if the files were not published because of an error.
+                if staging_folder is not None:
+                    shutil.rmtree(str(staging_folder), ignore_errors=True)
+                    staging_folder = None
 
             logger.info('  Saved zonal statistics to {} for: {}'.format(csv_by_basin_folder, tif_file_path))
             print("Zonal statistics for {} are complete. \n".format(date_name), file=sys.stderr)
@@ -2044,6 +2470,9 @@ def z_stat_and_export(tif_file_path: Path, boundaries_file_path: Path,
             logger.info('  Zonal statistics were not processed because file is not a .tif:')
             logger.info('    {}:'.format(tif_file_path))
 
+    # Remove the memory layer.
+    vector_layer = None
+
 
 def create_snodas_swe_graphs() -> None:
     """
@@ -2105,14 +2534,28 @@ def create_snodas_swe_graphs() -> None:
 
 def push_to_aws() -> None:
     """
-    Runs batch file to push the newly-updated files to Amazon Web Services such as OWF cloud storage.
-    The specifics are configured within the batch file, AWS_BATCH_PATH.
+    Push the newly-updated files to Amazon Web Services S3, such as OWF cloud storage.
+    If S3_BUCKET_URL is configured, only new and changed files are uploaded (see sync_outputs()).
+    Otherwise, the batch file AWS_BATCH_PATH is run, which configures the specifics.
     """
 
     # Initialize this module (if it has not already been done) so that configuration data are available.
     init_snodas_util()
 
     logger = logging.getLogger(__name__)
+
+    if S3_BUCKET_URL:
+        print('Pushing new and changed files to Amazon Web Services S3: {}'.format(S3_BUCKET_URL), file=sys.stderr)
+        backend_args = {}
+        if AWS_PROFILE and S3_BUCKET_URL.lower().startswith('s3://'):
+            backend_args['profile'] = AWS_PROFILE
+        if not sync_outputs(S3_BUCKET_URL, **backend_args):
+            error_message = 'Error pushing to AWS: {}\nSee the log file for details.'.format(S3_BUCKET_URL)
+            print(error_message, file=sys.stderr)
+            logger.error(error_message)
+            exit(1)
+        return
+
     print('Pushing files to Amazon Web Services S3.', file=sys.stderr)
     logger.info('Pushing files to Amazon Web Services S3 with configuration from {}.'.format(AWS_BATCH_PATH))
 
@@ -2133,23 +2576,43 @@ def push_to_aws() -> None:
 
 def push_to_gcp() -> None:
     """
-    Runs shell script to push the newly updated files to a GCP bucket, such as State of Colorado server.
-    The specifics are configured within the batch file, gcp_shell_script.
+    Push the newly updated files to a GCP bucket, such as State of Colorado server.
+    If GCP_BUCKET_URL is configured, only new and changed files are uploaded (see sync_outputs()).
+    Otherwise, the shell script GCP_SHELL_SCRIPT_PATH is run, which configures the specifics.
     """
 
+    # Initialize this module (if it has not already been done) so that configuration data are available.
+    init_snodas_util()
+
     logger = logging.getLogger(__name__)
 
-    script_location = "/var/opt/snodas-tools"
-    gcp_shell_script = "/var/opt/snodas-tools/cloud/copyAllToGCPBucket.bash"
+    if GCP_BUCKET_URL:
+        print('Pushing new and changed files to Google Cloud Platform bucket: {}'.format(GCP_BUCKET_URL),
+              file=sys.stderr)
+        if not sync_outputs(GCP_BUCKET_URL):
+            error_message = 'push_to_gcp: Error pushing to GCP: {}\nSee the log file for details.'.format(
+                GCP_BUCKET_URL)
+            print(error_message, file=sys.stderr)
+            logger.error(error_message)
+            exit(1)
+        return
+
+    if not GCP_SHELL_SCRIPT_PATH:
+        error_message = 'push_to_gcp: Configure [OutputLayers] gcp_bucket_url or ' \
+                        '[ProgramInstall] gcp_shell_script_pathname to push to GCP.'
+        print(error_message, file=sys.stderr)
+        logger.error(error_message)
+        exit(1)
+
+    gcp_shell_script = Path(GCP_SHELL_SCRIPT_PATH)
 
     print('Pushing files to Google Cloud Platform bucket given shell script ({}) specifics'.format(gcp_shell_script),
           file=sys.stderr)
     logger.info('Pushing files to Google Cloud Platform bucket given details from {}.'.format(gcp_shell_script))
 
-    # Call shell script, gcp_shell_script, to push files up to GCP.
-    os.chdir(script_location)
+    # Call shell script, gcp_shell_script, to push files up to GCP, running in the script folder.
     try:
-        with subprocess.Popen(['bash', gcp_shell_script]) as _:
+        with subprocess.Popen(['bash', str(gcp_shell_script)], cwd=str(gcp_shell_script.parent)) as _:
             pass
     except OSError as bad_file:
         error_message = 'push_to_gcp: Error pushing to GCP: {}\nConfirm the path to the GCP bash script is correct.'\
@@ -2162,66 +2625,55 @@ def push_to_gcp() -> None:
                 .format(gcp_shell_script))
 
 
-def change_field_names(geojson_file: str) -> None:
+def get_sync_folders() -> [(Path, str)]:
     """
-    Renames the attribute field names of the output GeoJSON file for each date.
-    This function is only to be used in the Linux environment because the Windows environment already
-    has a built-in attribute field editor within the QGIS software.
-    When the built-in QGIS mechanism is run on the Linux machine the following error is printed.
-    Error 6: AlterFieldDefn() not supported by this layer.
-
-    This function will create a separate geojson file with the updated attribute fields.
-    The original geojson will be deleted and the new geojson will be renamed to the original geojson name.
-
-    Args:
-        geojson_file: the full pathname to the GeoJSON file to be edited.
-
-    Returns: None
+    Get the output folders that are published to cloud storage.
+    Returns: list of (local folder, destination folder relative to the destination URL)
     """
+    folders = []
+    for folder_property, destination_folder in [
+            ('Folders.output_stats_by_basin_folder', 'SnowpackStatisticsByBasin'),
+            ('Folders.timeseries_graph_png_folder', 'SnowpackGraphsByBasin'),
+            ('Folders.output_stats_by_date_folder', 'SnowpackStatisticsByDate'),
+            ('Folders.static_data_folder', 'StaticData')]:
+        folder = config_util.get_config_prop(folder_property)
+        if folder:
+            folders.append((Path(folder), destination_folder))
+    return folders
+
+
+def sync_outputs(destination: str, **backend_args) -> bool:
+    """
+    Publish the output folders (see get_sync_folders()) to a destination, uploading only the files that are new
+    or have changed since they were last published to the destination, and log the bytes that were not uploaded
+    compared to a full copy.  The metrics are appended to the DOWNLOAD_METRICS_FILE, if configured.
+    destination: destination URL, for example 'gs://bucket/data' or 's3://bucket/path', or a local folder to test
+    backend_args: other arguments for the backend, for example profile for Amazon S3
+    Returns: True if all files were published, False if there was an error
+    """
+    # Initialize this module (if it has not already been done) so that configuration data are available.
+    init_snodas_util()
 
-    # Get the text content of the original GeoJSON file.
-    file_handler = open(geojson_file, 'r')
-    geojson_content = file_handler.read()
-    file_handler.close()
-    # with open(geojson_file, 'r') as geojson:
-    #     geojson_content = geojson.read()
-
-    # Rename attribute field names defaulted by QGS Zonal Stat tool to the desired field name.
-    fields = {
-        'SWEMean_mm': 'SNODAS_SWE_Mean_mm',
-        'SWEVolC_af': 'SNODAS_SWE_Volume_1WeekChange_acft',
-        'SWEMean_in': 'SNODAS_SWE_Mean_in',
-        'Area_sqmi': 'SNODAS_EffectiveArea_sqmi',
-        'SWEVol_af': 'SNODAS_SWE_Volume_acft',
-        'SCover_pct': 'SNODAS_SnowCover_percent'
-    }
-
-    if CALCULATE_SWE_MIN.upper() == 'TRUE':
-        fields.update({'SWEMin_mm': 'SNODAS_SWE_Min_mm', 'SWEMin_in': 'SNODAS_SWE_Min_in'})
-
-    if CALCULATE_SWE_MAX.upper() == 'TRUE':
-        fields.update({'SWEMax_mm': 'SNODAS_SWE_Max_mm', 'SWEMax_in': 'SNODAS_SWE_Max_in'})
-
-    if CALCULATE_SWE_STD_DEV.upper() == 'TRUE':
-        fields.update({'SWESDev_mm': 'SNODAS_SWE_StdDev_mm', 'SWESDev_in': 'SNODAS_SWE_StdDev_in'})
-
-    # Replace the appropriate files.
-    for key, value in fields.items():
-        geojson_content = geojson_content.replace(key, value)
-
-    # Create an intermediate GeoJSON file that has the same contents of the original GeoJSON
-    # but with the new attribute names.
-    geojson_int_path = geojson_file.replace('.geojson', '_temp.geojson')
-    file_handler = open(geojson_file, 'w')
-    file_handler.write(geojson_content)
-    file_handler.close()
-    # with open(geojson_int_path, 'w') as geojson_int:
-    #     geojson_int.write(geojson_content)
+    logger = logging.getLogger(__name__)
 
-    # Remove the original GeoJSON file and rename the intermediate GeoJSON file to the name of the original GeoJSON.
-    # This file is removed when it is zipped.
-    # Path(geojson_file).unlink()
-    # os.rename(geojson_int_path, geojson_file)
+    # Make sure that the zip files are complete before they are published.
+    wait_for_compression()
+
+    if not SYNC_MANIFEST_FOLDER:
+        logger.error('  The sync manifest folder is not configured ([OutputLayers] sync_manifest_folder).')
+        return False
+    backend = sync_util.create_sync_backend(destination, **backend_args)
+    manifest_path = sync_util.get_manifest_path(Path(SYNC_MANIFEST_FOLDER), destination)
+    logger.info('Publishing new and changed files to {} using manifest {}.'.format(destination, manifest_path))
+    metrics = sync_util.sync_folders(get_sync_folders(), backend, manifest_path)
+    logger.info('  Sync metrics for {}: {}'.format(destination, metrics.format_summary()))
+    if DOWNLOAD_METRICS_FILE:
+        try:
+            metrics_util.append_metrics_record(Path(DOWNLOAD_METRICS_FILE), metrics.to_dict())
+        except OSError:
+            # Metrics should not cause processing to fail.
+            logger.warning('  Unable to write sync metrics to: {}'.format(DOWNLOAD_METRICS_FILE), exc_info=True)
+    return metrics.success
 
 
 def clean_duplicates_from_by_basin_csv(csv_basin_dir: Path) -> None:
@@ -2285,3 +2737,500 @@ def clean_duplicates_from_by_basin_csv(csv_basin_dir: Path) -> None:
                 csv_writer = csv.writer(csv_file, delimiter=",")
                 for row in clean_rows:
                     csv_writer.writerow(row)
+
+
+def calculate_one_week_change(date_strs: [str], volume_strs: [str]) -> [str]:
+    """
+    Calculate the SWE volume 1-week change for a basin's time series.
+    The change for a date is the volume for the date minus the volume for 7 days earlier.
+    date_strs: dates as YYYYMMDD strings, in any order
+    volume_strs: SWE volumes (acre-feet) as strings, 'NULL' or blank if not available
+    Returns: list of the 1-week changes as integer strings, in the same order as the input,
+        'NULL' if either volume is not available
+    """
+    if len(date_strs) == 0:
+        return []
+
+    # Convert to day numbers and volumes, using -1 and NaN if not available.
+    days = np.full(len(date_strs), -1, dtype=np.int64)
+    volumes = np.full(len(date_strs), np.nan)
+    for i, (date_str, volume_str) in enumerate(zip(date_strs, volume_strs)):
+        try:
+            days[i] = datetime.strptime(date_str, '%Y%m%d').toordinal()
+            volumes[i] = float(volume_str)
+        except (TypeError, ValueError):
+            continue
+
+    # Find the volume for 7 days earlier for all dates at once, by searching the sorted day numbers.
+    order = np.argsort(days, kind='stable')
+    sorted_days = days[order]
+    week_ago_days = days - 7
+    positions = np.minimum(np.searchsorted(sorted_days, week_ago_days), len(days) - 1)
+    found = sorted_days[positions] == week_ago_days
+    week_ago_volumes = np.where(found, volumes[order[positions]], np.nan)
+    changes = volumes - week_ago_volumes
+
+    return ['NULL' if np.isnan(change) else str(int(round(change))) for change in changes]
+
+
+def update_by_date_one_week_change(csv_by_date_folder: Path, date_str: str, basin_changes: dict) -> None:
+    """
+    Update the SWE volume 1-week change in the by date .csv file, shapefile, GeoJSON file, FlatGeobuf file,
+    TopoJSON file, and compact properties .json file for a date.
+    Zipped shapefiles and GeoJSON files are also updated.
+    The published files are not edited in place because they may be read while they are updated and the
+    'LatestDate' files are hard links to them.  The updated files are written to a staging folder and then
+    replace the published files, so update_latest_date_files() must be called afterwards to link the new files.
+    csv_by_date_folder: full pathname to the folder containing results by date
+    date_str: the date as YYYYMMDD
+    basin_changes: dictionary of basin identifier to the 1-week change as an integer string or 'NULL'
+    """
+    logger = logging.getLogger(__name__)
+
+    file_base = 'SnowpackStatisticsByDate_' + date_str
+    zip_compression_type = compress_util.get_zip_compression_type(ZIP_COMPRESSION)
+
+    staging_folder = publish_util.create_staging_folder(csv_by_date_folder)
+    try:
+        # Update the .csv file.
+        csv_file_path = csv_by_date_folder / (file_base + '.csv')
+        if csv_file_path.exists():
+            with open(csv_file_path, 'r', newline='') as csv_file:
+                reader = csv.DictReader(csv_file)
+                fieldnames = reader.fieldnames
+                rows = list(reader)
+            for row in rows:
+                if row[ID_FIELD_NAME] in basin_changes:
+                    row['SNODAS_SWE_Volume_1WeekChange_acft'] = basin_changes[row[ID_FIELD_NAME]]
+            write_csv_rows(staging_folder / csv_file_path.name, fieldnames, rows)
+
+        # Update a copy of the shapefile, which uses the short field name.
+        shp_file_path = csv_by_date_folder / (file_base + '.shp')
+        if shp_file_path.exists():
+            for ext in ['.cpg', '.dbf', '.prj', '.qpj', '.shp', '.shx']:
+                if shp_file_path.with_suffix(ext).exists():
+                    copyfile(str(shp_file_path.with_suffix(ext)), str(staging_folder / (file_base + ext)))
+            update_shapefile_field(staging_folder / shp_file_path.name, 'SWEVolC_af', basin_changes)
+        shp_zip_file_path = csv_by_date_folder / (file_base + '.zip')
+        if shp_zip_file_path.exists():
+            # Extract the shapefile, update, and zip again using the same file names.
+            with tempfile.TemporaryDirectory() as temp_folder:
+                with zipfile.ZipFile(str(shp_zip_file_path), 'r') as zip_file:
+                    names = zip_file.namelist()
+                    zip_file.extractall(temp_folder)
+                update_shapefile_field(Path(temp_folder) / (file_base + '.shp'), 'SWEVolC_af', basin_changes)
+                with zipfile.ZipFile(str(staging_folder / shp_zip_file_path.name), 'w', zip_compression_type,
+                                     compresslevel=ZIP_COMPRESSION_LEVEL) as zip_file:
+                    for name in names:
+                        zip_file.write(str(Path(temp_folder) / name), name)
+
+        # Update the GeoJSON file, which uses the long field name.
+        geojson_file_path = csv_by_date_folder / (file_base + '.geojson')
+        if geojson_file_path.exists():
+            with open(geojson_file_path, 'r', encoding='utf-8') as geojson_file:
+                geojson = json.load(geojson_file)
+            update_geojson_field(geojson, 'SNODAS_SWE_Volume_1WeekChange_acft', basin_changes)
+            with open(staging_folder / geojson_file_path.name, 'w', encoding='utf-8') as geojson_file:
+                json.dump(geojson, geojson_file)
+        geojson_zip_file_path = csv_by_date_folder / (file_base + '.geojson.zip')
+        if geojson_zip_file_path.exists():
+            with zipfile.ZipFile(str(geojson_zip_file_path), 'r') as zip_file:
+                contents = {name: zip_file.read(name) for name in zip_file.namelist()}
+            with zipfile.ZipFile(str(staging_folder / geojson_zip_file_path.name), 'w', zip_compression_type,
+                                 compresslevel=ZIP_COMPRESSION_LEVEL) as zip_file:
+                for name, content in contents.items():
+                    if name.endswith('.geojson'):
+                        geojson = json.loads(content.decode('utf-8'))
+                        update_geojson_field(geojson, 'SNODAS_SWE_Volume_1WeekChange_acft', basin_changes)
+                        content = json.dumps(geojson).encode('utf-8')
+                    zip_file.writestr(name, content)
+
+        # Update the FlatGeobuf file, which uses the long field name.
+        fgb_file_path = csv_by_date_folder / (file_base + '.fgb')
+        if fgb_file_path.exists():
+            update_flatgeobuf_field(fgb_file_path, staging_folder / fgb_file_path.name,
+                                    'SNODAS_SWE_Volume_1WeekChange_acft', basin_changes)
+
+        # Update the TopoJSON file, which uses the long field name.
+        topojson_file_path = csv_by_date_folder / (file_base + '.topojson')
+        if topojson_file_path.exists():
+            with open(topojson_file_path, 'r', encoding='utf-8') as topojson_file:
+                topojson = json.load(topojson_file)
+            for topojson_object in topojson.get('objects', {}).values():
+                # The geometries have properties in the same way as GeoJSON features.
+                update_geojson_field({'features': topojson_object.get('geometries', [])},
+                                     'SNODAS_SWE_Volume_1WeekChange_acft', basin_changes)
+            with open(staging_folder / topojson_file_path.name, 'w', encoding='utf-8') as topojson_file:
+                json.dump(topojson, topojson_file, separators=(',', ':'))
+
+        # Update the compact properties file, which uses the long field name.
+        json_file_path = csv_by_date_folder / (file_base + '.json')
+        if json_file_path.exists():
+            with open(json_file_path, 'r', encoding='utf-8') as json_file:
+                properties_json = json.load(json_file)
+            update_geojson_field(properties_json, 'SNODAS_SWE_Volume_1WeekChange_acft', basin_changes)
+            with open(staging_folder / json_file_path.name, 'w', encoding='utf-8') as json_file:
+                json.dump(properties_json, json_file, separators=(',', ':'))
+
+        # Replace the published files with the updated files.
+        publish_util.publish_folder(staging_folder, csv_by_date_folder)
+    finally:
+        # Remove the staging folder if the files were not published because of an error.
+        shutil.rmtree(str(staging_folder), ignore_errors=True)
+
+    logger.info('  Updated 1-week change for {} basins for date {}.'.format(len(basin_changes), date_str))
+
+
+def update_flatgeobuf_field(fgb_file_path: Path, output_file_path: Path, field_name: str,
+                            basin_changes: dict) -> None:
+    """
+    Update a field in the features of a FlatGeobuf file.
+    FlatGeobuf files cannot be updated, so a new file is written with the updated values.
+    fgb_file_path: path to the FlatGeobuf file
+    output_file_path: path to the updated FlatGeobuf file, which must be different from fgb_file_path
+    field_name: the attribute field name to update
+    basin_changes: dictionary of basin identifier to the new value as an integer string or 'NULL'
+    """
+    logger = logging.getLogger(__name__)
+
+    data_source = ogr.Open(str(fgb_file_path), 0)
+    if data_source is None:
+        logger.warning('  Unable to open FlatGeobuf file: {}'.format(fgb_file_path))
+        return
+    layer = data_source.GetLayer()
+    layer_defn = layer.GetLayerDefn()
+    field_index = layer_defn.GetFieldIndex(field_name)
+    if field_index < 0:
+        logger.warning('  FlatGeobuf file does not have field {}: {}'.format(field_name, fgb_file_path))
+        return
+
+    if output_file_path.exists():
+        output_file_path.unlink()
+    out_data_source = ogr.GetDriverByName('FlatGeobuf').CreateDataSource(str(output_file_path))
+    out_layer = out_data_source.CreateLayer(layer.GetName(), layer.GetSpatialRef(), layer.GetGeomType(),
+                                            ['SPATIAL_INDEX=YES'])
+    for i in range(layer_defn.GetFieldCount()):
+        out_layer.CreateField(layer_defn.GetFieldDefn(i))
+    out_layer_defn = out_layer.GetLayerDefn()
+    for feature in layer:
+        out_feature = ogr.Feature(out_layer_defn)
+        out_feature.SetFrom(feature)
+        basin_id = feature.GetField(ID_FIELD_NAME)
+        if basin_id in basin_changes:
+            value = basin_changes[basin_id]
+            if value == 'NULL':
+                out_feature.SetFieldNull(field_index)
+            else:
+                out_feature.SetField(field_index, int(value))
+        out_layer.CreateFeature(out_feature)
+        out_feature = None
+    # Close the files so that the new file is complete.
+    out_layer = None
+    out_data_source = None
+    layer = None
+    data_source = None
+
+
+def update_geojson_field(geojson: dict, field_name: str, basin_changes: dict) -> None:
+    """
+    Update a field in the features of a GeoJSON object.
+    geojson: the GeoJSON object, as read by json.load
+    field_name: the property name to update
+    basin_changes: dictionary of basin identifier to the new value as an integer string or 'NULL'
+    """
+    for feature in geojson.get('features', []):
+        properties = feature.get('properties', {})
+        basin_id = properties.get(ID_FIELD_NAME)
+        if basin_id in basin_changes:
+            value = basin_changes[basin_id]
+            properties[field_name] = None if value == 'NULL' else int(value)
+
+
+def update_latest_date_files(csv_by_date_folder: Path) -> None:
+    """
+    Publish the files for the most recent processed SNODAS date as 'SnowpackStatisticsByDate_LatestDate.*'
+    (.csv, .geojson, .geojson.zip, .fgb, .topojson, .json, shapefile, and zipped shapefile).
+    The files are hard links to the date files, so that no data are copied, and each file is replaced in one step.
+    The manifest 'SnowpackStatisticsByDate_LatestDate_Manifest.json' lists the date and the files.
+    csv_by_date_folder: full pathname to the folder containing results by date
+    """
+    # Lock because the files are shared by all dates, and may be updated when a zip file is compressed.
+    with results_files_lock:
+        # Determine the most recent date from the .csv files.
+        dates = []
+        for csv_file_path in csv_by_date_folder.glob('SnowpackStatisticsByDate_*.csv'):
+            date_str = csv_file_path.name[25:33]
+            if len(date_str) == 8 and date_str.isdigit():
+                dates.append(date_str)
+        if not dates:
+            return
+        most_recent_date = max(dates)
+
+        src_base = 'SnowpackStatisticsByDate_' + most_recent_date
+        dst_base = 'SnowpackStatisticsByDate_LatestDate'
+        # Dictionary of LatestDate file name to date file name, for the manifest.
+        files = {}
+        # List of extensions for the output files, including the files for the shapefile.
+        ext_list = ['.csv', '.geojson', '.geojson.zip', '.fgb', '.topojson', '.json',
+                    '.cpg', '.dbf', '.prj', '.qpj', '.shp', '.shx']
+        for ext in ext_list:
+            src = csv_by_date_folder / (src_base + ext)
+            if src.exists():
+                publish_util.link_file(src, csv_by_date_folder / (dst_base + ext))
+                files[dst_base + ext] = src.name
+
+        # Write the zipped shapefile, renaming the files in the zip file, and then replace the file in one step.
+        src = csv_by_date_folder / (src_base + '.zip')
+        if src.exists():
+            dst = csv_by_date_folder / (dst_base + '.zip')
+            temp_dst = csv_by_date_folder / ('.' + dst.name + '.tmp')
+            with zipfile.ZipFile(str(src), 'r') as src_zip_file:
+                with zipfile.ZipFile(str(temp_dst), 'w', compress_util.get_zip_compression_type(ZIP_COMPRESSION),
+                                     compresslevel=ZIP_COMPRESSION_LEVEL) as dst_zip_file:
+                    for name in src_zip_file.namelist():
+                        dst_zip_file.writestr(name.replace(src_base, dst_base), src_zip_file.read(name))
+            os.replace(temp_dst, dst)
+            files[dst.name] = src.name
+
+        publish_util.write_json(csv_by_date_folder / (dst_base + '_Manifest.json'),
+                                {'latestDate': most_recent_date, 'files': files})
+
+
+def update_one_week_change(csv_by_basin_folder: Path, csv_by_date_folder: Path) -> None:
+    """
+    Calculate the SWE volume 1-week change for all dates from the volumes in the by basin .csv files,
+    and update the values that have changed in the by basin and by date output files.
+    Because the change is calculated from the stored volumes after the dates are processed,
+    the dates can be processed in any order, and the change is filled in when a missing date is processed.
+    csv_by_basin_folder: full pathname to the folder containing results by basin (.csv files)
+    csv_by_date_folder: full pathname to the folder containing results by date (.csv, shapefile, and GeoJSON files)
+    """
+
+    # Initialize this module (if it has not already been done) so that configuration data are available.
+    init_snodas_util()
+
+    logger = logging.getLogger(__name__)
+    logger.info('Start updating the SWE volume 1-week change.')
+
+    change_field = 'SNODAS_SWE_Volume_1WeekChange_acft'
+    volume_field = 'SNODAS_SWE_Volume_acft'
+
+    # Lock because the by basin and by date files may also be updated by threads that process dates.
+    with results_files_lock:
+        # Changed values, by date (YYYYMMDD) and then basin identifier.
+        date_changes = {}
+        for csv_file_path in sorted(csv_by_basin_folder.glob('SnowpackStatisticsByBasin_*.csv')):
+            with open(csv_file_path, 'r', newline='') as csv_file:
+                reader = csv.DictReader(csv_file)
+                fieldnames = reader.fieldnames
+                rows = list(reader)
+            if not rows or change_field not in fieldnames or volume_field not in fieldnames:
+                continue
+
+            changes = calculate_one_week_change([row['Date_YYYYMMDD'] for row in rows],
+                                                [row[volume_field] for row in rows])
+            updated = False
+            for row, change in zip(rows, changes):
+                old_change = row[change_field] if row[change_field] else 'NULL'
+                if old_change != change:
+                    row[change_field] = change
+                    date_changes.setdefault(row['Date_YYYYMMDD'], {})[row[ID_FIELD_NAME]] = change
+                    updated = True
+            if updated:
+                write_csv_rows(csv_file_path, fieldnames, rows)
+
+        for date_str in sorted(date_changes.keys()):
+            update_by_date_one_week_change(csv_by_date_folder, date_str, date_changes[date_str])
+
+        if date_changes:
+            # The latest date files may have been replaced, so link the 'LatestDate' files to the new files.
+            update_latest_date_files(csv_by_date_folder)
+
+    logger.info('  Updated the SWE volume 1-week change for {} dates.'.format(len(date_changes)))
+
+
+def update_shapefile_field(shp_file_path: Path, field_name: str, basin_changes: dict) -> None:
+    """
+    Update a field in the features of a shapefile.
+    shp_file_path: path to the shapefile
+    field_name: the attribute field name to update
+    basin_changes: dictionary of basin identifier to the new value as an integer string or 'NULL'
+    """
+    logger = logging.getLogger(__name__)
+
+    data_source = ogr.Open(str(shp_file_path), 1)
+    if data_source is None:
+        logger.warning('  Unable to open shapefile for update: {}'.format(shp_file_path))
+        return
+    layer = data_source.GetLayer()
+    field_index = layer.GetLayerDefn().GetFieldIndex(field_name)
+    if field_index < 0:
+        logger.warning('  Shapefile does not have field {}: {}'.format(field_name, shp_file_path))
+        return
+    for feature in layer:
+        basin_id = feature.GetField(ID_FIELD_NAME)
+        if basin_id in basin_changes:
+            value = basin_changes[basin_id]
+            if value == 'NULL':
+                feature.SetFieldNull(field_index)
+            else:
+                feature.SetField(field_index, int(value))
+            layer.SetFeature(feature)
+    # Close the shapefile to save the changes.
+    data_source = None
+
+
+def write_by_basin_csv_files(csv_by_basin_folder: Path, fieldnames: [str], rows: (dict,)) -> None:
+    """
+    Add the rows for a date to the by basin .csv files and sort each file by date.
+    Each file is written once to a temporary file, which then replaces the file,
+    so that a partial file is not seen if the file is read or processing is interrupted.
+    The files with the header row are created by create_empty_csv_files().
+    csv_by_basin_folder: full pathname to the folder containing results by basin
+    fieldnames: field names for the .csv files, in order
+    rows: dictionaries for the rows, one per basin
+    """
+    # Rows for each by basin file.
+    basin_rows = {}
+    for row in rows:
+        basin_rows.setdefault(str(row[ID_FIELD_NAME]), []).append(row)
+
+    # Lock because the by basin files are shared by all dates.
+    with results_files_lock:
+        for basin_id, basin_row_list in basin_rows.items():
+            results_basin = csv_by_basin_folder / ('SnowpackStatisticsByBasin_' + basin_id + '.csv')
+            with open(results_basin, 'r') as full_csv_file:
+                csv_file_contents = list(full_csv_file)
+            # Format the new rows as lines and sort every line but the header.
+            new_rows = io.StringIO()
+            csv_writer = csv.DictWriter(new_rows, delimiter=",", fieldnames=fieldnames, lineterminator='\n')
+            for row in basin_row_list:
+                csv_writer.writerow(row)
+            csv_file_contents.extend(new_rows.getvalue().splitlines(keepends=True))
+            csv_file_contents[1:] = sorted(csv_file_contents[1:])
+            # Write the sorted list to a temporary file and then replace the file.
+            temp_file_path = results_basin.with_name('.' + results_basin.name + '.tmp')
+            with open(temp_file_path, 'w') as sorted_csv_file:
+                sorted_csv_file.writelines(csv_file_contents)
+            os.replace(temp_file_path, results_basin)
+
+
+def write_by_date_csv_file(results_date: Path, staged_results_date: Path, fieldnames: [str],
+                           rows: (dict,)) -> None:
+    """
+    Write the by date .csv file to the staging folder, appending the rows to the existing file
+    (with the header row created by create_empty_csv_files()).
+    results_date: the published by date .csv file
+    staged_results_date: the by date .csv file in the staging folder
+    fieldnames: field names for the .csv file, in order
+    rows: dictionaries for the rows, one per basin
+    """
+    if results_date.exists():
+        copyfile(str(results_date), str(staged_results_date))
+
+    # Export the daily date array to a .csv file.
+    # See: http://stackoverflow.com/questions/28555112/export-a-simple-dictionary-into-excel-file-in-python
+    with open(staged_results_date, 'a') as csv_file:
+        csv_writer = csv.DictWriter(csv_file, delimiter=",", fieldnames=fieldnames)
+        for row in rows:
+            csv_writer.writerow(row)
+
+
+def write_csv_rows(csv_file_path: Path, fieldnames: [str], rows: [dict]) -> None:
+    """
+    Write rows to a .csv file, replacing the file only when the new file is complete.
+    csv_file_path: path to the .csv file
+    fieldnames: field names for the header row, in order
+    rows: list of dictionaries for the rows
+    """
+    temp_file_path = csv_file_path.with_name('.' + csv_file_path.name + '.tmp')
+    with open(temp_file_path, 'w', newline='') as csv_file:
+        csv_writer = csv.DictWriter(csv_file, delimiter=",", fieldnames=fieldnames)
+        csv_writer.writeheader()
+        for row in rows:
+            csv_writer.writerow(row)
+    os.replace(temp_file_path, csv_file_path)
+
+
+def write_output_branches(thread_branches: dict, main_thread_branches: dict) -> dict:
+    """
+    Write independent output branches (for example, the .csv, shapefile, and GeoJSON files for a date) concurrently
+    and wait for all of them to complete.
+    The branches in background threads must only use data that are not changed,
+    whereas the branches that use a QGIS layer must run in the thread that created the layer.
+    thread_branches: dictionary of branch name to function with no arguments, called in background threads
+    main_thread_branches: dictionary of branch name to function with no arguments, called in this thread
+    Returns: dictionary of branch name to time to write the branch, in seconds
+    Raises: the first exception from a branch, after all branches have completed
+    """
+    logger = logging.getLogger(__name__)
+
+    branch_seconds = {}
+
+    def run_branch(name: str, function) -> None:
+        start_time = time.perf_counter()
+        try:
+            function()
+        finally:
+            branch_seconds[name] = time.perf_counter() - start_time
+
+    errors = []
+    with ThreadPoolExecutor(max_workers=max(1, len(thread_branches)),
+                            thread_name_prefix='snodas-output') as executor:
+        futures = [executor.submit(run_branch, name, function) for name, function in thread_branches.items()]
+        for name, function in main_thread_branches.items():
+            try:
+                run_branch(name, function)
+            except Exception as e:
+                errors.append(e)
+        # Wait for all branches so that none are still writing to the staging folder.
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                errors.append(e)
+
+    logger.info('  Output branch times (seconds): {}'.format(
+        ', '.join('{}={:.3f}'.format(name, seconds) for name, seconds in branch_seconds.items())))
+    if errors:
+        raise errors[0]
+    return branch_seconds
+
+
+def write_simplified_geometry_files(layer: QgsVectorLayer, feature_ids: dict or None, boundaries_file_path: Path,
+                                    csv_by_date_folder: Path, output_crs: str, geometry_fragments: dict) -> dict:
+    """
+    Write the simplified basin geometry files for the configured GeoJSON simplify tolerances,
+    if they have not already been written for the basin boundary shapefile.
+    The file names include the hash of the shapefile so that the files are written again if the shapefile changes:
+    'SnowpackStatisticsGeometry_<hash>_<tolerance>.geojson'
+    layer: layer with the basins of the basin boundary shapefile
+    feature_ids: dictionary of layer feature identifier to shapefile feature identifier,
+        or None if the layer was read from the shapefile
+    boundaries_file_path: the basin boundary shapefile
+    csv_by_date_folder: full pathname to the folder containing results by date, where the files are written
+    output_crs: the coordinate reference system of the geometry, for example "EPSG:4326"
+    geometry_fragments: dictionary of feature identifier to GeoJSON geometry text,
+        from vector_util.get_geojson_geometry_fragments()
+    Returns: dictionary of tolerance (as configured) to geometry file name
+    """
+    logger = logging.getLogger(__name__)
+
+    # Hash of the shapefile and the output options that determine the geometry:
+    # - the shapefile hash is cached so that the shapefile is only read again if it changes
+    with basin_util.basins_cache_lock:
+        shapefile_hash = basin_util.get_shapefile_hash(boundaries_file_path,
+                                                       [ID_FIELD_NAME, output_crs, GEOJSON_PRECISION])[0:12]
+    geometry_files = {}
+    # Lock because the files are shared by all dates.
+    with results_files_lock:
+        for tolerance in GEOJSON_SIMPLIFY_TOLERANCES:
+            file_name = 'SnowpackStatisticsGeometry_{}_{}.geojson'.format(shapefile_hash, tolerance)
+            geometry_file_path = csv_by_date_folder / file_name
+            if not geometry_file_path.exists():
+                logger.info('  Writing simplified basin geometry (tolerance={}): {}'.format(
+                    tolerance, geometry_file_path))
+                vector_util.write_geometry_geojson(layer, geometry_file_path, geometry_fragments,
+                                                   ID_FIELD_NAME, float(tolerance), feature_ids)
+            geometry_files[tolerance] = file_name
+    return geometry_files
@@ -0,0 +1,320 @@
+"""
+This module contains functions to publish the output folders to cloud storage (or another folder),
+uploading only the files that are new or have changed since they were last published.
+
+A manifest of the published files is kept in a local JSON file for each destination:
+
+  {"destination": "gs://bucket/data", "files": {"SnowpackStatisticsByDate/ListOfDates.txt":
+    {"sha256": "...", "size": 1234, "mtime_ns": 1682380800000000000}, ...}}
+
+A file is uploaded if it is not in the manifest or its SHA-256 hash is different.
+The hash is only calculated again if the file size or modification time is different from the manifest,
+so files that have not been touched are not read.
+Files that are written again with the same content (for example, by-basin files for a date that was
+processed again) are not uploaded.  The manifest is updated after each upload, so if the sync fails,
+the files that were uploaded are not uploaded again by the next sync.
+
+Files and folders that start with '.' (for example, staging folders and temporary files) are not published.
+Objects are not deleted from the destination if the local file is deleted, the same as 'gsutil rsync' without '-d'.
+
+The destination is handled by a backend, which is determined from the destination URL:
+
+  gs://bucket/path  - Google Cloud Storage, using 'gsutil'
+  s3://bucket/path  - Amazon S3, using the 'aws' command line interface
+  other             - a local folder, for example to test the sync without uploading to the cloud
+
+Other backends can be added to SYNC_BACKENDS.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import snodastools.util.metrics_util as metrics_util
+import snodastools.util.publish_util as publish_util
+import subprocess
+import time
+
+from pathlib import Path
+
+
+class SyncBackend(object):
+    """
+    Destination for the published files.
+    """
+
+    def __init__(self, destination: str):
+        """
+        destination: destination URL or folder
+        """
+        self.destination = destination.rstrip('/')
+
+    def upload(self, files: [(Path, str)]) -> None:
+        """
+        Upload files, replacing the objects if they exist.
+        files: list of (path to the local file, path of the object relative to the destination, using '/')
+        Raises: RuntimeError if the files could not be uploaded
+        """
+        raise NotImplementedError('upload() is not implemented for {}'.format(type(self).__name__))
+
+
+class LocalFolderBackend(SyncBackend):
+    """
+    Copy files to a local folder, for example to test the sync without uploading to the cloud.
+    """
+
+    def upload(self, files: [(Path, str)]) -> None:
+        for file_path, object_path in files:
+            destination_path = Path(self.destination) / object_path
+            destination_path.parent.mkdir(parents=True, exist_ok=True)
+            # Copy to a temporary file and then rename so that a partial file is not seen.
+            temp_path = destination_path.with_name('.' + destination_path.name + '.tmp')
+            shutil.copyfile(str(file_path), str(temp_path))
+            os.replace(str(temp_path), str(destination_path))
+
+
+class GsutilBackend(SyncBackend):
+    """
+    Upload files to Google Cloud Storage using 'gsutil'.
+    The files for each destination folder are uploaded with one 'gsutil -m cp' command.
+    """
+
+    def __init__(self, destination: str, program: str = 'gsutil'):
+        """
+        destination: destination URL, for example 'gs://bucket/data'
+        program: the gsutil program, which must be in the PATH if a full path is not given
+        """
+        super().__init__(destination)
+        self.program = program
+
+    def upload(self, files: [(Path, str)]) -> None:
+        for object_folder, folder_files in group_files_by_folder(files).items():
+            # The object names are the same as the local file names,
+            # so the files are listed on the standard input and copied to the folder URL.
+            url = self.destination + '/' + object_folder + '/' if object_folder else self.destination + '/'
+            run_command([self.program, '-m', 'cp', '-I', url],
+                        '\n'.join(str(file_path) for file_path, object_path in folder_files) + '\n')
+
+
+class AwsCliBackend(SyncBackend):
+    """
+    Upload files to Amazon S3 using the 'aws' command line interface.
+    """
+
+    def __init__(self, destination: str, profile: str or None = None, program: str = 'aws'):
+        """
+        destination: destination URL, for example 's3://bucket/path'
+        profile: AWS profile name, or None to use the default profile
+        program: the aws program, which must be in the PATH if a full path is not given
+        """
+        super().__init__(destination)
+        self.profile = profile
+        self.program = program
+
+    def upload(self, files: [(Path, str)]) -> None:
+        for file_path, object_path in files:
+            args = [self.program, 's3', 'cp', str(file_path), self.destination + '/' + object_path,
+                    '--only-show-errors']
+            if self.profile:
+                args.extend(['--profile', self.profile])
+            run_command(args)
+
+
+# Backend class, by destination URL scheme ('' for a local folder).
+SYNC_BACKENDS = {
+    'gs': GsutilBackend,
+    's3': AwsCliBackend,
+    '': LocalFolderBackend
+}
+
+
+def calculate_file_hash(file_path: Path) -> str:
+    """
+    Calculate the SHA-256 hash of a file.
+    file_path: path to the file
+    Returns: the hash as a hexadecimal string
+    """
+    file_hash = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def create_sync_backend(destination: str, **kwargs) -> SyncBackend:
+    """
+    Create the backend for a destination.
+    destination: destination URL (for example 'gs://bucket/data' or 's3://bucket/path') or local folder
+    kwargs: other arguments for the backend, for example profile for Amazon S3
+    Returns: the backend
+    """
+    scheme = destination.split('://', 1)[0].lower() if '://' in destination else ''
+    if scheme == 'file':
+        return LocalFolderBackend(destination[len('file://'):])
+    backend_class = SYNC_BACKENDS.get(scheme)
+    if backend_class is None:
+        raise ValueError('Sync destination must use one of the schemes {} (destination={}).'.format(
+            ', '.join(scheme + '://' for scheme in SYNC_BACKENDS.keys() if scheme), destination))
+    return backend_class(destination, **kwargs)
+
+
+def get_manifest_path(manifest_folder: Path, destination: str) -> Path:
+    """
+    Get the path to the manifest file for a destination.
+    manifest_folder: folder for the manifest files
+    destination: destination URL or folder
+    Returns: path to the manifest file, which is named using the hash of the destination
+    """
+    destination_hash = hashlib.sha256(destination.rstrip('/').encode('utf-8')).hexdigest()[0:12]
+    return manifest_folder / 'SyncManifest_{}.json'.format(destination_hash)
+
+
+def group_files_by_folder(files: [(Path, str)]) -> dict:
+    """
+    Group files by the folder of the object path.
+    files: list of (path to the local file, path of the object relative to the destination)
+    Returns: dictionary of object folder ('' for the top folder) to list of (path, object path)
+    """
+    folders = {}
+    for file_path, object_path in files:
+        object_folder = object_path.rsplit('/', 1)[0] if '/' in object_path else ''
+        folders.setdefault(object_folder, []).append((file_path, object_path))
+    return folders
+
+
+def list_folder_files(folder: Path) -> [Path]:
+    """
+    List the files in a folder and its sub-folders that are published,
+    ignoring files and folders that start with '.'.
+    folder: the folder
+    Returns: sorted list of file paths
+    """
+    file_paths = []
+    for parent, folder_names, file_names in os.walk(str(folder)):
+        folder_names[:] = [folder_name for folder_name in folder_names if not folder_name.startswith('.')]
+        for file_name in file_names:
+            if not file_name.startswith('.'):
+                file_paths.append(Path(parent) / file_name)
+    return sorted(file_paths)
+
+
+def read_manifest(manifest_path: Path, destination: str) -> dict:
+    """
+    Read the manifest of published files.
+    manifest_path: path to the manifest file
+    destination: destination URL or folder, which must match the manifest
+    Returns: dictionary of object path to dictionary with 'sha256', 'size', and 'mtime_ns',
+        empty if the manifest does not exist or is for a different destination
+    """
+    logger = logging.getLogger(__name__)
+
+    if not manifest_path.exists():
+        return {}
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as manifest_file:
+            manifest = json.load(manifest_file)
+    except (OSError, ValueError) as e:
+        logger.warning('  Unable to read sync manifest ({}), all files will be uploaded: {}'.format(e, manifest_path))
+        return {}
+    if manifest.get('destination') != destination.rstrip('/'):
+        logger.warning('  Sync manifest is for a different destination ({}), all files will be uploaded: {}'.format(
+            manifest.get('destination'), manifest_path))
+        return {}
+    return manifest.get('files', {})
+
+
+def run_command(args: [str], input_text: str or None = None) -> None:
+    """
+    Run a command to upload files.
+    args: the program and arguments
+    input_text: text for the standard input, or None
+    Raises: RuntimeError if the command could not be run or failed
+    """
+    logger = logging.getLogger(__name__)
+
+    logger.debug('  Running: {}'.format(' '.join(args)))
+    try:
+        result = subprocess.run(args, input=input_text, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                universal_newlines=True)
+    except OSError as e:
+        raise RuntimeError('Error running {}: {}'.format(args[0], e))
+    if result.returncode != 0:
+        raise RuntimeError('Error running {} (exit code {}): {}'.format(' '.join(args[0:3]), result.returncode,
+                                                                         result.stderr.strip()))
+
+
+def sync_folders(folders: [(Path, str)], backend: SyncBackend, manifest_path: Path,
+                 batch_size: int = 100) -> metrics_util.SyncMetrics:
+    """
+    Publish the new and changed files in folders to a destination.
+    folders: list of (local folder, destination folder relative to the destination, using '/')
+    backend: the destination backend
+    manifest_path: path to the manifest of published files for the destination
+    batch_size: number of files to upload at a time, after which the manifest is saved
+    Returns: the sync metrics, including the bytes that were not uploaded compared to copying all files,
+        with success False and the error if files could not be uploaded
+        (the manifest is saved for the files that were uploaded)
+    """
+    logger = logging.getLogger(__name__)
+
+    metrics = metrics_util.SyncMetrics(backend.destination)
+    start_time = time.perf_counter()
+    manifest = read_manifest(manifest_path, backend.destination)
+
+    # Determine the files that need to be uploaded.
+    uploads = []
+    for folder, object_folder in folders:
+        if not folder.exists():
+            logger.warning('  Folder to sync does not exist: {}'.format(folder))
+            continue
+        for file_path in list_folder_files(folder):
+            object_path = '/'.join([part for part in object_folder.split('/') if part] +
+                                   list(file_path.relative_to(folder).parts))
+            file_stat = file_path.stat()
+            metrics.files += 1
+            metrics.bytes += file_stat.st_size
+            entry = manifest.get(object_path)
+            if entry is not None and entry.get('size') == file_stat.st_size and \
+                    entry.get('mtime_ns') == file_stat.st_mtime_ns:
+                # File has not been touched since it was published.
+                continue
+            file_hash = calculate_file_hash(file_path)
+            metrics.files_hashed += 1
+            new_entry = {'sha256': file_hash, 'size': file_stat.st_size, 'mtime_ns': file_stat.st_mtime_ns}
+            if entry is not None and entry.get('sha256') == file_hash:
+                # File was written again with the same content.
+                manifest[object_path] = new_entry
+                continue
+            uploads.append((file_path, object_path, new_entry))
+
+    # Upload the files in batches, saving the manifest after each batch.
+    try:
+        for i in range(0, len(uploads), batch_size):
+            batch = uploads[i:i + batch_size]
+            backend.upload([(file_path, object_path) for file_path, object_path, entry in batch])
+            for file_path, object_path, entry in batch:
+                manifest[object_path] = entry
+                metrics.files_uploaded += 1
+                metrics.bytes_uploaded += entry['size']
+            write_manifest(manifest_path, backend.destination, manifest)
+        metrics.success = True
+    except Exception as e:
+        logger.warning('  Error uploading files to {}: {}'.format(backend.destination, e), exc_info=True)
+        metrics.error = str(e)
+    finally:
+        # Save the manifest, including files that were written again with the same content.
+        write_manifest(manifest_path, backend.destination, manifest)
+        metrics.total_seconds = time.perf_counter() - start_time
+    return metrics
+
+
+def write_manifest(manifest_path: Path, destination: str, files: dict) -> None:
+    """
+    Write the manifest of published files, replacing the file if it exists.
+    manifest_path: path to the manifest file
+    destination: destination URL or folder
+    files: dictionary of object path to dictionary with 'sha256', 'size', and 'mtime_ns'
+    """
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    publish_util.write_json(manifest_path, {'destination': destination.rstrip('/'), 'files': files})
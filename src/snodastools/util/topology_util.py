@@ -0,0 +1,323 @@
+"""
+This module contains functions to simplify basin polygons so that the boundaries that are shared by basins
+are simplified the same way, which avoids gaps and overlaps between neighboring basins.
+
+The polygon rings are split into arcs at the junctions, which are the points where the neighboring points
+are different for different rings (for example, where the boundary between two basins meets a third basin).
+Each arc is simplified once using the Douglas-Peucker algorithm, keeping the arc end points,
+and the simplified arc is used for all rings that include the arc, in either direction.
+Because the arc end points are kept, the basins continue to meet at the same points.
+
+The geometries are GeoJSON geometry objects (Polygon or MultiPolygon) as read by json.load.
+The coordinates of shared points must be equal, for example because the geometries were written with
+the same coordinate precision.  The simplified coordinates are a subset of the original coordinates.
+"""
+
+import numpy as np
+
+
+def get_junctions(rings: [list]) -> set:
+    """
+    Determine the junction points for the rings.
+    A point is a junction if it has different neighboring points in different rings or in the same ring.
+    rings: list of rings, each a list of coordinate tuples where the first and last point are the same
+    Returns: set of junction points (coordinate tuples)
+    """
+    neighbors = {}
+    junctions = set()
+    for ring in rings:
+        # Ignore the last point, which is the same as the first point.
+        points = ring[:-1]
+        count = len(points)
+        for i, point in enumerate(points):
+            point_neighbors = frozenset([points[i - 1], points[(i + 1) % count]])
+            previous_neighbors = neighbors.get(point)
+            if previous_neighbors is None:
+                neighbors[point] = point_neighbors
+            elif previous_neighbors != point_neighbors:
+                junctions.add(point)
+    return junctions
+
+
+def get_ring_arcs(ring: list, junctions: set) -> [tuple]:
+    """
+    Split a ring into arcs at the junctions.
+    A ring without junctions is one closed arc, which starts at the smallest point so that the same ring
+    in different polygons has the same arc.
+    ring: list of coordinate tuples where the first and last point are the same
+    junctions: set of junction points from get_junctions()
+    Returns: list of arcs, each a tuple of coordinate tuples, in the order of the ring
+    """
+    points = ring[:-1]
+    junction_indices = [i for i, point in enumerate(points) if point in junctions]
+    if not junction_indices:
+        start = points.index(min(points))
+        arc = points[start:] + points[:start]
+        return [tuple(arc + [arc[0]])]
+
+    # Rotate the ring to start at the first junction so that each arc is between two junctions.
+    start = junction_indices[0]
+    rotated = points[start:] + points[:start] + [points[start]]
+    arcs = []
+    arc_start = 0
+    for i in range(1, len(rotated)):
+        if rotated[i] in junctions:
+            arcs.append(tuple(rotated[arc_start:i + 1]))
+            arc_start = i
+    return arcs
+
+
+def get_arc_key(arc: tuple) -> tuple:
+    """
+    Get the key for an arc, which is the same for the arc in either direction.
+    arc: tuple of coordinate tuples
+    Returns: the arc or the reversed arc, whichever is smaller
+    """
+    reversed_arc = arc[::-1]
+    return min(arc, reversed_arc)
+
+
+def simplify_line(points: np.ndarray, tolerance: float, keep_interior: bool) -> np.ndarray:
+    """
+    Simplify a line using the Douglas-Peucker algorithm, keeping the end points.
+    points: array of shape (n, 2)
+    tolerance: the maximum distance of a removed point from the simplified line
+    keep_interior: whether to keep at least one interior point (the point farthest from the line
+        between the end points), so that a ring with few arcs is not simplified to a line
+    Returns: the points that are kept, in order
+    """
+    count = len(points)
+    if count <= 2:
+        return points
+    keep = np.zeros(count, dtype=bool)
+    keep[0] = True
+    keep[-1] = True
+    # Stack of (start index, end index) of segments to check.
+    stack = [(0, count - 1)]
+    first_segment = True
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        segment = points[end] - points[start]
+        offsets = points[start + 1:end] - points[start]
+        segment_length = np.hypot(segment[0], segment[1])
+        if segment_length > 0.0:
+            # Perpendicular distance to the line through the end points.
+            distances = np.abs(segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0]) / segment_length
+        else:
+            # The end points are the same (closed arc) so use the distance to the end point.
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        index = int(np.argmax(distances))
+        if distances[index] > tolerance or (first_segment and keep_interior):
+            keep[start + 1 + index] = True
+            stack.append((start, start + 1 + index))
+            stack.append((start + 1 + index, end))
+        first_segment = False
+    return points[keep]
+
+
+def simplify_arc(arc: tuple, tolerance: float, keep_interior: bool) -> tuple:
+    """
+    Simplify an arc.  A closed arc (ring without junctions) is split into two halves,
+    each of which keeps an interior point, so that the ring is not simplified to fewer than 4 points.
+    arc: tuple of coordinate tuples
+    tolerance: the maximum distance of a removed point from the simplified arc
+    keep_interior: whether to keep at least one interior point in an arc that is not closed
+    Returns: the simplified arc as a tuple of coordinate tuples
+    """
+    points = np.array(arc, dtype=float)
+    if arc[0] == arc[-1] and len(arc) >= 4:
+        middle = len(arc) // 2
+        first_half = simplify_line(points[:middle + 1], tolerance, True)
+        second_half = simplify_line(points[middle:], tolerance, True)
+        simplified = np.concatenate([first_half, second_half[1:]])
+    else:
+        simplified = simplify_line(points, tolerance, keep_interior)
+    # Convert to the original coordinate tuples so that the coordinates are not changed.
+    kept = set(map(tuple, simplified.tolist()))
+    return tuple(point for i, point in enumerate(arc) if point in kept and (i == 0 or point != arc[i - 1]))
+
+
+def simplify_polygons(geometries: [dict], tolerance: float) -> [dict]:
+    """
+    Simplify polygon geometries so that shared boundaries are simplified the same way.
+    geometries: list of GeoJSON geometry objects (Polygon, MultiPolygon, or None)
+    tolerance: the maximum distance of a removed point from the simplified boundary,
+        in the units of the coordinates
+    Returns: list of simplified GeoJSON geometry objects, in the same order as the input
+    """
+    # List of polygons for each geometry, each polygon a list of rings as lists of coordinate tuples.
+    geometry_polygons = []
+    rings = []
+    for geometry in geometries:
+        polygons = None
+        if geometry is not None:
+            if geometry['type'] == 'Polygon':
+                polygon_coordinates = [geometry['coordinates']]
+            elif geometry['type'] == 'MultiPolygon':
+                polygon_coordinates = geometry['coordinates']
+            else:
+                # Other geometry types are not simplified.
+                polygon_coordinates = None
+            if polygon_coordinates is not None:
+                polygons = []
+                for polygon in polygon_coordinates:
+                    polygon_rings = []
+                    for ring in polygon:
+                        ring = [tuple(point[0:2]) for point in ring]
+                        polygon_rings.append(ring)
+                        rings.append(ring)
+                    polygons.append(polygon_rings)
+        geometry_polygons.append(polygons)
+
+    junctions = get_junctions(rings)
+
+    # Split the rings into arcs and determine the arcs that must keep an interior point:
+    # - a ring with fewer than 3 arcs would be simplified to fewer than 4 points
+    # - the arc is simplified once for all the rings that use it
+    ring_arcs = {}
+    keep_interior_keys = set()
+    for ring in rings:
+        arcs = get_ring_arcs(ring, junctions)
+        ring_arcs[id(ring)] = arcs
+        if len(arcs) < 3:
+            for arc in arcs:
+                keep_interior_keys.add(get_arc_key(arc))
+
+    simplified_arcs = {}
+    simplified_geometries = []
+    for geometry, polygons in zip(geometries, geometry_polygons):
+        if polygons is None:
+            simplified_geometries.append(geometry)
+            continue
+        simplified_polygons = []
+        for polygon_rings in polygons:
+            simplified_rings = []
+            for ring in polygon_rings:
+                simplified_ring = []
+                for arc in ring_arcs[id(ring)]:
+                    key = get_arc_key(arc)
+                    simplified_arc = simplified_arcs.get(key)
+                    if simplified_arc is None:
+                        simplified_arc = simplify_arc(key, tolerance, key in keep_interior_keys)
+                        simplified_arcs[key] = simplified_arc
+                    if key != arc:
+                        # The arc is in the opposite direction from the key.
+                        simplified_arc = simplified_arc[::-1]
+                    # The first point of each arc is the last point of the previous arc.
+                    if simplified_ring:
+                        simplified_ring.extend(simplified_arc[1:])
+                    else:
+                        simplified_ring.extend(simplified_arc)
+                simplified_rings.append([list(point) for point in simplified_ring])
+            simplified_polygons.append(simplified_rings)
+        if len(simplified_polygons) == 1 and geometry['type'] == 'Polygon':
+            simplified_geometries.append({'type': 'Polygon', 'coordinates': simplified_polygons[0]})
+        else:
+            simplified_geometries.append({'type': 'MultiPolygon', 'coordinates': simplified_polygons})
+    return simplified_geometries
+
+
+def build_topology(geometries: [dict], quantization: int) -> dict:
+    """
+    Build a quantized TopoJSON topology for polygon geometries, in which each boundary that is shared by
+    basins is stored once as an arc.
+    See the TopoJSON specification:  https://github.com/topojson/topojson-specification
+    geometries: list of GeoJSON geometry objects (Polygon, MultiPolygon, or None)
+    quantization: the number of quantized positions in each dimension (for example 100000)
+    Returns: dictionary with:
+        'transform': the TopoJSON transform object
+        'arcs': list of quantized, delta-encoded arcs
+        'geometries': list of TopoJSON geometry objects without properties, in the same order as the input,
+            with type None for geometries that are not polygons
+    """
+    if quantization < 2:
+        raise ValueError('TopoJSON quantization must be at least 2 (quantization={}).'.format(quantization))
+
+    # List of polygons for each geometry, each polygon a list of rings as lists of coordinate tuples.
+    geometry_polygons = []
+    rings = []
+    for geometry in geometries:
+        polygons = None
+        if geometry is not None and geometry['type'] in ['Polygon', 'MultiPolygon']:
+            if geometry['type'] == 'Polygon':
+                polygon_coordinates = [geometry['coordinates']]
+            else:
+                polygon_coordinates = geometry['coordinates']
+            polygons = []
+            for polygon in polygon_coordinates:
+                polygon_rings = []
+                for ring in polygon:
+                    ring = [tuple(point[0:2]) for point in ring]
+                    polygon_rings.append(ring)
+                    rings.append(ring)
+                polygons.append(polygon_rings)
+        geometry_polygons.append(polygons)
+
+    # Determine the transform from the extent of all the points.
+    if rings:
+        all_points = np.array([point for ring in rings for point in ring], dtype=float)
+        x_min, y_min = all_points.min(axis=0)
+        x_max, y_max = all_points.max(axis=0)
+    else:
+        x_min = y_min = x_max = y_max = 0.0
+    scale_x = (x_max - x_min) / (quantization - 1) if x_max > x_min else 1.0
+    scale_y = (y_max - y_min) / (quantization - 1) if y_max > y_min else 1.0
+    transform = {'scale': [scale_x, scale_y], 'translate': [x_min, y_min]}
+
+    junctions = get_junctions(rings)
+
+    # Index of each arc by arc key, and the quantized, delta-encoded arcs.
+    arc_indices = {}
+    arcs = []
+    topology_geometries = []
+    for geometry, polygons in zip(geometries, geometry_polygons):
+        if polygons is None:
+            topology_geometries.append({'type': None})
+            continue
+        polygon_arcs = []
+        for polygon_rings in polygons:
+            ring_arc_indices = []
+            for ring in polygon_rings:
+                arc_index_list = []
+                for arc in get_ring_arcs(ring, junctions):
+                    key = get_arc_key(arc)
+                    arc_index = arc_indices.get(key)
+                    if arc_index is None:
+                        arc_index = len(arcs)
+                        arc_indices[key] = arc_index
+                        arcs.append(quantize_arc(key, transform))
+                    if key != arc:
+                        # The arc is in the opposite direction from the stored arc, which is referenced as
+                        # the one's complement of the index.
+                        arc_index = ~arc_index
+                    arc_index_list.append(arc_index)
+                ring_arc_indices.append(arc_index_list)
+            polygon_arcs.append(ring_arc_indices)
+        if geometry['type'] == 'Polygon':
+            topology_geometries.append({'type': 'Polygon', 'arcs': polygon_arcs[0]})
+        else:
+            topology_geometries.append({'type': 'MultiPolygon', 'arcs': polygon_arcs})
+
+    return {'transform': transform, 'arcs': arcs, 'geometries': topology_geometries}
+
+
+def quantize_arc(arc: tuple, transform: dict) -> [[int]]:
+    """
+    Quantize and delta-encode an arc.
+    Consecutive points that are the same after quantizing are removed, but at least 2 points are kept.
+    arc: tuple of coordinate tuples
+    transform: the TopoJSON transform object with 'scale' and 'translate'
+    Returns: list of [x, y] integer positions, the first absolute and the rest relative to the previous position
+    """
+    points = np.array(arc, dtype=float)
+    quantized = np.round((points - np.array(transform['translate'])) / np.array(transform['scale'])).astype(np.int64)
+    deltas = np.diff(quantized, axis=0)
+    # Keep the first point and the points that moved.
+    moved = np.any(deltas != 0, axis=1)
+    kept = np.concatenate([quantized[0:1], quantized[1:][moved]])
+    if len(kept) < 2:
+        kept = np.concatenate([kept, quantized[-1:]])
+    encoded = np.concatenate([kept[0:1], np.diff(kept, axis=0)])
+    return encoded.tolist()
@@ -0,0 +1,430 @@
+"""
+This module contains the transports used to download SNODAS data from NSIDC.
+NSIDC serves the same 'G02158/masked' folder tree over FTP and HTTPS, for example:
+
+  ftp://sidads.colorado.edu/DATASETS/NOAA/G02158/masked/2023/04_Apr/SNODAS_20230424.tar
+  https://noaadata.apps.nsidc.org/NOAA/G02158/masked/2023/04_Apr/SNODAS_20230424.tar
+
+Each transport provides the same functions so that 'snodas_util.download_snodas' does not need to know
+which protocol is used:
+
+  connect()          - connect to the server (does nothing if already connected)
+  list_date_files()  - list the files in the folder for a date
+  download_file()    - download a file to a local file
+  open_stream()      - open a file as a stream, for example to extract a .tar file while it is downloaded
+  close()            - close the connection
+
+Each transport also records the number of bytes transferred and the time to the first byte for the most recent
+download_file() or open_stream() call, which are used for the download metrics.
+"""
+
+import ftplib
+import html
+import http.client
+import logging
+import os
+import re
+import time
+import urllib.parse
+
+from contextlib import contextmanager
+from datetime import date
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+
+# Block size used when reading and writing data.
+BLOCK_SIZE = 8192
+
+
+def get_remote_date_folder(single_date: date) -> str:
+    """
+    Get the folder for a date, relative to the 'masked' folder.
+    single_date: the date of interest
+    Returns: the folder, for example '2023/04_Apr/'
+    """
+    return '{}/{}_{}/'.format(single_date.year, single_date.strftime('%m'), single_date.strftime('%b'))
+
+
+class SnodasTransport(object):
+    """
+    Base class for SNODAS transports.
+    """
+
+    def __init__(self):
+        # Number of bytes transferred by the most recent download_file() or open_stream().
+        self.bytes_transferred: int = 0
+        # Seconds from the request to the first byte of data for the most recent download_file() or open_stream(),
+        # or None if no data were received.
+        self.first_byte_seconds: float or None = None
+        # Time that the most recent request was sent, from time.perf_counter().
+        self.request_time: float = 0
+
+    def connect(self) -> None:
+        """
+        Connect to the server, if not already connected.
+        """
+        raise NotImplementedError('connect() is not implemented.')
+
+    def close(self) -> None:
+        """
+        Close the connection to the server.
+        """
+        raise NotImplementedError('close() is not implemented.')
+
+    def download_file(self, single_date: date, file_name: str, local_file_path: Path) -> int:
+        """
+        Download a file for a date.
+        single_date: the date of interest, used to determine the remote folder
+        file_name: the remote file name, for example 'SNODAS_20230424.tar'
+        local_file_path: full path to the local file to write
+        Returns: the number of bytes that were transferred
+        """
+        raise NotImplementedError('download_file() is not implemented.')
+
+    def get_description(self) -> str:
+        """
+        Returns: a description of the transport for log messages.
+        """
+        raise NotImplementedError('get_description() is not implemented.')
+
+    def list_date_files(self, single_date: date) -> [str]:
+        """
+        List the files in the remote folder for a date.
+        single_date: the date of interest
+        Returns: list of file names (without the folder)
+        """
+        raise NotImplementedError('list_date_files() is not implemented.')
+
+    def open_stream(self, single_date: date, file_name: str):
+        """
+        Open a remote file as a binary stream, to be used with a 'with' statement.
+        single_date: the date of interest, used to determine the remote folder
+        file_name: the remote file name, for example 'SNODAS_20230424.tar'
+        """
+        raise NotImplementedError('open_stream() is not implemented.')
+
+    def reset_transfer_metrics(self) -> None:
+        """
+        Reset the transfer metrics before a request.
+        """
+        self.bytes_transferred = 0
+        self.first_byte_seconds = None
+        self.request_time = time.perf_counter()
+
+    def record_block(self, block: bytes) -> None:
+        """
+        Record a block of data that was received.
+        """
+        if self.first_byte_seconds is None:
+            self.first_byte_seconds = time.perf_counter() - self.request_time
+        self.bytes_transferred += len(block)
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class FtpTransport(SnodasTransport):
+    """
+    Transport that uses the NSIDC FTP site.
+    """
+
+    def __init__(self, host: str, username: str, password: str, folder_path: str, timeout_seconds: float = 60):
+        """
+        host: FTP host, for example 'sidads.colorado.edu'
+        username: FTP username, for example 'anonymous'
+        password: FTP password
+        folder_path: top-level folder for the SNODAS masked data, for example '/DATASETS/NOAA/G02158/masked/'
+        timeout_seconds: socket timeout in seconds, so that a stalled transfer raises an error that can be retried
+        """
+        super().__init__()
+        self.timeout_seconds = timeout_seconds
+        self.host = host
+        self.username = username
+        self.password = password
+        self.folder_path = folder_path
+        if not self.folder_path.endswith('/'):
+            self.folder_path = self.folder_path + '/'
+        self.ftp: ftplib.FTP or None = None
+
+    def connect(self) -> None:
+        if self.ftp is None:
+            # Code format in reference to:
+            # http://www.informit.com/articles/article.aspx?p=686162&seqNum=7 and
+            # http://stackoverflow.com/questions/5230966/python-ftp-download-all-files-in-directory
+            self.ftp = ftplib.FTP(self.host, self.username, self.password, timeout=self.timeout_seconds)
+
+    def close(self) -> None:
+        if self.ftp is not None:
+            try:
+                self.ftp.quit()
+            except (ftplib.all_errors, AttributeError):
+                # The connection may already be closed.
+                self.ftp.close()
+            self.ftp = None
+
+    def download_file(self, single_date: date, file_name: str, local_file_path: Path) -> int:
+        self.connect()
+        self.ftp.cwd(self.folder_path + get_remote_date_folder(single_date))
+        self.reset_transfer_metrics()
+        with open(local_file_path, 'wb') as local_file:
+            def write_block(block: bytes) -> None:
+                self.record_block(block)
+                local_file.write(block)
+            # RETR file = retrieve file
+            # write_block = function called for each block, so in this case write the binary data
+            self.ftp.retrbinary('RETR ' + file_name, write_block, blocksize=BLOCK_SIZE)
+        return self.bytes_transferred
+
+    def get_description(self) -> str:
+        return 'ftp://{}{}'.format(self.host, self.folder_path)
+
+    def list_date_files(self, single_date: date) -> [str]:
+        self.connect()
+        self.ftp.cwd(self.folder_path + get_remote_date_folder(single_date))
+        return self.ftp.nlst()
+
+    @contextmanager
+    def open_stream(self, single_date: date, file_name: str):
+        self.connect()
+        self.ftp.cwd(self.folder_path + get_remote_date_folder(single_date))
+        # Open the data connection directly so that the socket can be read as a stream.
+        self.ftp.voidcmd('TYPE I')
+        self.reset_transfer_metrics()
+        data_connection = self.ftp.transfercmd('RETR ' + file_name)
+        try:
+            with MeteredStream(data_connection.makefile('rb'), self) as stream:
+                yield stream
+                # Read any remaining data so that the server sees a complete transfer.
+                while stream.read(BLOCK_SIZE):
+                    pass
+        except BaseException:
+            # The transfer may be incomplete (for example, after a timeout), so close the connections
+            # rather than waiting for the server's reply, which could fail again and hide the error.
+            # The next request opens a new connection.
+            data_connection.close()
+            self.ftp.close()
+            self.ftp = None
+            raise
+        data_connection.close()
+        self.ftp.voidresp()
+
+
+class HttpsTransport(SnodasTransport):
+    """
+    Transport that uses the NSIDC HTTPS site.
+    A single connection is kept open (HTTP/1.1 keep-alive) and reused for all requests.
+    Downloads are written to a '.part' file so that an interrupted download can be resumed with a 'Range' request,
+    and a previously downloaded file is only transferred again if it was modified ('If-Modified-Since').
+    An 'http://' URL can be used, for example for a local stand-in server.
+    """
+
+    def __init__(self, url: str, timeout_seconds: float = 60):
+        """
+        url: URL for the top-level folder for the SNODAS masked data,
+            for example 'https://noaadata.apps.nsidc.org/NOAA/G02158/masked/'
+        timeout_seconds: socket timeout in seconds
+        """
+        super().__init__()
+        if not url.endswith('/'):
+            url = url + '/'
+        self.url = url
+        parsed_url = urllib.parse.urlsplit(url)
+        self.scheme = parsed_url.scheme.lower()
+        self.host = parsed_url.hostname
+        self.port = parsed_url.port
+        self.folder_path = parsed_url.path
+        self.timeout_seconds = timeout_seconds
+        self.connection: http.client.HTTPConnection or None = None
+
+    def connect(self) -> None:
+        if self.connection is None:
+            if self.scheme == 'https':
+                self.connection = http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout_seconds)
+            else:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout_seconds)
+            self.connection.connect()
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def download_file(self, single_date: date, file_name: str, local_file_path: Path) -> int:
+        logger = logging.getLogger(__name__)
+
+        headers = {}
+        part_file_path = local_file_path.with_name(local_file_path.name + '.part')
+        part_size = 0
+        if part_file_path.exists():
+            # Resume the previous download.
+            part_size = part_file_path.stat().st_size
+            headers['Range'] = 'bytes={}-'.format(part_size)
+        elif local_file_path.exists():
+            # Only transfer if the remote file is newer than the local file.
+            headers['If-Modified-Since'] = formatdate(local_file_path.stat().st_mtime, usegmt=True)
+
+        self.reset_transfer_metrics()
+        response = self._request('GET', self._get_file_path(single_date, file_name), headers)
+        try:
+            if response.status == 304:
+                logger.info('  Not modified since previous download: {}'.format(local_file_path))
+                response.read()
+                return 0
+            elif response.status == 206:
+                logger.info('  Resuming download at byte {}: {}'.format(part_size, local_file_path))
+                mode = 'ab'
+            elif response.status == 200:
+                mode = 'wb'
+            elif response.status == 416 and part_size > 0:
+                # The '.part' file is not consistent with the remote file so start over.
+                response.read()
+                part_file_path.unlink()
+                return self.download_file(single_date, file_name, local_file_path)
+            else:
+                raise HttpStatusError(response.status, response.reason, self.url + file_name)
+
+            with open(part_file_path, mode) as part_file:
+                while True:
+                    block = response.read(BLOCK_SIZE)
+                    if not block:
+                        break
+                    self.record_block(block)
+                    part_file.write(block)
+        except BaseException:
+            # The response may be incomplete (for example, after a timeout), so close the connection
+            # rather than reading the rest of the response, which could fail again and hide the error.
+            self.close()
+            raise
+        # Make sure that the response is fully read so that the connection can be reused.
+        response.read()
+
+        # Rename the complete file and set its modification time to the remote time,
+        # so that the next 'If-Modified-Since' request is correct.
+        os.replace(part_file_path, local_file_path)
+        last_modified = response.getheader('Last-Modified')
+        if last_modified:
+            modified_time = parsedate_to_datetime(last_modified).timestamp()
+            os.utime(local_file_path, (modified_time, modified_time))
+        return self.bytes_transferred
+
+    def get_description(self) -> str:
+        return self.url
+
+    def list_date_files(self, single_date: date) -> [str]:
+        response = self._request('GET', self.folder_path + get_remote_date_folder(single_date), {})
+        content = response.read()
+        if response.status != 200:
+            raise HttpStatusError(response.status, response.reason, self.url + get_remote_date_folder(single_date))
+        # The folder listing is an HTML page with links to the files.
+        file_names = []
+        for href in re.findall(r'href="([^"]+)"', content.decode('utf-8', errors='replace'), re.IGNORECASE):
+            href = urllib.parse.unquote(html.unescape(href))
+            if '?' in href or href.endswith('/'):
+                # Skip column sort links and folders.
+                continue
+            file_name = href.split('/')[-1]
+            if file_name and file_name not in file_names:
+                file_names.append(file_name)
+        return file_names
+
+    @contextmanager
+    def open_stream(self, single_date: date, file_name: str):
+        self.reset_transfer_metrics()
+        response = self._request('GET', self._get_file_path(single_date, file_name), {})
+        if response.status != 200:
+            response.read()
+            raise HttpStatusError(response.status, response.reason, self.url + file_name)
+        stream = MeteredStream(response, self)
+        try:
+            yield stream
+        except BaseException:
+            # The response may be incomplete (for example, after a timeout), so close the connection
+            # rather than reading the rest of the response, which could fail again and hide the error.
+            self.close()
+            raise
+        # Make sure that the response is fully read so that the connection can be reused.
+        while stream.read(BLOCK_SIZE):
+            pass
+
+    def _get_file_path(self, single_date: date, file_name: str) -> str:
+        """
+        Get the URL path for a file.
+        """
+        return self.folder_path + get_remote_date_folder(single_date) + urllib.parse.quote(file_name)
+
+    def _request(self, method: str, path: str, headers: dict) -> http.client.HTTPResponse:
+        """
+        Send a request on the kept-alive connection, reconnecting once if the server closed the connection.
+        """
+        self.connect()
+        try:
+            self.connection.request(method, path, headers=headers)
+            return self.connection.getresponse()
+        except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+            # The server closed the idle connection so reconnect and try again.
+            self.close()
+            self.connect()
+            self.connection.request(method, path, headers=headers)
+            return self.connection.getresponse()
+
+
+class MeteredStream(object):
+    """
+    Wrapper for a binary stream that records the data that are read with the transport's record_block().
+    Only read() and close() are provided, which is all that is needed to read a .tar file as a stream.
+    """
+
+    def __init__(self, stream, transport: SnodasTransport):
+        """
+        stream: binary stream to read
+        transport: transport that records the metrics
+        """
+        self.stream = stream
+        self.transport = transport
+
+    def close(self) -> None:
+        self.stream.close()
+
+    def read(self, size: int = -1) -> bytes:
+        block = self.stream.read(size)
+        if block:
+            self.transport.record_block(block)
+        return block
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class TruncatedTransferError(Exception):
+    """
+    Exception for data from a transfer that could not be read because the transfer was incomplete,
+    for example a .tar stream that was cut off when the connection dropped.
+    """
+
+    def __init__(self, description: str, error: Exception):
+        """
+        description: description of the transfer, for example the file name and server
+        error: the error from reading the data
+        """
+        super().__init__('Incomplete transfer ({}) for: {}'.format(error, description))
+        self.description = description
+        self.error = error
+
+
+class HttpStatusError(Exception):
+    """
+    Exception for an unexpected HTTP response status.
+    """
+
+    def __init__(self, status: int, reason: str, url: str):
+        super().__init__('HTTP {} {} for: {}'.format(status, reason, url))
+        self.status = status
+        self.reason = reason
+        self.url = url
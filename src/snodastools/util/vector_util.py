@@ -0,0 +1,510 @@
+"""
+This module contains functions to write the vector output layers (shapefile and GeoJSON).
+
+The statistics are calculated using attribute field names that fit in a shapefile (10 characters).
+The output files are written with the final field names by mapping the field names when the layer is written,
+so that each file is written once and the layer does not need to be edited.
+
+The basin geometries are the same for every date, so the GeoJSON geometry for each basin,
+in the output coordinate reference system and with the configured precision, is serialized once and cached.
+Each daily GeoJSON file is then written by combining the cached geometry with the basin properties for the date.
+Simplified basin geometry can also be written once to separate files, with daily properties files
+that reference the geometry files by name and contain no geometry.
+The TopoJSON topology, in which the boundaries shared by basins are stored once, is also built once and cached,
+so that each daily TopoJSON file is written by combining the cached topology with the basin properties.
+FlatGeobuf files, which have a spatial index so that clients can read only the basins in view,
+are written with OGR from the cached geometry.
+
+The files that use the cached geometry are written from a FeatureTable, which holds the attributes that are
+read once from the layer and are not changed, so that the files can be written at the same time by multiple threads.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import snodastools.util.qgis_version_util as qgis_version_util
+import snodastools.util.topology_util as topology_util
+import tempfile
+import threading
+
+from pathlib import Path
+
+if (qgis_version_util.get_qgis_version_int(1) >= 3) and (qgis_version_util.get_qgis_version_int(2) <= 10):
+    # The following worked with QGIS 3.10.
+    import ogr
+    import osr
+elif (qgis_version_util.get_qgis_version_int(1) >= 3) and (qgis_version_util.get_qgis_version_int(2) > 10):
+    # The following works with QGIS 3.26.3.
+    import osgeo.ogr as ogr
+    import osgeo.osr as osr
+
+from PyQt5.QtCore import QVariant
+from qgis.core import (
+    QgsCoordinateReferenceSystem,
+    QgsCoordinateTransform,
+    QgsCoordinateTransformContext,
+    QgsFeature,
+    QgsField,
+    QgsVectorFileWriter,
+    QgsVectorLayer
+)
+
+# Cache of GeoJSON geometry text by feature identifier:
+# - the key is (file path, file modification time, file size, output CRS, precision)
+#   so that the cache is not used if the file is changed
+geometry_fragment_cache = {}
+# Lock to protect the cache because zonal statistics may be run in multiple threads.
+geometry_fragment_cache_lock = threading.Lock()
+
+# Cache of TopoJSON topology text, with the same key as the geometry cache and the quantization.
+topology_fragment_cache = {}
+# Lock to protect the cache because zonal statistics may be run in multiple threads.
+topology_fragment_cache_lock = threading.Lock()
+
+
+class FieldNameConverter(QgsVectorFileWriter.FieldValueConverter):
+    """
+    Field value converter that renames fields when a layer is written.
+    The values are not changed.
+    """
+
+    def __init__(self, field_names: dict):
+        """
+        field_names: dictionary of layer field name to output field name,
+            fields that are not in the dictionary are written with the layer field name
+        """
+        super().__init__()
+        self.field_names = field_names
+
+    def clone(self):
+        return FieldNameConverter(self.field_names)
+
+    def convert(self, field_index: int, value):
+        return value
+
+    def fieldDefinition(self, field: QgsField) -> QgsField:
+        output_field = QgsField(field)
+        if field.name() in self.field_names:
+            output_field.setName(self.field_names[field.name()])
+        return output_field
+
+
+class FeatureTable(object):
+    """
+    Table of the output attributes of the features of a layer, read once from the layer.
+    The table is not changed after it is created, so it can be used by multiple threads,
+    whereas the layer must only be used by the thread that created it.
+    """
+
+    def __init__(self, layer: QgsVectorLayer, field_names: dict or None = None,
+                 exclude_field_names: [str] or None = None, feature_ids: dict or None = None):
+        """
+        layer: the layer to read the attributes from
+        field_names: dictionary of layer field name to output field name, or None to use the layer field names
+        exclude_field_names: list of layer field names that are not included, or None to include all fields
+        feature_ids: dictionary of layer feature identifier to the feature identifier used in the rows
+            (for example, for a memory layer created from a shapefile), or None to use the layer identifiers
+        """
+        if field_names is None:
+            field_names = {}
+        if exclude_field_names is None:
+            exclude_field_names = []
+
+        fields = [field for field in layer.fields() if field.name() not in exclude_field_names]
+        # Tuple of output field names, in layer order.
+        self.field_names = tuple(field_names.get(field.name(), field.name()) for field in fields)
+        # Tuple of field types (QVariant type), in the same order as the field names.
+        self.field_types = tuple(field.type() for field in fields)
+        # Tuple of (feature identifier, tuple of values), with None for NULL values, in layer order.
+        self.rows = tuple((get_feature_id(feature, feature_ids),
+                           tuple(get_json_value(feature[field.name()]) for field in fields))
+                          for feature in layer.getFeatures())
+
+    def get_properties(self, values: tuple) -> dict:
+        """
+        Get the properties for the values of a row.
+        values: tuple of values from a row of the table
+        Returns: dictionary of output field name to value
+        """
+        return dict(zip(self.field_names, values))
+
+
+def write_vector_layer(layer: QgsVectorLayer, file_path: Path, driver_name: str, output_crs: str,
+                       field_names: dict or None = None, exclude_field_names: [str] or None = None,
+                       layer_options: [str] or None = None) -> bool:
+    """
+    Write a layer to a vector file, renaming and excluding fields.
+    layer: the layer to write
+    file_path: path to the output file
+    driver_name: OGR driver name, for example "ESRI Shapefile" or "GeoJSON"
+    output_crs: the coordinate reference system of the output file, for example "EPSG:4326"
+    field_names: dictionary of layer field name to output field name, or None to use the layer field names
+    exclude_field_names: list of layer field names that are not written, or None to write all fields
+    layer_options: OGR layer creation options, or None
+    Returns: True if the file was written, False if there was an error
+    """
+    logger = logging.getLogger(__name__)
+
+    if exclude_field_names is None:
+        exclude_field_names = []
+
+    options = QgsVectorFileWriter.SaveVectorOptions()
+    options.driverName = driver_name
+    options.fileEncoding = 'utf-8'
+    if layer_options:
+        options.layerOptions = layer_options
+    options.ct = QgsCoordinateTransform(layer.crs(), QgsCoordinateReferenceSystem(output_crs),
+                                        QgsCoordinateTransformContext())
+    options.attributes = [index for index, field in enumerate(layer.fields())
+                          if field.name() not in exclude_field_names]
+    # Keep a reference to the converter while the layer is written.
+    converter = FieldNameConverter(field_names if field_names else {})
+    options.fieldValueConverter = converter
+
+    result = QgsVectorFileWriter.writeAsVectorFormat(layer, str(file_path), options)
+    # The result is a tuple of (error, error message).
+    error, error_message = result[0], result[1]
+    if error != QgsVectorFileWriter.NoError:
+        logger.warning('  Error writing {}: {}'.format(file_path, error_message))
+        return False
+    return True
+
+
+def get_geojson_geometry_fragments(layer: QgsVectorLayer, file_path: Path, output_crs: str,
+                                   precision: str or int, feature_ids: dict or None = None) -> dict or None:
+    """
+    Get the GeoJSON geometry text for each feature of a layer, in the output coordinate reference system.
+    The geometry is written by OGR once for a file, CRS and precision, and the result is cached.
+    layer: the layer to write, which must have the same features as file_path
+    file_path: path to the layer file, used with the file modification time and size as the cache key
+    output_crs: the coordinate reference system of the output, for example "EPSG:4326"
+    precision: the number of decimal places for coordinates
+    feature_ids: dictionary of layer feature identifier to file feature identifier, or None if the layer
+        was read from file_path and has the same feature identifiers
+    Returns: dictionary of feature identifier to GeoJSON geometry text, or None if there was an error
+    """
+    logger = logging.getLogger(__name__)
+
+    cache_key = get_file_cache_key(file_path, output_crs, precision)
+    with geometry_fragment_cache_lock:
+        fragments = geometry_fragment_cache.get(cache_key)
+        if fragments is not None:
+            return fragments
+
+        # Write the geometry without attributes to a temporary GeoJSON file:
+        # - use the same options as the daily GeoJSON so that the geometry is the same as writing the full layer
+        temp_folder = Path(tempfile.mkdtemp(prefix='SNODAS-Geometry-'))
+        try:
+            temp_file_path = temp_folder / 'geometry.geojson'
+            options = QgsVectorFileWriter.SaveVectorOptions()
+            options.driverName = 'GeoJSON'
+            options.fileEncoding = 'utf-8'
+            options.layerOptions = [
+                'COORDINATE_PRECISION={}'.format(precision),
+                'RFC7946=YES',
+                'WRITE_NAME=NO'
+            ]
+            options.ct = QgsCoordinateTransform(layer.crs(), QgsCoordinateReferenceSystem(output_crs),
+                                                QgsCoordinateTransformContext())
+            options.attributes = []
+            result = QgsVectorFileWriter.writeAsVectorFormat(layer, str(temp_file_path), options)
+            error, error_message = result[0], result[1]
+            if error != QgsVectorFileWriter.NoError:
+                logger.warning('  Error writing basin geometry for {}: {}'.format(file_path, error_message))
+                return None
+            with open(temp_file_path, 'r', encoding='utf-8') as geojson_file:
+                geojson = json.load(geojson_file)
+        finally:
+            shutil.rmtree(str(temp_folder), ignore_errors=True)
+
+        # Features are written in the order that they are read from the layer.
+        file_feature_ids = [get_feature_id(feature, feature_ids) for feature in layer.getFeatures()]
+        geojson_features = geojson.get('features', [])
+        if len(file_feature_ids) != len(geojson_features):
+            logger.warning('  Number of basin geometries ({}) does not match the number of features ({}) for {}'.format(
+                len(geojson_features), len(file_feature_ids), file_path))
+            return None
+        fragments = {}
+        for feature_id, geojson_feature in zip(file_feature_ids, geojson_features):
+            fragments[feature_id] = json.dumps(geojson_feature.get('geometry'), separators=(',', ':'))
+
+        logger.info('  Cached GeoJSON geometry for {} basins from {}'.format(len(fragments), file_path))
+        geometry_fragment_cache[cache_key] = fragments
+        return fragments
+
+
+def get_topojson_fragments(layer: QgsVectorLayer, file_path: Path, output_crs: str, precision: str or int,
+                           quantization: int, feature_ids: dict or None = None) -> dict or None:
+    """
+    Get the TopoJSON topology for the features of a layer, in the output coordinate reference system.
+    The topology is built once for a file, CRS, precision, and quantization, and the result is cached.
+    layer: the layer to write, which must have the same features as file_path
+    file_path: path to the layer file, used with the file modification time and size as the cache key
+    output_crs: the coordinate reference system of the output, for example "EPSG:4326"
+    precision: the number of decimal places for coordinates, before quantizing
+    quantization: the number of quantized positions in each dimension
+    feature_ids: dictionary of layer feature identifier to file feature identifier, or None if the layer
+        was read from file_path and has the same feature identifiers
+    Returns: dictionary with 'transform' (transform JSON text), 'arcs' (arcs JSON text),
+        and 'geometries' (dictionary of feature identifier to TopoJSON geometry JSON text without properties),
+        or None if there was an error
+    """
+    logger = logging.getLogger(__name__)
+
+    cache_key = get_file_cache_key(file_path, output_crs, precision, quantization)
+    with topology_fragment_cache_lock:
+        topology_fragments = topology_fragment_cache.get(cache_key)
+        if topology_fragments is not None:
+            return topology_fragments
+
+        geometry_fragments = get_geojson_geometry_fragments(layer, file_path, output_crs, precision, feature_ids)
+        if geometry_fragments is None:
+            return None
+        file_feature_ids = [get_feature_id(feature, feature_ids) for feature in layer.getFeatures()]
+        topology = topology_util.build_topology(
+            [json.loads(geometry_fragments.get(feature_id, 'null')) for feature_id in file_feature_ids],
+            quantization)
+
+        topology_fragments = {
+            'transform': json.dumps(topology['transform'], separators=(',', ':')),
+            'arcs': json.dumps(topology['arcs'], separators=(',', ':')),
+            'geometries': {}
+        }
+        for feature_id, geometry in zip(file_feature_ids, topology['geometries']):
+            topology_fragments['geometries'][feature_id] = json.dumps(geometry, separators=(',', ':'))
+
+        logger.info('  Cached TopoJSON topology with {} arcs for {} basins from {}'.format(
+            len(topology['arcs']), len(file_feature_ids), file_path))
+        topology_fragment_cache[cache_key] = topology_fragments
+        return topology_fragments
+
+
+def get_ogr_field_type(field_type: int) -> int:
+    """
+    Get the OGR field type for a layer field type.
+    field_type: the layer field type (QVariant type)
+    Returns: the OGR field type, string if the type is not a number
+    """
+    if field_type == QVariant.Int:
+        return ogr.OFTInteger
+    elif field_type == QVariant.LongLong:
+        return ogr.OFTInteger64
+    elif field_type == QVariant.Double:
+        return ogr.OFTReal
+    else:
+        return ogr.OFTString
+
+
+def get_shapefile_hash(shp_file_path: Path, extra_values: [str] or None = None) -> str:
+    """
+    Calculate the SHA-256 hash of the files for a shapefile (.shp, .shx, .dbf, .prj, .cpg).
+    shp_file_path: path to the .shp file
+    extra_values: list of other values that are included in the hash, for example output options, or None
+    Returns: the hash as a hexadecimal string
+    """
+    file_hash = hashlib.sha256()
+    for ext in ['.shp', '.shx', '.dbf', '.prj', '.cpg']:
+        file_path = shp_file_path.with_suffix(ext)
+        if file_path.exists():
+            file_hash.update(ext.encode('utf-8'))
+            with open(file_path, 'rb') as file:
+                for chunk in iter(lambda: file.read(1024 * 1024), b''):
+                    file_hash.update(chunk)
+    if extra_values:
+        for value in extra_values:
+            file_hash.update(str(value).encode('utf-8'))
+    return file_hash.hexdigest()
+
+
+def get_feature_id(feature: QgsFeature, feature_ids: dict or None) -> int:
+    """
+    Get the identifier of a feature, mapped to another identifier if requested.
+    feature: the feature
+    feature_ids: dictionary of layer feature identifier to the identifier to use, or None to use the layer identifier
+    Returns: the feature identifier
+    """
+    if feature_ids is None:
+        return feature.id()
+    return feature_ids[feature.id()]
+
+
+def get_file_cache_key(file_path: Path, *values) -> tuple:
+    """
+    Get the key for a cache of data that are read from a file,
+    which changes if the file is modified.
+    file_path: path to the file
+    values: other values that determine the cached data, for example output options
+    Returns: tuple of the file path, modification time, size, and the values as strings
+    """
+    file_stat = file_path.stat()
+    return (str(file_path.resolve()), file_stat.st_mtime_ns, file_stat.st_size) + tuple(str(value) for value in values)
+
+
+def get_json_value(value):
+    """
+    Convert a layer attribute value to a value that can be written to JSON.
+    value: attribute value from a feature
+    Returns: the value, or None if the value is NULL
+    """
+    if isinstance(value, QVariant):
+        if value.isNull():
+            return None
+        return value.value()
+    return value
+
+
+def write_geojson(feature_table: FeatureTable, file_path: Path, geometry_fragments: dict) -> None:
+    """
+    Write features to a GeoJSON file using cached geometry.
+    Each feature is written as it is formatted so that the output does not need to be held in memory.
+    feature_table: the table of features to write the properties from
+    file_path: path to the output file
+    geometry_fragments: dictionary of feature identifier to GeoJSON geometry text,
+        from get_geojson_geometry_fragments()
+    """
+    with open(file_path, 'w', encoding='utf-8') as geojson_file:
+        geojson_file.write('{"type":"FeatureCollection","features":[\n')
+        for i, (feature_id, values) in enumerate(feature_table.rows):
+            if i > 0:
+                geojson_file.write(',\n')
+            geojson_file.write('{{"type":"Feature","properties":{},"geometry":{}}}'.format(
+                json.dumps(feature_table.get_properties(values), separators=(',', ':')),
+                geometry_fragments.get(feature_id, 'null')))
+        geojson_file.write('\n]}\n')
+
+
+def write_flatgeobuf(feature_table: FeatureTable, file_path: Path, geometry_fragments: dict, output_crs: str) -> bool:
+    """
+    Write features to a FlatGeobuf file with a spatial index, using cached geometry.
+    The file is written with OGR so that the geometry is not transformed again.
+    The file is written to a temporary file and then renamed so that a partial file is not used.
+    feature_table: the table of features to write the properties from
+    file_path: path to the output file
+    geometry_fragments: dictionary of feature identifier to GeoJSON geometry text,
+        from get_geojson_geometry_fragments()
+    output_crs: the coordinate reference system of the geometry, for example "EPSG:4326"
+    Returns: True if the file was written, False if there was an error
+    """
+    logger = logging.getLogger(__name__)
+
+    driver = ogr.GetDriverByName('FlatGeobuf')
+    if driver is None:
+        logger.warning('  The FlatGeobuf driver is not available (requires GDAL 3.1 or later).')
+        return False
+
+    # The GeoJSON geometry is longitude, latitude order.
+    srs = osr.SpatialReference()
+    srs.SetFromUserInput(output_crs)
+    if hasattr(osr, 'OAMS_TRADITIONAL_GIS_ORDER'):
+        srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+
+    temp_file_path = file_path.with_name('.' + file_path.name + '.tmp')
+    if temp_file_path.exists():
+        temp_file_path.unlink()
+    data_source = driver.CreateDataSource(str(temp_file_path))
+    if data_source is None:
+        logger.warning('  Unable to create FlatGeobuf file: {}'.format(temp_file_path))
+        return False
+    out_layer = data_source.CreateLayer(file_path.stem, srs, ogr.wkbMultiPolygon, ['SPATIAL_INDEX=YES'])
+
+    for field_name, field_type in zip(feature_table.field_names, feature_table.field_types):
+        out_layer.CreateField(ogr.FieldDefn(field_name, get_ogr_field_type(field_type)))
+    layer_defn = out_layer.GetLayerDefn()
+
+    for feature_id, values in feature_table.rows:
+        out_feature = ogr.Feature(layer_defn)
+        for field_index, value in enumerate(values):
+            if value is None:
+                out_feature.SetFieldNull(field_index)
+            else:
+                out_feature.SetField(field_index, value)
+        geometry_text = geometry_fragments.get(feature_id, 'null')
+        if geometry_text != 'null':
+            out_feature.SetGeometry(ogr.ForceToMultiPolygon(ogr.CreateGeometryFromJson(geometry_text)))
+        out_layer.CreateFeature(out_feature)
+        out_feature = None
+
+    # Close the file so that the spatial index is written.
+    out_layer = None
+    data_source = None
+    os.replace(temp_file_path, file_path)
+    return True
+
+
+def write_geometry_geojson(layer: QgsVectorLayer, file_path: Path, geometry_fragments: dict, id_field_name: str,
+                           tolerance: float or None = None, feature_ids: dict or None = None) -> None:
+    """
+    Write the geometry of a layer to a GeoJSON file with only the identifier property,
+    optionally simplified so that shared boundaries are simplified the same way.
+    The file is written to a temporary file and then renamed so that a partial file is not used.
+    layer: the layer to write the identifiers from
+    file_path: path to the output file
+    geometry_fragments: dictionary of feature identifier to GeoJSON geometry text,
+        from get_geojson_geometry_fragments()
+    id_field_name: name of the identifier field
+    tolerance: the simplify tolerance, in the units of the geometry coordinates, or None to not simplify
+    feature_ids: dictionary of layer feature identifier to the identifier used in the geometry fragments,
+        or None to use the layer identifiers
+    """
+    features = [(get_feature_id(feature, feature_ids), get_json_value(feature[id_field_name]))
+                for feature in layer.getFeatures()]
+    geometries = [json.loads(geometry_fragments.get(feature_id, 'null')) for feature_id, id_value in features]
+    if tolerance is not None:
+        geometries = topology_util.simplify_polygons(geometries, tolerance)
+
+    temp_file_path = file_path.with_name('.' + file_path.name + '.tmp')
+    with open(temp_file_path, 'w', encoding='utf-8') as geojson_file:
+        geojson_file.write('{"type":"FeatureCollection","features":[\n')
+        for i, ((feature_id, id_value), geometry) in enumerate(zip(features, geometries)):
+            if i > 0:
+                geojson_file.write(',\n')
+            geojson_file.write('{{"type":"Feature","properties":{},"geometry":{}}}'.format(
+                json.dumps({id_field_name: id_value}, separators=(',', ':')),
+                json.dumps(geometry, separators=(',', ':'))))
+        geojson_file.write('\n]}\n')
+    os.replace(temp_file_path, file_path)
+
+
+def write_properties_json(feature_table: FeatureTable, file_path: Path, geometry_files: dict,
+                          id_field_name: str) -> None:
+    """
+    Write the properties of features to a compact JSON file without geometry.
+    The features have the same structure as GeoJSON features so that the properties can be joined
+    to the geometry files using the identifier field:
+      {"idField": "...", "geometryFiles": {"tolerance": "file name"}, "features": [{"properties": {...}}]}
+    feature_table: the table of features to write the properties from
+    file_path: path to the output file
+    geometry_files: dictionary of simplify tolerance to the name of the geometry file
+    id_field_name: name of the identifier field, which is used to join to the geometry files
+    """
+    features = [{'properties': feature_table.get_properties(values)} for feature_id, values in feature_table.rows]
+
+    with open(file_path, 'w', encoding='utf-8') as json_file:
+        json.dump({'idField': id_field_name, 'geometryFiles': geometry_files, 'features': features}, json_file,
+                  separators=(',', ':'))
+
+
+def write_topojson(feature_table: FeatureTable, file_path: Path, topology_fragments: dict, object_name: str) -> None:
+    """
+    Write features to a TopoJSON file using the cached topology.
+    The features are written as a GeometryCollection object with the properties of each feature.
+    feature_table: the table of features to write the properties from
+    file_path: path to the output file
+    topology_fragments: the topology from get_topojson_fragments()
+    object_name: name of the object in the topology, for example 'basins'
+    """
+    with open(file_path, 'w', encoding='utf-8') as topojson_file:
+        topojson_file.write('{{"type":"Topology","transform":{},"objects":{{{}:{{"type":"GeometryCollection",'
+                            '"geometries":[\n'.format(topology_fragments['transform'], json.dumps(object_name)))
+        for i, (feature_id, values) in enumerate(feature_table.rows):
+            if i > 0:
+                topojson_file.write(',\n')
+            # The geometry text is an object, to which the properties are added.
+            geometry = topology_fragments['geometries'].get(feature_id, '{"type":null}')
+            topojson_file.write('{},"properties":{}}}'.format(
+                geometry[:-1], json.dumps(feature_table.get_properties(values), separators=(',', ':'))))
+        topojson_file.write('\n]}},"arcs":')
+        topojson_file.write(topology_fragments['arcs'])
+        topojson_file.write('}\n')
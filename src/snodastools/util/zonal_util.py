@@ -0,0 +1,703 @@
+"""
+This module contains functions to calculate zonal statistics for the basins using NumPy arrays.
+
+The SWE raster is read into memory once and the statistics for all basins are calculated from the array:
+
+  count       - number of cells in the basin that have data
+  mean        - mean SWE (mm)
+  min         - minimum SWE (mm)
+  max         - maximum SWE (mm)
+  stdev       - standard deviation of SWE (mm), for the population
+  snow_count  - number of cells in the basin that are covered by snow (SWE > 0)
+  threshold_snow_count - dictionary of SWE threshold (mm) and number of cells in the basin with SWE > threshold,
+                for optional snow cover thresholds
+
+The cells for each basin are found by rasterizing the basin polygon onto the raster grid.
+A cell is in a basin if the cell center is inside the polygon, which is the same as QgsZonalStatistics.
+Also the same as QgsZonalStatistics, if a basin is so small that it contains no cell centers,
+the cells that the polygon touches are weighted by the fraction of the cell that is inside the polygon.
+Each basin is rasterized separately because basins may overlap (for example, upstream total basins).
+The basin cells are cached so that they are only determined once for a basin boundary shapefile and raster grid.
+
+The cells that have data (the valid-cell mask) only change when NSIDC changes the SNODAS water/nodata mask,
+so the basin cells that have data, and therefore the effective cell counts, are also cached for each version
+of the mask (see get_valid_basin_cells()).  The mask version is the hash of the valid-cell mask,
+so a mask change is detected without comparing the mask cell by cell.
+The valid basin cells are optionally saved in a cache folder so that they can be reused by later runs.
+
+The raster can be projected (for example Albers Equal Area, where all cells have the same area)
+or geographic (the native SNODAS WGS84 grid, where the cell area decreases with latitude).
+For a geographic raster, each cell is weighted by its area on the ellipsoid relative to a reference cell area,
+so the count is in units of reference cells, and the mean, standard deviation, and snow cover are area-weighted.
+The cell areas only depend on the row, so are calculated once per row (see calculate_row_cell_areas()).
+
+The snow cover GeoTIFF is written as a compact binary product (see write_snow_cover_tif()):
+1-bit (NBITS=1) or Byte cells, compressed, with cells that have no SWE data masked as nodata.
+"""
+
+import hashlib
+import logging
+import numpy as np
+import os
+import snodastools.util.qgis_version_util as qgis_version_util
+import threading
+
+from pathlib import Path
+
+if (qgis_version_util.get_qgis_version_int(1) >= 3) and (qgis_version_util.get_qgis_version_int(2) <= 10):
+    # The following worked with QGIS 3.10.
+    import gdal
+    import ogr
+    import osr
+elif (qgis_version_util.get_qgis_version_int(1) >= 3) and (qgis_version_util.get_qgis_version_int(2) > 10):
+    # The following works with QGIS 3.26.3.
+    import osgeo.gdal as gdal
+    import osgeo.ogr as ogr
+    import osgeo.osr as osr
+
+# Cache of basin cells, with key from get_basin_cells_key() and value a dictionary:
+# - key: feature ID of the basin in the boundary shapefile
+# - value: BasinCells for the basin
+basin_cells_cache = {}
+# Lock for the cache, in case it is used by multiple threads.
+basin_cells_cache_lock = threading.Lock()
+
+# Cache of basin cells that have data, with key of (get_basin_cells_key(), get_valid_mask_hash())
+# and value a dictionary similar to basin_cells_cache.
+valid_basin_cells_cache = {}
+
+# Compression methods that can be used for the snow cover GeoTIFF.
+SNOW_COVER_COMPRESSIONS = ('DEFLATE', 'LZW', 'NONE')
+# Nodata value for a Byte (NBITS=8) snow cover GeoTIFF.  1-bit GeoTIFFs use a mask band instead.
+SNOW_COVER_BYTE_NODATA = 255
+
+
+class BasinCells(object):
+    """
+    Raster cells for a basin.
+    """
+
+    def __init__(self, cells: np.ndarray, weights: np.ndarray or None = None):
+        """
+        cells: NumPy array of flat (row * width + column) indices of the basin cells
+        weights: NumPy array of the fraction of each cell inside the basin, or None if all cells have weight 1
+        """
+        self.cells = cells
+        self.weights = weights
+
+
+class RasterData(object):
+    """
+    Single-band raster data read into memory.
+    """
+
+    def __init__(self, values: np.ndarray, nodata: float or None, geotransform: tuple, projection: str):
+        """
+        values: 2D array of raster values (rows, columns)
+        nodata: the raster's nodata value, or None if not defined
+        geotransform: GDAL geotransform (x origin, x cell size, x rotation, y origin, y rotation, y cell size)
+        projection: the raster's projection as WKT
+        """
+        self.values = values
+        self.nodata = nodata
+        self.geotransform = tuple(geotransform)
+        self.projection = projection
+
+    def get_height(self) -> int:
+        return self.values.shape[0]
+
+    def get_valid_mask(self) -> np.ndarray:
+        """
+        Returns: 2D boolean array that is True for cells that have data.
+        """
+        valid = np.ones(self.values.shape, dtype=bool)
+        if self.nodata is not None:
+            valid &= self.values != self.nodata
+        if np.issubdtype(self.values.dtype, np.floating):
+            valid &= ~np.isnan(self.values)
+        return valid
+
+    def get_width(self) -> int:
+        return self.values.shape[1]
+
+
+def calculate_dense_basin_statistics(basin: BasinCells, flat_values: np.ndarray, flat_snow: np.ndarray,
+                                     thresholds: [float]) -> dict:
+    """
+    Calculate the statistics for a basin from the values of all of its cells.
+    basin: the basin cells that have data
+    flat_values: the raster values, as a 1D array
+    flat_snow: the snow cover mask, as a 1D array, or None to not calculate the snow cover
+    thresholds: list of SWE thresholds (mm)
+    Returns: dictionary of statistics (see the module documentation)
+    """
+    basin_values = flat_values[basin.cells].astype(np.float64)
+    stats = create_basin_statistics()
+    if basin.weights is None:
+        stats['count'] = basin_values.size
+        if flat_snow is not None:
+            stats['snow_count'] = int(np.count_nonzero(flat_snow[basin.cells]))
+        for threshold in thresholds:
+            stats['threshold_snow_count'][threshold] = int(np.count_nonzero(basin_values > threshold))
+        if basin_values.size > 0:
+            mean = basin_values.mean()
+            # Population standard deviation, same as QgsZonalStatistics.
+            stats['stdev'] = float(np.sqrt(np.mean((basin_values - mean) ** 2)))
+    else:
+        # Weighted cells (small basin or geographic raster): count and sums are weighted.
+        weights = basin.weights
+        stats['count'] = float(weights.sum())
+        if flat_snow is not None:
+            stats['snow_count'] = float(weights[flat_snow[basin.cells]].sum())
+        for threshold in thresholds:
+            stats['threshold_snow_count'][threshold] = float(weights[basin_values > threshold].sum())
+        if stats['count'] > 0:
+            mean = np.sum(weights * basin_values) / stats['count']
+            stats['stdev'] = float(np.sqrt(np.sum(weights * (basin_values - mean) ** 2) / stats['count']))
+    if basin_values.size > 0 and stats['count'] > 0:
+        stats['mean'] = float(mean)
+        stats['min'] = float(basin_values.min())
+        stats['max'] = float(basin_values.max())
+    else:
+        stats['stdev'] = None
+    return stats
+
+
+def calculate_row_cell_areas(raster: RasterData) -> np.ndarray:
+    """
+    Calculate the area of the cells in each row of a geographic raster, on the ellipsoid.
+    The area of a cell between latitudes lat1 and lat2 with longitude width dlon (radians) is:
+      b^2 * dlon / 2 * (q(lat2) - q(lat1)),
+      where q(lat) = sin(lat) / (1 - e^2 sin^2(lat)) + ln((1 + e sin(lat)) / (1 - e sin(lat))) / (2e)
+    raster: raster data for a geographic grid that is not rotated
+    Returns: NumPy array of cell area (square meters) for each row
+    """
+    srs = get_spatial_reference(raster.projection)
+    semi_major = srs.GetSemiMajor()
+    semi_minor = srs.GetSemiMinor()
+    e = np.sqrt(1.0 - (semi_minor / semi_major) ** 2)
+
+    x_origin, cell_size_x, _, y_origin, _, cell_size_y = raster.geotransform
+    # Latitude of the row edges, from the top edge of the first row to the bottom edge of the last row.
+    edge_lat = np.radians(y_origin + cell_size_y * np.arange(raster.get_height() + 1))
+    sin_lat = np.sin(edge_lat)
+    q = sin_lat / (1.0 - (e * sin_lat) ** 2) + np.log((1.0 + e * sin_lat) / (1.0 - e * sin_lat)) / (2.0 * e)
+    return np.abs(semi_minor ** 2 * np.radians(cell_size_x) / 2.0 * np.diff(q))
+
+
+def calculate_sparse_basin_statistics(basin: BasinCells, flat_values: np.ndarray, nonzero_cells: np.ndarray,
+                                      thresholds: [float], snow_cover: bool = True) -> dict:
+    """
+    Calculate the statistics for a basin from only its nonzero cells, for a raster that is mostly zero.
+    The results are the same as calculate_dense_basin_statistics() because zero cells add nothing to the sums.
+    A basin that has no nonzero cells is not processed further because all of its statistics are zero.
+    basin: the basin cells that have data, which must be sorted
+    flat_values: the raster values, as a 1D array
+    nonzero_cells: sorted 1D array of flat indices of the cells that have data and are not zero
+    thresholds: list of SWE thresholds (mm), which must not be negative
+    snow_cover: whether to calculate the snow cover (SWE > 0)
+    Returns: dictionary of statistics (see the module documentation)
+    """
+    stats = create_basin_statistics()
+    for threshold in thresholds:
+        stats['threshold_snow_count'][threshold] = 0
+    if basin.cells.size == 0:
+        return stats
+    count = basin.cells.size if basin.weights is None else float(basin.weights.sum())
+    stats['count'] = count
+    if count <= 0:
+        return stats
+
+    # Find the nonzero cells in the range of the basin cells, then the nonzero cells that are in the basin.
+    start = np.searchsorted(nonzero_cells, basin.cells[0])
+    end = np.searchsorted(nonzero_cells, basin.cells[-1], side='right')
+    candidate_cells = nonzero_cells[start:end]
+    positions = np.minimum(np.searchsorted(basin.cells, candidate_cells), basin.cells.size - 1)
+    in_basin = basin.cells[positions] == candidate_cells
+    positions = positions[in_basin]
+
+    if positions.size == 0:
+        # No snow: constant statistics.
+        stats.update({'mean': 0.0, 'min': 0.0, 'max': 0.0, 'stdev': 0.0})
+        return stats
+
+    values = flat_values[candidate_cells[in_basin]].astype(np.float64)
+    weights = np.ones(values.size) if basin.weights is None else basin.weights[positions]
+    mean = np.sum(weights * values) / count
+    # Population variance from the sums, where the zero cells add (0 - mean)^2 each.
+    zero_weight = count - weights.sum()
+    variance = (np.sum(weights * (values - mean) ** 2) + zero_weight * mean ** 2) / count
+    stats['mean'] = float(mean)
+    stats['stdev'] = float(np.sqrt(max(variance, 0.0)))
+    has_zero = positions.size < basin.cells.size
+    stats['min'] = float(min(values.min(), 0.0)) if has_zero else float(values.min())
+    stats['max'] = float(max(values.max(), 0.0)) if has_zero else float(values.max())
+    if basin.weights is None:
+        if snow_cover:
+            stats['snow_count'] = int(np.count_nonzero(values > 0))
+        for threshold in thresholds:
+            stats['threshold_snow_count'][threshold] = int(np.count_nonzero(values > threshold))
+    else:
+        if snow_cover:
+            stats['snow_count'] = float(weights[values > 0].sum())
+        for threshold in thresholds:
+            stats['threshold_snow_count'][threshold] = float(weights[values > threshold].sum())
+    return stats
+
+
+def calculate_zonal_statistics(raster: RasterData, basin_cells: dict, snow_mask: np.ndarray or None,
+                               thresholds: [float] or None = None, sparse_fraction: float = 0.0) -> dict:
+    """
+    Calculate the zonal statistics for each basin.
+    If the fraction of cells with data that are not zero is at most 'sparse_fraction',
+    for example in the snow-free season, only the nonzero cells are processed.
+    raster: the SWE raster data
+    basin_cells: dictionary of basin feature ID and BasinCells for the cells that have data,
+        from get_valid_basin_cells() for the raster
+    snow_mask: 2D boolean array that is True for cells covered by snow, from create_snow_cover_mask(),
+        or None to not calculate the snow cover (for example, for the SNODAS products other than SWE)
+    thresholds: list of SWE thresholds (mm) for which to count cells with SWE > threshold, or None
+    sparse_fraction: maximum fraction of nonzero cells to use the sparse calculation, or 0 to not use it
+    Returns: dictionary with key of basin feature ID and value a dictionary of statistics
+        (see the module documentation), with None for statistics of basins that have no cells with data
+    """
+    logger = logging.getLogger(__name__)
+
+    flat_values = raster.values.ravel()
+    thresholds = thresholds or []
+
+    basin_stats = {}
+    if sparse_fraction > 0:
+        valid = raster.get_valid_mask().ravel()
+        valid_count = np.count_nonzero(valid)
+        nonzero_cells = np.flatnonzero(valid & (flat_values != 0))
+        if valid_count > 0 and (nonzero_cells.size / valid_count) <= sparse_fraction:
+            logger.info('  Using sparse zonal statistics ({:.1f}% of cells with data are not zero).'.format(
+                nonzero_cells.size / valid_count * 100))
+            for fid, basin in basin_cells.items():
+                basin_stats[fid] = calculate_sparse_basin_statistics(basin, flat_values, nonzero_cells, thresholds,
+                                                                     snow_mask is not None)
+            return basin_stats
+
+    flat_snow = snow_mask.ravel() if snow_mask is not None else None
+    for fid, basin in basin_cells.items():
+        basin_stats[fid] = calculate_dense_basin_statistics(basin, flat_values, flat_snow, thresholds)
+    return basin_stats
+
+
+def convert_snow_cover_tif(tif_file_path: Path, compression: str = 'DEFLATE', nbits: int = 1) -> bool:
+    """
+    Convert a snow cover GeoTIFF to the compact format written by write_snow_cover_tif(),
+    for example an older floating point GeoTIFF created with the QGIS raster calculator.
+    The file is converted to a temporary file and then replaces the original,
+    so the original is not damaged if the conversion fails.
+    tif_file_path: path to the snow cover GeoTIFF
+    compression: compression method, one of SNOW_COVER_COMPRESSIONS
+    nbits: number of bits per cell, 1 or 8
+    Returns: True if the file was converted, False if it was already in the requested format
+    """
+    if is_compact_snow_cover_tif(tif_file_path, compression, nbits):
+        return False
+
+    # Old files contain 1 for snow and 0 for no snow, so the SWE > 0 test also works for them.
+    raster = read_raster(tif_file_path)
+    temporary_file_path = tif_file_path.with_name(tif_file_path.stem + '.converting.tif')
+    try:
+        write_snow_cover_tif(create_snow_cover_mask(raster), raster, temporary_file_path, compression, nbits)
+        os.replace(temporary_file_path, tif_file_path)
+    finally:
+        if temporary_file_path.exists():
+            temporary_file_path.unlink()
+    return True
+
+
+def create_basin_statistics() -> dict:
+    """
+    Create the statistics dictionary for a basin, for a basin with no cells with data.
+    Returns: dictionary of statistics (see the module documentation)
+    """
+    return {
+        'count': 0,
+        'snow_count': 0,
+        'mean': None,
+        'min': None,
+        'max': None,
+        'stdev': None,
+        'threshold_snow_count': {}
+    }
+
+
+def create_snow_cover_mask(raster: RasterData) -> np.ndarray:
+    """
+    Create the snow cover mask from the SWE raster.
+    A cell is covered by snow if it has data and SWE > 0.
+    raster: the SWE raster data
+    Returns: 2D boolean array that is True for cells covered by snow
+    """
+    return raster.get_valid_mask() & (raster.values > 0)
+
+
+def get_basin_cells(boundaries_file_path: Path, raster: RasterData) -> dict:
+    """
+    Get the raster cells for each basin in the basin boundary shapefile, using cached values if available.
+    The shapefile must use the same projection as the raster.
+    boundaries_file_path: the basin boundary shapefile
+    raster: raster data defining the grid
+    Returns: dictionary with key of basin feature ID and value BasinCells
+    """
+    key = get_basin_cells_key(boundaries_file_path, raster)
+    with basin_cells_cache_lock:
+        basin_cells = basin_cells_cache.get(key)
+        if basin_cells is None:
+            basin_cells = rasterize_basin_cells(boundaries_file_path, raster)
+            basin_cells_cache[key] = basin_cells
+    return basin_cells
+
+
+def get_basin_cells_key(boundaries_file_path: Path, raster: RasterData) -> tuple:
+    """
+    Get the cache key for the basin cells.
+    The key changes if the shapefile geometry is modified or the raster grid is different.
+    Only the '.shp' file is checked, so that editing attributes (the '.dbf' file) does not change the key.
+    """
+    stat = Path(boundaries_file_path).stat()
+    return (str(Path(boundaries_file_path).resolve()), stat.st_mtime_ns, stat.st_size,
+            raster.geotransform, raster.get_width(), raster.get_height(), raster.projection)
+
+
+def get_spatial_reference(projection: str):
+    """
+    Get the spatial reference for a projection, using traditional (x=longitude, y=latitude) axis order.
+    projection: projection as WKT
+    Returns: osr.SpatialReference
+    """
+    srs = osr.SpatialReference(wkt=projection)
+    srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    return srs
+
+
+def get_valid_basin_cells(boundaries_file_path: Path, raster: RasterData, cache_folder: Path or None = None,
+                          reference_cell_area: float or None = None) -> dict:
+    """
+    Get the raster cells that have data for each basin in the basin boundary shapefile.
+    The cells are cached for each version of the valid-cell mask,
+    so they are only determined again if the nodata pattern of the raster changes.
+    For a geographic raster, the cells are weighted by the cell area divided by the reference cell area.
+    boundaries_file_path: the basin boundary shapefile
+    raster: the SWE raster data
+    cache_folder: folder in which to save the valid basin cells for later runs, or None to only cache in memory
+    reference_cell_area: area (square meters) of a reference cell for a geographic raster,
+        for example the projected cell size, required if the raster is geographic
+    Returns: dictionary with key of basin feature ID and value BasinCells for the cells that have data
+    """
+    logger = logging.getLogger(__name__)
+
+    valid = raster.get_valid_mask()
+    row_cell_areas = None
+    if is_geographic_raster(raster):
+        if not reference_cell_area:
+            raise ValueError('Reference cell area is required for a geographic raster.')
+        row_cell_areas = calculate_row_cell_areas(raster)
+    else:
+        reference_cell_area = None
+    basin_cells_key = get_basin_cells_key(boundaries_file_path, raster) + (reference_cell_area,)
+    mask_hash = get_valid_mask_hash(valid)
+    key = (basin_cells_key, mask_hash)
+    with basin_cells_cache_lock:
+        valid_basin_cells = valid_basin_cells_cache.get(key)
+    if valid_basin_cells is not None:
+        return valid_basin_cells
+
+    cache_file_path = None
+    if cache_folder is not None:
+        # The file name uses the hash of the basin cells key so that different shapefiles and grids are separate.
+        basin_cells_hash = hashlib.sha256(repr(basin_cells_key).encode('utf-8')).hexdigest()
+        cache_file_path = Path(cache_folder) / 'ValidBasinCells_{}_{}.npz'.format(basin_cells_hash[:16],
+                                                                                  mask_hash[:16])
+    if cache_file_path is not None and cache_file_path.exists():
+        valid_basin_cells = read_valid_basin_cells(cache_file_path)
+    else:
+        logger.info('  New valid-cell mask version {} ({} cells with data), determining effective basin cells.'.format(
+            mask_hash[:16], np.count_nonzero(valid)))
+        flat_valid = valid.ravel()
+        valid_basin_cells = {}
+        for fid, basin in get_basin_cells(boundaries_file_path, raster).items():
+            basin_valid = flat_valid[basin.cells]
+            cells = basin.cells[basin_valid]
+            weights = None if basin.weights is None else basin.weights[basin_valid]
+            if row_cell_areas is not None:
+                # Weight by the area of the cell, which depends on the row.
+                area_weights = row_cell_areas[cells // raster.get_width()] / reference_cell_area
+                weights = area_weights if weights is None else weights * area_weights
+            valid_basin_cells[fid] = BasinCells(cells, weights)
+        if cache_file_path is not None:
+            write_valid_basin_cells(valid_basin_cells, cache_file_path)
+
+    with basin_cells_cache_lock:
+        valid_basin_cells_cache[key] = valid_basin_cells
+    return valid_basin_cells
+
+
+def get_valid_mask_hash(valid: np.ndarray) -> str:
+    """
+    Get the hash of a valid-cell mask, used as the version of the mask.
+    The mask is packed to bits before hashing, so hashing is fast.
+    valid: 2D boolean array that is True for cells that have data
+    Returns: hexadecimal SHA-256 hash of the mask and its shape
+    """
+    mask_hash = hashlib.sha256('{}x{}'.format(*valid.shape).encode('utf-8'))
+    mask_hash.update(np.packbits(valid).tobytes())
+    return mask_hash.hexdigest()
+
+
+def is_compact_snow_cover_tif(tif_file_path: Path, compression: str = 'DEFLATE', nbits: int = 1) -> bool:
+    """
+    Determine whether a snow cover GeoTIFF is already in the compact format written by write_snow_cover_tif().
+    tif_file_path: path to the snow cover GeoTIFF
+    compression: compression method, one of SNOW_COVER_COMPRESSIONS
+    nbits: number of bits per cell, 1 or 8
+    Returns: True if the GeoTIFF uses the Byte data type, the number of bits, and the compression
+    """
+    ds = gdal.Open(str(tif_file_path))
+    if ds is None:
+        raise RuntimeError('Unable to open raster: {}'.format(tif_file_path))
+    band = ds.GetRasterBand(1)
+    file_nbits = band.GetMetadataItem('NBITS', 'IMAGE_STRUCTURE') or '8'
+    file_compression = ds.GetMetadataItem('COMPRESSION', 'IMAGE_STRUCTURE') or 'NONE'
+    is_compact = (band.DataType == gdal.GDT_Byte) and (int(file_nbits) == nbits) and \
+        (file_compression.upper() == compression.upper())
+    ds = None
+    return is_compact
+
+
+def is_geographic_raster(raster: RasterData) -> bool:
+    """
+    Determine whether a raster uses a geographic (longitude and latitude) coordinate system.
+    raster: raster data
+    Returns: True if the raster is geographic
+    """
+    return bool(raster.projection) and bool(get_spatial_reference(raster.projection).IsGeographic())
+
+
+def rasterize_basin_cells(boundaries_file_path: Path, raster: RasterData) -> dict:
+    """
+    Determine the raster cells for each basin by rasterizing each basin polygon onto the raster grid.
+    Each polygon is rasterized within its bounding box to limit the work for small basins.
+    If the shapefile projection is different from the raster projection,
+    for example Albers basins and a geographic SNODAS grid, the polygons are projected to the raster projection.
+    boundaries_file_path: the basin boundary shapefile
+    raster: raster data defining the grid
+    Returns: dictionary with key of basin feature ID and value BasinCells
+    """
+    logger = logging.getLogger(__name__)
+
+    logger.info('  Determining basin cells for: {}'.format(boundaries_file_path))
+    x_origin, cell_size_x, _, y_origin, _, cell_size_y = raster.geotransform
+    width = raster.get_width()
+    height = raster.get_height()
+
+    # Read the basin polygons, projected to the raster projection if necessary.
+    data_source = ogr.Open(str(boundaries_file_path))
+    layer = data_source.GetLayer()
+    transform = None
+    layer_srs = layer.GetSpatialRef()
+    raster_srs = get_spatial_reference(raster.projection)
+    if layer_srs is not None and raster.projection and not layer_srs.IsSame(raster_srs):
+        layer_srs = layer_srs.Clone()
+        layer_srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+        transform = osr.CoordinateTransformation(layer_srs, raster_srs)
+    geometries = {}
+    for feature in layer:
+        geometry = feature.GetGeometryRef()
+        if geometry is not None:
+            geometry = geometry.Clone()
+            if transform is not None:
+                geometry.Transform(transform)
+        geometries[feature.GetFID()] = geometry
+    data_source = None
+
+    basin_cells = {}
+    for fid, geometry in geometries.items():
+        basin_cells[fid] = BasinCells(np.empty(0, dtype=np.int64))
+        if geometry is None:
+            continue
+
+        # Determine the window of cells that contains the polygon (cell_size_y is negative).
+        min_x, max_x, min_y, max_y = geometry.GetEnvelope()
+        column_start = max(0, int(np.floor((min_x - x_origin) / cell_size_x)))
+        column_end = min(width, int(np.ceil((max_x - x_origin) / cell_size_x)))
+        row_start = max(0, int(np.floor((max_y - y_origin) / cell_size_y)))
+        row_end = min(height, int(np.ceil((min_y - y_origin) / cell_size_y)))
+        if column_end <= column_start or row_end <= row_start:
+            # The basin is outside the raster.
+            continue
+        window_geotransform = (x_origin + column_start * cell_size_x, cell_size_x, 0,
+                               y_origin + row_start * cell_size_y, 0, cell_size_y)
+
+        # Rasterize the polygon into an in-memory raster for the window, using cell centers.
+        rows, columns = rasterize_window(geometry, window_geotransform, column_end - column_start,
+                                         row_end - row_start, raster_srs, [])
+        weights = None
+        if rows.size == 0:
+            # Small basin that does not contain any cell centers:
+            # - use all cells that the polygon touches, weighted by the fraction of the cell inside the polygon
+            rows, columns = rasterize_window(geometry, window_geotransform, column_end - column_start,
+                                             row_end - row_start, raster_srs, ['ALL_TOUCHED=TRUE'])
+            cell_area = abs(cell_size_x * cell_size_y)
+            weights = np.empty(rows.size, dtype=np.float64)
+            for i, (row, column) in enumerate(zip(rows, columns)):
+                cell_x = window_geotransform[0] + column * cell_size_x
+                cell_y = window_geotransform[3] + row * cell_size_y
+                cell_ring = ogr.Geometry(ogr.wkbLinearRing)
+                for x, y in ((cell_x, cell_y), (cell_x + cell_size_x, cell_y),
+                             (cell_x + cell_size_x, cell_y + cell_size_y), (cell_x, cell_y + cell_size_y),
+                             (cell_x, cell_y)):
+                    cell_ring.AddPoint_2D(x, y)
+                cell_polygon = ogr.Geometry(ogr.wkbPolygon)
+                cell_polygon.AddGeometry(cell_ring)
+                weights[i] = geometry.Intersection(cell_polygon).GetArea() / cell_area
+
+        # Convert the window cells to flat indices for the full raster.
+        basin_cells[fid] = BasinCells(((rows + row_start) * width + (columns + column_start)).astype(np.int64),
+                                      weights)
+
+    return basin_cells
+
+
+def rasterize_window(geometry, geotransform: tuple, width: int, height: int, srs,
+                     options: [str]) -> (np.ndarray, np.ndarray):
+    """
+    Rasterize a polygon into an in-memory raster.
+    geometry: OGR polygon geometry, in the raster projection
+    geotransform: GDAL geotransform for the raster
+    width: raster width (columns)
+    height: raster height (rows)
+    srs: raster projection as osr.SpatialReference
+    options: options for gdal.RasterizeLayer, for example ['ALL_TOUCHED=TRUE']
+    Returns: tuple of NumPy arrays of the rows and columns of the rasterized cells
+    """
+    # Put the polygon in an in-memory layer for gdal.RasterizeLayer.
+    vector_ds = ogr.GetDriverByName('Memory').CreateDataSource('')
+    layer = vector_ds.CreateLayer('basin', srs, ogr.wkbPolygon)
+    feature = ogr.Feature(layer.GetLayerDefn())
+    feature.SetGeometry(geometry)
+    layer.CreateFeature(feature)
+
+    ds = gdal.GetDriverByName('MEM').Create('', width, height, 1, gdal.GDT_Byte)
+    ds.SetGeoTransform(geotransform)
+    ds.SetProjection(srs.ExportToWkt())
+    gdal.RasterizeLayer(ds, [1], layer, burn_values=[1], options=options)
+    mask = ds.GetRasterBand(1).ReadAsArray().astype(bool)
+    ds = None
+    vector_ds = None
+    return np.nonzero(mask)
+
+
+def read_raster(tif_file_path: Path) -> RasterData:
+    """
+    Read the first band of a raster into memory.
+    tif_file_path: path to the raster file
+    Returns: RasterData for the raster
+    """
+    ds = gdal.Open(str(tif_file_path))
+    if ds is None:
+        raise RuntimeError('Unable to open raster: {}'.format(tif_file_path))
+    band = ds.GetRasterBand(1)
+    raster = RasterData(band.ReadAsArray(), band.GetNoDataValue(), ds.GetGeoTransform(), ds.GetProjection())
+    ds = None
+    return raster
+
+
+def read_valid_basin_cells(cache_file_path: Path) -> dict:
+    """
+    Read the valid basin cells saved by write_valid_basin_cells().
+    cache_file_path: path to the '.npz' file
+    Returns: dictionary with key of basin feature ID and value BasinCells
+    """
+    valid_basin_cells = {}
+    # Read each array once, because each access to an array in the file reads and decompresses the whole array.
+    with np.load(str(cache_file_path)) as data:
+        fids = data['fids']
+        offsets = data['offsets']
+        cells = data['cells']
+        weights = data['weights']
+        weighted = data['weighted']
+    for i, fid in enumerate(fids):
+        start, end = offsets[i], offsets[i + 1]
+        valid_basin_cells[int(fid)] = BasinCells(cells[start:end], weights[start:end] if weighted[i] else None)
+    return valid_basin_cells
+
+
+def write_snow_cover_tif(snow_mask: np.ndarray, raster: RasterData, tif_file_path: Path,
+                         compression: str = 'DEFLATE', nbits: int = 1) -> None:
+    """
+    Write the snow cover mask as a GeoTIFF with values 1 (snow) and 0 (no snow).
+    Cells that have no SWE data are nodata:
+      - for nbits = 1, using an internal mask band because a 1-bit cell cannot hold a nodata value
+      - for nbits = 8, using the nodata value SNOW_COVER_BYTE_NODATA
+    snow_mask: 2D boolean array that is True for cells covered by snow
+    raster: the SWE raster data, used for the grid and the nodata cells
+    tif_file_path: path to the output GeoTIFF
+    compression: compression method, one of SNOW_COVER_COMPRESSIONS
+    nbits: number of bits per cell, 1 or 8
+    """
+    compression = compression.upper()
+    if compression not in SNOW_COVER_COMPRESSIONS:
+        raise ValueError('Snow cover compression must be one of {} (compression={}).'.format(
+            ', '.join(SNOW_COVER_COMPRESSIONS), compression))
+    if nbits not in (1, 8):
+        raise ValueError('Snow cover bits must be 1 or 8 (nbits={}).'.format(nbits))
+
+    options = []
+    if compression != 'NONE':
+        options.append('COMPRESS=' + compression)
+    if nbits == 1:
+        options.append('NBITS=1')
+
+    valid = raster.get_valid_mask()
+    values = snow_mask.astype(np.uint8)
+    ds = gdal.GetDriverByName('GTiff').Create(str(tif_file_path), raster.get_width(), raster.get_height(), 1,
+                                              gdal.GDT_Byte, options)
+    ds.SetGeoTransform(raster.geotransform)
+    ds.SetProjection(raster.projection)
+    band = ds.GetRasterBand(1)
+    if nbits == 1:
+        # Store the mask in the GeoTIFF rather than a separate .msk file.
+        gdal.SetThreadLocalConfigOption('GDAL_TIFF_INTERNAL_MASK', 'YES')
+        try:
+            ds.CreateMaskBand(gdal.GMF_PER_DATASET)
+        finally:
+            gdal.SetThreadLocalConfigOption('GDAL_TIFF_INTERNAL_MASK', None)
+        band.GetMaskBand().WriteArray(valid.astype(np.uint8) * 255)
+    else:
+        values[~valid] = SNOW_COVER_BYTE_NODATA
+        band.SetNoDataValue(SNOW_COVER_BYTE_NODATA)
+    band.WriteArray(values)
+    ds.FlushCache()
+    ds = None
+
+
+def write_valid_basin_cells(valid_basin_cells: dict, cache_file_path: Path) -> None:
+    """
+    Save the valid basin cells to a NumPy '.npz' file, with the cells of all basins concatenated.
+    The file is written to a temporary file and then renamed so that a partial file is never read.
+    valid_basin_cells: dictionary with key of basin feature ID and value BasinCells
+    cache_file_path: path to the '.npz' file
+    """
+    fids = list(valid_basin_cells.keys())
+    offsets = np.zeros(len(fids) + 1, dtype=np.int64)
+    for i, fid in enumerate(fids):
+        offsets[i + 1] = offsets[i] + valid_basin_cells[fid].cells.size
+    cells = np.concatenate([valid_basin_cells[fid].cells for fid in fids] + [np.empty(0, dtype=np.int64)])
+    weights = np.concatenate(
+        [np.ones(valid_basin_cells[fid].cells.size) if valid_basin_cells[fid].weights is None
+         else valid_basin_cells[fid].weights for fid in fids] + [np.empty(0)])
+    weighted = np.array([valid_basin_cells[fid].weights is not None for fid in fids], dtype=bool)
+
+    cache_file_path.parent.mkdir(parents=True, exist_ok=True)
+    # The temporary file name is unique so that processes and threads that write the same file do not conflict.
+    temporary_file_path = cache_file_path.with_name('{}.{}.{}.writing.npz'.format(
+        cache_file_path.stem, os.getpid(), threading.get_ident()))
+    np.savez(str(temporary_file_path), fids=np.array(fids, dtype=np.int64), offsets=offsets, cells=cells,
+             weights=weights, weighted=weighted)
+    os.replace(temporary_file_path, cache_file_path)
@@ -0,0 +1,16 @@
+"""
+Configuration for the tests, which are run from the repository root folder with:
+
+  python -m pytest tests
+
+The 'src' folder is added to the module search path so that 'snodastools' can be imported without installing it.
+Tests for modules that require QGIS or GDAL are skipped if those packages are not available.
+"""
+
+import sys
+
+from pathlib import Path
+
+SRC_FOLDER = Path(__file__).resolve().parent.parent / 'src'
+if str(SRC_FOLDER) not in sys.path:
+    sys.path.insert(0, str(SRC_FOLDER))
@@ -0,0 +1,86 @@
+"""
+Tests for compress_util.
+"""
+
+import threading
+import zipfile
+
+import pytest
+
+import snodastools.util.compress_util as compress_util
+
+
+def read_zip(zip_file_path) -> dict:
+    """
+    Read the contents of a zip file as a dictionary of name to text.
+    """
+    with zipfile.ZipFile(str(zip_file_path), 'r') as zip_file:
+        return {name: zip_file.read(name).decode('utf-8') for name in zip_file.namelist()}
+
+
+def test_get_zip_compression_type():
+    assert compress_util.get_zip_compression_type('deflate') == zipfile.ZIP_DEFLATED
+    with pytest.raises(ValueError):
+        compress_util.get_zip_compression_type('zstd')
+
+
+@pytest.mark.parametrize('workers', [0, 2])
+def test_submit_zip(tmp_path, workers):
+    delete_folder = tmp_path / 'zip'
+    delete_folder.mkdir()
+    (delete_folder / 'a.txt').write_text('a')
+    zip_file_path = tmp_path / 'a.zip'
+    done = []
+
+    compression_pool = compress_util.CompressionPool(workers)
+    compression_pool.submit_zip(zip_file_path, [(delete_folder / 'a.txt', 'a.txt')], delete_folder,
+                                lambda: done.append(zip_file_path))
+    assert compression_pool.wait() == 0
+    compression_pool.shutdown()
+
+    assert read_zip(zip_file_path) == {'a.txt': 'a'}
+    assert done == [zip_file_path]
+    assert not delete_folder.exists()
+    assert [path.name for path in tmp_path.iterdir()] == ['a.zip']
+
+
+def test_submit_zip_keeps_newest_submission(monkeypatch, tmp_path):
+    # The first submission is not written until the second submission has been published,
+    # so the tasks finish in the opposite order to which they were submitted.
+    newest_published = threading.Event()
+    write_zip = compress_util.write_zip
+
+    def delayed_write_zip(zip_file_path, files, codec='DEFLATE', level=None):
+        if files[0][0].read_text() == 'old':
+            assert newest_published.wait(10)
+        return write_zip(zip_file_path, files, codec, level)
+
+    monkeypatch.setattr(compress_util, 'write_zip', delayed_write_zip)
+    zip_file_path = tmp_path / 'SnowpackStatisticsByDate_LatestDate.zip'
+    done = []
+    compression_pool = compress_util.CompressionPool(2)
+    for text in ['old', 'new']:
+        delete_folder = tmp_path / text
+        delete_folder.mkdir()
+        (delete_folder / 'a.txt').write_text(text)
+
+        def done_function(text=text):
+            done.append(text)
+            newest_published.set()
+
+        compression_pool.submit_zip(zip_file_path, [(delete_folder / 'a.txt', 'a.txt')], delete_folder, done_function)
+    assert compression_pool.wait() == 0
+    compression_pool.shutdown()
+
+    assert read_zip(zip_file_path) == {'a.txt': 'new'}
+    # The older zip file is not published, so its done function is not called.
+    assert done == ['new']
+    assert [path.name for path in tmp_path.iterdir()] == [zip_file_path.name]
+
+
+def test_wait_counts_errors(tmp_path):
+    compression_pool = compress_util.CompressionPool(1)
+    compression_pool.submit_zip(tmp_path / 'a.zip', [(tmp_path / 'missing.txt', 'missing.txt')])
+    assert compression_pool.wait() == 1
+    compression_pool.shutdown()
+    assert list(tmp_path.iterdir()) == []
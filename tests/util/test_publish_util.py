@@ -0,0 +1,77 @@
+"""
+Tests for publish_util.
+"""
+
+import json
+import os
+
+import snodastools.util.publish_util as publish_util
+
+
+def test_create_staging_folder(tmp_path):
+    folder = tmp_path / 'results'
+    folder.mkdir()
+    staging_folder = publish_util.create_staging_folder(folder)
+    assert staging_folder.is_dir()
+    # The staging folder is next to the folder and is hidden.
+    assert staging_folder.parent == tmp_path
+    assert staging_folder.name.startswith('.results-staging-')
+
+
+def test_publish_folder(tmp_path):
+    folder = tmp_path / 'results'
+    folder.mkdir()
+    (folder / 'a.csv').write_text('old a')
+    (folder / 'c.csv').write_text('old c')
+    staging_folder = publish_util.create_staging_folder(folder)
+    (staging_folder / 'a.csv').write_text('new a')
+    (staging_folder / 'b.csv').write_text('new b')
+
+    published_file_paths = publish_util.publish_folder(staging_folder, folder)
+
+    assert published_file_paths == [folder / 'a.csv', folder / 'b.csv']
+    assert (folder / 'a.csv').read_text() == 'new a'
+    assert (folder / 'b.csv').read_text() == 'new b'
+    # Files that are not staged are not changed.
+    assert (folder / 'c.csv').read_text() == 'old c'
+    assert not staging_folder.exists()
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['results']
+
+
+def test_link_file(tmp_path):
+    src_file_path = tmp_path / 'SnowpackStatisticsByDate_20230101.csv'
+    src_file_path.write_text('new')
+    dst_file_path = tmp_path / 'SnowpackStatisticsByDate_LatestDate.csv'
+    dst_file_path.write_text('old')
+
+    publish_util.link_file(src_file_path, dst_file_path)
+
+    assert dst_file_path.read_text() == 'new'
+    assert os.path.samefile(str(src_file_path), str(dst_file_path))
+    assert sorted(path.name for path in tmp_path.iterdir()) == [src_file_path.name, dst_file_path.name]
+
+
+def test_link_file_copies_if_link_fails(monkeypatch, tmp_path):
+    def link(src, dst):
+        raise OSError('Hard links are not supported.')
+
+    monkeypatch.setattr(os, 'link', link)
+    src_file_path = tmp_path / 'SnowpackStatisticsByDate_20230101.csv'
+    src_file_path.write_text('new')
+    dst_file_path = tmp_path / 'SnowpackStatisticsByDate_LatestDate.csv'
+    dst_file_path.write_text('old')
+
+    publish_util.link_file(src_file_path, dst_file_path)
+
+    assert dst_file_path.read_text() == 'new'
+    assert not os.path.samefile(str(src_file_path), str(dst_file_path))
+    assert sorted(path.name for path in tmp_path.iterdir()) == [src_file_path.name, dst_file_path.name]
+
+
+def test_write_json(tmp_path):
+    file_path = tmp_path / 'manifest.json'
+    file_path.write_text('{}')
+    publish_util.write_json(file_path, {'latestDate': '20230101'})
+    with open(file_path, 'r', encoding='utf-8') as json_file:
+        assert json.load(json_file) == {'latestDate': '20230101'}
+    assert [path.name for path in tmp_path.iterdir()] == ['manifest.json']
@@ -0,0 +1,129 @@
+"""
+Tests for retry_util.
+"""
+
+import ftplib
+import gzip
+import socket
+import tarfile
+import zlib
+
+import pytest
+
+import snodastools.util.retry_util as retry_util
+import snodastools.util.transport_util as transport_util
+
+# Retry policy without waits.
+NO_WAIT_POLICY = retry_util.RetryPolicy(retries=3, wait_seconds=0, max_wait_seconds=0, deadline_seconds=60)
+
+
+def open_circuit_breaker() -> retry_util.CircuitBreaker:
+    """
+    Create a circuit breaker that is open and allows a trial request immediately.
+    """
+    circuit_breaker = retry_util.CircuitBreaker(failure_threshold=2, reset_seconds=0)
+    circuit_breaker.record_failure()
+    circuit_breaker.record_failure()
+    return circuit_breaker
+
+
+def test_circuit_breaker_opens_after_threshold():
+    circuit_breaker = retry_util.CircuitBreaker(failure_threshold=2, reset_seconds=60)
+    assert circuit_breaker.check() is False
+    circuit_breaker.record_failure()
+    assert circuit_breaker.check() is False
+    circuit_breaker.record_failure()
+    with pytest.raises(retry_util.CircuitOpenError) as exc_info:
+        circuit_breaker.check()
+    assert not exc_info.value.trial_in_progress
+
+
+def test_circuit_breaker_allows_one_trial_request():
+    circuit_breaker = open_circuit_breaker()
+    assert circuit_breaker.check() is True
+    # Other requests fail while the trial request is in progress.
+    with pytest.raises(retry_util.CircuitOpenError) as exc_info:
+        circuit_breaker.check()
+    assert exc_info.value.trial_in_progress
+    circuit_breaker.record_success()
+    assert circuit_breaker.check() is False
+
+
+def test_circuit_breaker_trial_failure_opens_circuit():
+    circuit_breaker = open_circuit_breaker()
+    assert circuit_breaker.check() is True
+    circuit_breaker.record_failure()
+    assert not circuit_breaker.trial_in_progress
+    assert circuit_breaker.open_time is not None
+    # The reset time is 0, so another trial is allowed.
+    assert circuit_breaker.check() is True
+
+
+def test_circuit_breaker_cancel_trial_allows_another_trial():
+    circuit_breaker = open_circuit_breaker()
+    assert circuit_breaker.check() is True
+    circuit_breaker.cancel_trial()
+    assert circuit_breaker.check() is True
+
+
+def test_call_with_retries_trial_fatal_error_cancels_trial():
+    circuit_breaker = open_circuit_breaker()
+
+    def fail():
+        raise ValueError('local error')
+
+    with pytest.raises(ValueError):
+        retry_util.call_with_retries(fail, NO_WAIT_POLICY, circuit_breaker)
+    assert not circuit_breaker.trial_in_progress
+    assert circuit_breaker.open_time is not None
+
+
+def test_call_with_retries_trial_transient_error_is_not_retried():
+    circuit_breaker = open_circuit_breaker()
+    calls = []
+
+    def fail():
+        calls.append(1)
+        raise socket.timeout('timed out')
+
+    with pytest.raises(retry_util.RetriesExhaustedError):
+        retry_util.call_with_retries(fail, NO_WAIT_POLICY, circuit_breaker)
+    assert len(calls) == 1
+    assert not circuit_breaker.trial_in_progress
+
+
+def test_call_with_retries_retries_transient_errors():
+    calls = []
+
+    def fail_twice():
+        calls.append(1)
+        if len(calls) < 3:
+            raise ConnectionResetError('reset')
+        return 'done'
+
+    assert retry_util.call_with_retries(fail_twice, NO_WAIT_POLICY) == ('done', 2)
+
+
+@pytest.mark.parametrize('error', [
+    tarfile.ReadError('unexpected end of data'),
+    zlib.error('Error -3 while decompressing data'),
+    gzip.BadGzipFile('Not a gzipped file'),
+    EOFError('Compressed file ended before the end-of-stream marker was reached')
+])
+def test_classify_truncated_transfer_is_transient(error):
+    assert retry_util.classify_error(transport_util.TruncatedTransferError('SNODAS_20230424.tar', error)) == \
+        retry_util.TRANSIENT
+
+
+@pytest.mark.parametrize('error, classification', [
+    (tarfile.ReadError('unexpected end of data'), retry_util.FATAL),
+    (ftplib.error_perm('550 No such file'), retry_util.MISSING),
+    (ftplib.error_perm('530 Not logged in'), retry_util.FATAL),
+    (ftplib.error_temp('421 Too many connections'), retry_util.TRANSIENT),
+    (transport_util.HttpStatusError(404, 'Not Found', 'https://host/file'), retry_util.MISSING),
+    (transport_util.HttpStatusError(503, 'Service Unavailable', 'https://host/file'), retry_util.TRANSIENT),
+    (transport_util.HttpStatusError(403, 'Forbidden', 'https://host/file'), retry_util.FATAL),
+    (FileNotFoundError(2, 'No such file'), retry_util.FATAL)
+])
+def test_classify_error(error, classification):
+    assert retry_util.classify_error(error) == classification
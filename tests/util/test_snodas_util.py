@@ -0,0 +1,174 @@
+"""
+Tests for snodas_util, which are skipped if QGIS and GDAL are not available.
+"""
+
+import gzip
+import os
+import threading
+import time
+import types
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip('qgis.core')
+pytest.importorskip('osgeo.gdal')
+
+import snodastools.util.basin_util as basin_util  # noqa: E402
+import snodastools.util.snodas_util as snodas_util  # noqa: E402
+
+BASIN_IDS = ('BASIN1', 'BASIN2', 'BASIN3')
+DATE_STRS = ['202304{:02d}'.format(day) for day in range(18, 25)]
+
+
+@pytest.fixture
+def configured_snodas_util(monkeypatch, tmp_path):
+    """
+    Configure snodas_util without a configuration file, with the basins for BASIN_IDS,
+    and run the tests in an empty working folder so that files written to the working folder can be detected.
+    """
+    monkeypatch.setattr(snodas_util, 'init_snodas_util', lambda: None)
+    for name, value in [('ID_FIELD_NAME', 'LOCAL_ID'), ('CALCULATE_SWE_MAX', 'False'),
+                        ('CALCULATE_SWE_MIN', 'False'), ('CALCULATE_SWE_STD_DEV', 'False'),
+                        ('SNOW_COVER_THRESHOLDS_MM', []), ('SNODAS_PRODUCT_CODES', ['1034'])]:
+        monkeypatch.setattr(snodas_util, name, value, raising=False)
+    basins = types.SimpleNamespace(ids=BASIN_IDS)
+    monkeypatch.setattr(basin_util, 'get_basins', lambda shp_file_path, id_field_name: basins)
+    working_folder = tmp_path / 'working'
+    working_folder.mkdir()
+    monkeypatch.chdir(working_folder)
+    return working_folder
+
+
+def process_date(date_str: str, date_folder, boundaries_file_path, csv_by_date_folder, csv_by_basin_folder) -> None:
+    """
+    Run the processing stages that do not need GDAL or QGIS layers for a date, using only the date's folder.
+    """
+    gz_file_path = date_folder / 'us_ssmv11034tS__T0001TTNATS{}05HP001.dat.gz'.format(date_str)
+    with gzip.open(str(gz_file_path), 'wb') as gz_file:
+        gz_file.write(date_str.encode('utf-8') * 1000)
+    snodas_util.extract_snodas_gz_file(gz_file_path)
+
+    tif_file_path = date_folder / 'SNODAS_SWE_ClipAndProj_{}.tif'.format(date_str)
+    snodas_util.create_empty_csv_files(tif_file_path, boundaries_file_path, csv_by_date_folder, csv_by_basin_folder)
+    snodas_util.delete_by_basin_csv_rows_for_date(tif_file_path, boundaries_file_path, csv_by_basin_folder)
+
+
+def test_process_dates_in_threads(configured_snodas_util, tmp_path):
+    working_folder = configured_snodas_util
+    boundaries_file_path = tmp_path / 'boundaries.shp'
+    csv_by_date_folder = tmp_path / 'SnowpackStatisticsByDate'
+    csv_by_basin_folder = tmp_path / 'SnowpackStatisticsByBasin'
+    csv_by_date_folder.mkdir()
+    csv_by_basin_folder.mkdir()
+
+    # By basin files with rows for every date, which are removed as each date is processed again.
+    header = 'Date_YYYYMMDD,LOCAL_ID\n'
+    for basin_id in BASIN_IDS:
+        (csv_by_basin_folder / 'SnowpackStatisticsByBasin_{}.csv'.format(basin_id)).write_text(
+            header + ''.join('{},{}\n'.format(date_str, basin_id) for date_str in DATE_STRS))
+
+    date_folders = {}
+    for date_str in DATE_STRS:
+        date_folders[date_str] = tmp_path / date_str
+        date_folders[date_str].mkdir()
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(process_date, date_str, date_folders[date_str], boundaries_file_path,
+                                   csv_by_date_folder, csv_by_basin_folder)
+                   for date_str in DATE_STRS]
+        for future in futures:
+            future.result()
+
+    # The working folder is not changed or used.
+    assert os.getcwd() == str(working_folder)
+    assert list(working_folder.iterdir()) == []
+
+    # Each date's extracted file is in its own folder, with its own data.
+    for date_str, date_folder in date_folders.items():
+        assert [path.name for path in date_folder.iterdir()] == \
+            ['us_ssmv11034tS__T0001TTNATS{}05HP001.dat'.format(date_str)]
+        assert (date_folder / 'us_ssmv11034tS__T0001TTNATS{}05HP001.dat'.format(date_str)).read_bytes() == \
+            date_str.encode('utf-8') * 1000
+
+    # A by date file was created for each date.
+    assert sorted(path.name for path in csv_by_date_folder.iterdir()) == \
+        ['SnowpackStatisticsByDate_{}.csv'.format(date_str) for date_str in DATE_STRS]
+
+    # The rows for all dates were removed from the by basin files, without losing or mixing up files.
+    assert sorted(path.name for path in csv_by_basin_folder.iterdir()) == \
+        ['SnowpackStatisticsByBasin_{}.csv'.format(basin_id) for basin_id in BASIN_IDS]
+    for basin_id in BASIN_IDS:
+        assert (csv_by_basin_folder / 'SnowpackStatisticsByBasin_{}.csv'.format(basin_id)).read_text() == header
+
+
+def test_calculate_one_week_change():
+    assert snodas_util.calculate_one_week_change([], []) == []
+    # The change is the volume minus the volume 7 days earlier, rounded to an integer.
+    assert snodas_util.calculate_one_week_change(['20230101', '20230108', '20230115'], ['100', '150.4', '120.6']) == \
+        ['NULL', '50', '-30']
+
+
+def test_calculate_one_week_change_dates_out_of_order():
+    date_strs = ['20230115', '20230101', '20230109', '20230108', '20230102']
+    volume_strs = ['30', '10', '25', '20', '11']
+    # The results are in the same order as the input.
+    assert snodas_util.calculate_one_week_change(date_strs, volume_strs) == ['10', 'NULL', '14', '10', 'NULL']
+
+
+def test_calculate_one_week_change_missing_values():
+    # - 20230108 has no date 7 days earlier
+    # - 20230110 has a NULL volume 7 days earlier
+    # - 20230111 has a blank volume 7 days earlier
+    # - 20230112 has a NULL volume
+    # - an invalid date has no change and is not used as a week-ago date
+    date_strs = ['20230108', '20230103', '20230110', '20230104', '20230111', '20230105', '20230112', 'bad']
+    volume_strs = ['10', 'NULL', '12', '', '9', '5', 'NULL', '1']
+    assert snodas_util.calculate_one_week_change(date_strs, volume_strs) == ['NULL'] * len(date_strs)
+
+
+def test_calculate_one_week_change_rounding():
+    date_strs = ['20230101', '20230108', '20230102', '20230109', '20230103', '20230110']
+    volume_strs = ['5', '7.6', '5', '7.4', '10.2', '5']
+    assert snodas_util.calculate_one_week_change(date_strs, volume_strs) == ['NULL', '3', 'NULL', '2', 'NULL', '-5']
+
+
+def test_write_output_branches():
+    written = []
+    branch_seconds = snodas_util.write_output_branches(
+        {'csv': lambda: written.append('csv'), 'geojson': lambda: written.append('geojson')},
+        {'shapefile': lambda: written.append('shapefile')})
+    assert sorted(written) == ['csv', 'geojson', 'shapefile']
+    assert sorted(branch_seconds.keys()) == ['csv', 'geojson', 'shapefile']
+
+
+def test_write_output_branches_raises_after_all_branches_complete():
+    # The 'csv' branch fails at once, while the 'geojson' branch is still writing.
+    shapefile_written = threading.Event()
+    written = []
+
+    def fail(message: str) -> None:
+        raise ValueError(message)
+
+    def write_geojson() -> None:
+        assert shapefile_written.wait(10)
+        time.sleep(0.1)
+        written.append('geojson')
+
+    def write_shapefile() -> None:
+        written.append('shapefile')
+        shapefile_written.set()
+
+    with pytest.raises(ValueError, match='csv'):
+        snodas_util.write_output_branches({'csv': lambda: fail('csv'), 'geojson': write_geojson},
+                                          {'shapefile': write_shapefile})
+    assert written == ['shapefile', 'geojson']
+
+    # The error from a branch in this thread is raised first, also after the other branches complete.
+    shapefile_written.clear()
+    written = []
+    with pytest.raises(ValueError, match='shapefile'):
+        snodas_util.write_output_branches({'csv': lambda: fail('csv'), 'geojson': write_geojson},
+                                          {'shapefile': lambda: (write_shapefile(), fail('shapefile'))})
+    assert written == ['shapefile', 'geojson']
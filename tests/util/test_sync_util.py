@@ -0,0 +1,140 @@
+"""
+Tests for sync_util, using a local folder as the destination.
+"""
+
+import json
+import os
+
+from pathlib import Path
+
+import pytest
+
+import snodastools.util.sync_util as sync_util
+
+
+class RecordingBackend(sync_util.LocalFolderBackend):
+    """
+    Local folder backend that records the uploaded object paths,
+    and raises an error for the upload batch with index 'fail_batch' (0 is the first batch).
+    """
+
+    def __init__(self, destination: str, fail_batch: int or None = None):
+        super().__init__(destination)
+        self.fail_batch = fail_batch
+        self.batches = []
+
+    def upload(self, files: [(Path, str)]) -> None:
+        if len(self.batches) == self.fail_batch:
+            self.batches.append([])
+            raise RuntimeError('Upload failed.')
+        self.batches.append([object_path for file_path, object_path in files])
+        super().upload(files)
+
+    def get_uploaded(self) -> [str]:
+        return sorted(object_path for batch in self.batches for object_path in batch)
+
+
+@pytest.fixture
+def output_folders(tmp_path):
+    """
+    Create output folders with files to publish, including files and folders that are not published.
+    Returns: list of (folder, destination folder) for sync_folders()
+    """
+    by_date_folder = tmp_path / 'output' / 'SnowpackStatisticsByDate'
+    by_basin_folder = tmp_path / 'output' / 'SnowpackStatisticsByBasin'
+    by_date_folder.mkdir(parents=True)
+    by_basin_folder.mkdir(parents=True)
+    (by_date_folder / 'SnowpackStatisticsByDate_20230424.csv').write_text('Date_YYYYMMDD\n20230424\n')
+    (by_date_folder / 'ListOfDates.txt').write_text('20230424\n')
+    (by_basin_folder / 'SnowpackStatisticsByBasin_BASIN1.csv').write_text('Date_YYYYMMDD\n20230424\n')
+    # Temporary files and staging folders are not published.
+    (by_date_folder / '.SnowpackStatisticsByDate_LatestDate.csv.tmp').write_text('partial')
+    staging_folder = tmp_path / 'output' / 'SnowpackStatisticsByDate' / '.SnowpackStatisticsByDate-staging-abc'
+    staging_folder.mkdir()
+    (staging_folder / 'SnowpackStatisticsByDate_20230425.csv').write_text('Date_YYYYMMDD\n20230425\n')
+    return [(by_date_folder, 'data/SnowpackStatisticsByDate'), (by_basin_folder, 'data/SnowpackStatisticsByBasin')]
+
+
+ALL_OBJECT_PATHS = [
+    'data/SnowpackStatisticsByBasin/SnowpackStatisticsByBasin_BASIN1.csv',
+    'data/SnowpackStatisticsByDate/ListOfDates.txt',
+    'data/SnowpackStatisticsByDate/SnowpackStatisticsByDate_20230424.csv'
+]
+
+
+def test_sync_uploads_only_new_and_changed_files(output_folders, tmp_path):
+    destination = str(tmp_path / 'destination')
+    manifest_path = tmp_path / 'manifest' / 'SyncManifest.json'
+    by_date_folder = output_folders[0][0]
+
+    # The first sync uploads all files except the temporary files and staging folders.
+    backend = RecordingBackend(destination)
+    metrics = sync_util.sync_folders(output_folders, backend, manifest_path)
+    assert metrics.success
+    assert backend.get_uploaded() == ALL_OBJECT_PATHS
+    assert metrics.files_uploaded == 3
+    assert (Path(destination) / 'data/SnowpackStatisticsByDate/ListOfDates.txt').read_text() == '20230424\n'
+    assert not list(Path(destination).rglob('.*'))
+
+    # The second sync does not upload or hash any files.
+    backend = RecordingBackend(destination)
+    metrics = sync_util.sync_folders(output_folders, backend, manifest_path)
+    assert metrics.success
+    assert backend.get_uploaded() == []
+    assert metrics.files == 3
+    assert metrics.files_hashed == 0
+    assert metrics.bytes_uploaded == 0
+
+    # A file that is written again with the same content is hashed but not uploaded.
+    list_of_dates_path = by_date_folder / 'ListOfDates.txt'
+    list_of_dates_path.write_text('20230424\n')
+    os.utime(list_of_dates_path, ns=(1682380800000000000, 1682380800000000000))
+    backend = RecordingBackend(destination)
+    metrics = sync_util.sync_folders(output_folders, backend, manifest_path)
+    assert backend.get_uploaded() == []
+    assert metrics.files_hashed == 1
+    # The new modification time is saved, so the file is not hashed again.
+    metrics = sync_util.sync_folders(output_folders, RecordingBackend(destination), manifest_path)
+    assert metrics.files_hashed == 0
+
+    # A file with changed content is uploaded.
+    list_of_dates_path.write_text('20230424\n20230425\n')
+    backend = RecordingBackend(destination)
+    metrics = sync_util.sync_folders(output_folders, backend, manifest_path)
+    assert backend.get_uploaded() == ['data/SnowpackStatisticsByDate/ListOfDates.txt']
+    assert metrics.bytes_uploaded == len('20230424\n20230425\n')
+    assert (Path(destination) / 'data/SnowpackStatisticsByDate/ListOfDates.txt').read_text() == \
+        '20230424\n20230425\n'
+
+
+def test_sync_manifest_is_saved_when_upload_fails(output_folders, tmp_path):
+    destination = str(tmp_path / 'destination')
+    manifest_path = tmp_path / 'manifest' / 'SyncManifest.json'
+
+    # The second batch fails, so only the first file is uploaded and saved in the manifest.
+    backend = RecordingBackend(destination, fail_batch=1)
+    metrics = sync_util.sync_folders(output_folders, backend, manifest_path, batch_size=1)
+    assert not metrics.success
+    assert metrics.error == 'Upload failed.'
+    assert metrics.files_uploaded == 1
+    uploaded = backend.get_uploaded()
+    with open(manifest_path, 'r', encoding='utf-8') as manifest_file:
+        manifest = json.load(manifest_file)
+    assert manifest['destination'] == destination
+    assert sorted(manifest['files'].keys()) == uploaded
+
+    # The next sync only uploads the files that were not uploaded.
+    backend = RecordingBackend(destination)
+    metrics = sync_util.sync_folders(output_folders, backend, manifest_path, batch_size=1)
+    assert metrics.success
+    assert backend.get_uploaded() == sorted(set(ALL_OBJECT_PATHS) - set(uploaded))
+
+
+def test_create_sync_backend():
+    assert isinstance(sync_util.create_sync_backend('gs://bucket/data'), sync_util.GsutilBackend)
+    assert isinstance(sync_util.create_sync_backend('s3://bucket/data', profile='snodas'), sync_util.AwsCliBackend)
+    backend = sync_util.create_sync_backend('file:///tmp/data/')
+    assert isinstance(backend, sync_util.LocalFolderBackend)
+    assert backend.destination == '/tmp/data'
+    with pytest.raises(ValueError):
+        sync_util.create_sync_backend('ftp://host/data')
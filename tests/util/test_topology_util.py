@@ -0,0 +1,144 @@
+"""
+Tests for topology_util.
+"""
+
+import snodastools.util.topology_util as topology_util
+
+# Two basins that share the boundary x=2 (with points at y=0 to 4), and an island basin that shares no points.
+# The shared boundary is not straight, so that simplification removes some of its points.
+SHARED_BOUNDARY = [(2, 0), (2.02, 1), (1.97, 2), (2.01, 3), (2, 4)]
+BASIN_A_RING = [(0, 0), (0, 2), (0, 4)] + SHARED_BOUNDARY[::-1] + [(1, 0), (0, 0)]
+BASIN_B_RING = SHARED_BOUNDARY + [(4, 4), (4, 0), (2, 0)]
+ISLAND_RING = [(10, 10), (10, 11), (11, 11), (11, 10), (10.5, 10.02), (10, 10)]
+
+
+def get_geometries() -> [dict]:
+    return [
+        {'type': 'Polygon', 'coordinates': [[list(point) for point in BASIN_A_RING]]},
+        {'type': 'Polygon', 'coordinates': [[list(point) for point in BASIN_B_RING]]},
+        {'type': 'MultiPolygon', 'coordinates': [[[list(point) for point in ISLAND_RING]]]},
+        None
+    ]
+
+
+def normalize_ring(ring: list) -> list:
+    """
+    Normalize a ring so that rings with the same points in the same order can be compared,
+    by rotating the ring to start at the smallest point.
+    """
+    points = [tuple(point) for point in ring[:-1]]
+    start = points.index(min(points))
+    points = points[start:] + points[:start]
+    return points + [points[0]]
+
+
+def decode_arc(arc: [[int]], transform: dict) -> [tuple]:
+    """
+    Decode a quantized, delta-encoded TopoJSON arc.
+    """
+    points = []
+    x = y = 0
+    for dx, dy in arc:
+        x += dx
+        y += dy
+        points.append((x * transform['scale'][0] + transform['translate'][0],
+                       y * transform['scale'][1] + transform['translate'][1]))
+    return points
+
+
+def decode_ring(arc_indices: [int], arcs: [[[int]]], transform: dict) -> [tuple]:
+    """
+    Decode a TopoJSON ring from its arc indices.
+    """
+    ring = []
+    for arc_index in arc_indices:
+        if arc_index < 0:
+            points = decode_arc(arcs[~arc_index], transform)[::-1]
+        else:
+            points = decode_arc(arcs[arc_index], transform)
+        ring.extend(points[1:] if ring else points)
+    return ring
+
+
+def test_get_junctions_of_adjacent_polygons():
+    junctions = topology_util.get_junctions([BASIN_A_RING, BASIN_B_RING, ISLAND_RING])
+    # The ends of the shared boundary are junctions, the interior points of the shared boundary are not.
+    assert junctions == {(2, 0), (2, 4)}
+
+
+def test_get_ring_arcs_splits_at_junctions():
+    junctions = {(2, 0), (2, 4)}
+    a_arcs = topology_util.get_ring_arcs(BASIN_A_RING, junctions)
+    b_arcs = topology_util.get_ring_arcs(BASIN_B_RING, junctions)
+    assert len(a_arcs) == 2
+    assert len(b_arcs) == 2
+    # The shared boundary is an arc of both rings, in opposite directions, with the same key.
+    assert tuple(SHARED_BOUNDARY[::-1]) in a_arcs
+    assert tuple(SHARED_BOUNDARY) in b_arcs
+    assert topology_util.get_arc_key(tuple(SHARED_BOUNDARY)) == \
+        topology_util.get_arc_key(tuple(SHARED_BOUNDARY[::-1]))
+
+
+def test_get_ring_arcs_without_junctions():
+    arcs = topology_util.get_ring_arcs(ISLAND_RING, set())
+    # The ring is one closed arc that starts at the smallest point.
+    assert arcs == [tuple(ISLAND_RING)]
+    # The same ring starting at a different point has the same arc.
+    rotated_ring = ISLAND_RING[2:-1] + ISLAND_RING[0:3]
+    assert topology_util.get_ring_arcs(rotated_ring, set()) == arcs
+
+
+def test_simplify_polygons_keeps_shared_boundary():
+    geometries = get_geometries()
+    simplified = topology_util.simplify_polygons(geometries, 0.1)
+    assert simplified[3] is None
+    assert simplified[0]['type'] == 'Polygon'
+    assert simplified[2]['type'] == 'MultiPolygon'
+
+    a_ring = [tuple(point) for point in simplified[0]['coordinates'][0]]
+    b_ring = [tuple(point) for point in simplified[1]['coordinates'][0]]
+    island_ring = [tuple(point) for point in simplified[2]['coordinates'][0][0]]
+    for ring, original_ring in [(a_ring, BASIN_A_RING), (b_ring, BASIN_B_RING), (island_ring, ISLAND_RING)]:
+        # The rings are closed, are still polygons, and only use the original points.
+        assert ring[0] == ring[-1]
+        assert len(ring) >= 4
+        assert set(ring) <= set(original_ring)
+    # The neighbors still share identical boundary points, so there are no gaps or overlaps,
+    # and interior points of the shared boundary were removed.
+    a_shared = {point for point in a_ring if point in SHARED_BOUNDARY}
+    b_shared = {point for point in b_ring if point in SHARED_BOUNDARY}
+    assert a_shared == b_shared
+    assert {(2, 0), (2, 4)} <= a_shared
+    assert len(a_shared) < len(SHARED_BOUNDARY)
+
+
+def test_build_topology_reuses_shared_arc():
+    topology = topology_util.build_topology(get_geometries(), 5)
+    geometries = topology['geometries']
+    assert [geometry['type'] for geometry in geometries] == ['Polygon', 'Polygon', 'MultiPolygon', None]
+    a_indices = geometries[0]['arcs'][0]
+    b_indices = geometries[1]['arcs'][0]
+    island_indices = geometries[2]['arcs'][0][0]
+    # The shared boundary is stored once and is used by the second basin in the opposite direction.
+    assert len(topology['arcs']) == 4
+    shared_indices = [index for index in b_indices if ~index in a_indices]
+    assert len(shared_indices) == 1
+    # The island is one closed arc that is not shared.
+    assert len(island_indices) == 1
+    assert island_indices[0] >= 0
+
+
+def test_build_topology_decodes_to_input_rings():
+    # Use a quantization for which the scale is 0.01 so that all input coordinates are quantized exactly.
+    topology = topology_util.build_topology(get_geometries(), 1101)
+    transform = topology['transform']
+    assert transform['translate'] == [0, 0]
+    geometries = topology['geometries']
+    decoded_rings = [
+        decode_ring(geometries[0]['arcs'][0], topology['arcs'], transform),
+        decode_ring(geometries[1]['arcs'][0], topology['arcs'], transform),
+        decode_ring(geometries[2]['arcs'][0][0], topology['arcs'], transform)
+    ]
+    for decoded_ring, ring in zip(decoded_rings, [BASIN_A_RING, BASIN_B_RING, ISLAND_RING]):
+        decoded_ring = [(round(x, 6), round(y, 6)) for x, y in decoded_ring]
+        assert normalize_ring(decoded_ring) == normalize_ring(ring)
@@ -0,0 +1,128 @@
+"""
+Tests for transport_util, using the HTTP stand-in server (http_standin_server) on an ephemeral port.
+"""
+
+import http.server
+import os
+import threading
+
+from datetime import date
+from functools import partial
+
+import pytest
+
+import snodastools.util.transport_util as transport_util
+
+from snodastools.app.http_standin_server import StandinRequestHandler
+
+SNODAS_DATE = date(2023, 4, 24)
+SNODAS_FILE_NAME = 'SNODAS_20230424.tar'
+# File contents, large enough to be transferred in several blocks.
+SNODAS_FILE_CONTENT = bytes(range(256)) * 200
+
+
+@pytest.fixture
+def standin_server(tmp_path):
+    """
+    Run the stand-in server in a thread, serving a 'masked' folder with one SNODAS file.
+    Returns: tuple of (server URL, path to the served file)
+    """
+    masked_folder = tmp_path / 'masked'
+    remote_file_path = masked_folder / transport_util.get_remote_date_folder(SNODAS_DATE) / SNODAS_FILE_NAME
+    remote_file_path.parent.mkdir(parents=True)
+    remote_file_path.write_bytes(SNODAS_FILE_CONTENT)
+    # Set the modification time in the past so that 'If-Modified-Since' is not affected by clock resolution.
+    os.utime(remote_file_path, (1682380800, 1682380800))
+
+    handler = partial(StandinRequestHandler, directory=str(masked_folder))
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield 'http://127.0.0.1:{}/'.format(server.server_address[1]), remote_file_path
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+@pytest.fixture
+def download_folder(tmp_path):
+    folder = tmp_path / 'download'
+    folder.mkdir()
+    return folder
+
+
+def test_list_date_files(standin_server):
+    url, remote_file_path = standin_server
+    with transport_util.HttpsTransport(url) as transport:
+        assert transport.list_date_files(SNODAS_DATE) == [SNODAS_FILE_NAME]
+
+
+def test_download_file(standin_server, download_folder):
+    url, remote_file_path = standin_server
+    local_file_path = download_folder / SNODAS_FILE_NAME
+    with transport_util.HttpsTransport(url) as transport:
+        assert transport.download_file(SNODAS_DATE, SNODAS_FILE_NAME, local_file_path) == len(SNODAS_FILE_CONTENT)
+        assert local_file_path.read_bytes() == SNODAS_FILE_CONTENT
+        assert not local_file_path.with_name(SNODAS_FILE_NAME + '.part').exists()
+        assert local_file_path.stat().st_mtime == remote_file_path.stat().st_mtime
+        # The file has not been modified so it is not transferred again, using the same connection.
+        connection = transport.connection
+        assert transport.download_file(SNODAS_DATE, SNODAS_FILE_NAME, local_file_path) == 0
+        assert transport.connection is connection
+
+
+def test_download_file_resumes_part_file(standin_server, download_folder):
+    url, remote_file_path = standin_server
+    local_file_path = download_folder / SNODAS_FILE_NAME
+    part_size = 10000
+    local_file_path.with_name(SNODAS_FILE_NAME + '.part').write_bytes(SNODAS_FILE_CONTENT[0:part_size])
+    with transport_util.HttpsTransport(url) as transport:
+        # Only the rest of the file is transferred, using a 'Range' request.
+        assert transport.download_file(SNODAS_DATE, SNODAS_FILE_NAME, local_file_path) == \
+            len(SNODAS_FILE_CONTENT) - part_size
+    assert local_file_path.read_bytes() == SNODAS_FILE_CONTENT
+
+
+def test_download_file_restarts_after_416(standin_server, download_folder):
+    url, remote_file_path = standin_server
+    local_file_path = download_folder / SNODAS_FILE_NAME
+    # A '.part' file that is larger than the remote file cannot be resumed.
+    local_file_path.with_name(SNODAS_FILE_NAME + '.part').write_bytes(SNODAS_FILE_CONTENT + b'extra')
+    with transport_util.HttpsTransport(url) as transport:
+        assert transport.download_file(SNODAS_DATE, SNODAS_FILE_NAME, local_file_path) == len(SNODAS_FILE_CONTENT)
+    assert local_file_path.read_bytes() == SNODAS_FILE_CONTENT
+
+
+def test_download_missing_file(standin_server, download_folder):
+    url, remote_file_path = standin_server
+    with transport_util.HttpsTransport(url) as transport:
+        with pytest.raises(transport_util.HttpStatusError) as exc_info:
+            transport.download_file(SNODAS_DATE, 'SNODAS_20230425.tar', download_folder / 'SNODAS_20230425.tar')
+    assert exc_info.value.status == 404
+
+
+def test_open_stream(standin_server):
+    url, remote_file_path = standin_server
+    with transport_util.HttpsTransport(url) as transport:
+        with transport.open_stream(SNODAS_DATE, SNODAS_FILE_NAME) as stream:
+            assert stream.read(100) == SNODAS_FILE_CONTENT[0:100]
+        # The rest of the response is read so the connection can be reused.
+        assert transport.bytes_transferred == len(SNODAS_FILE_CONTENT)
+        assert transport.connection is not None
+        assert transport.list_date_files(SNODAS_DATE) == [SNODAS_FILE_NAME]
+
+
+def test_open_stream_error_closes_connection(standin_server):
+    url, remote_file_path = standin_server
+    with transport_util.HttpsTransport(url) as transport:
+        # The original error is raised and the rest of the response is not read.
+        with pytest.raises(ValueError, match='error reading stream'):
+            with transport.open_stream(SNODAS_DATE, SNODAS_FILE_NAME) as stream:
+                stream.read(100)
+                raise ValueError('error reading stream')
+        assert transport.bytes_transferred < len(SNODAS_FILE_CONTENT)
+        assert transport.connection is None
+        # The next request opens a new connection.
+        assert transport.list_date_files(SNODAS_DATE) == [SNODAS_FILE_NAME]
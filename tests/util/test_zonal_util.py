@@ -0,0 +1,205 @@
+"""
+Tests for zonal_util, which are skipped if QGIS and GDAL are not available.
+The statistics are tested with small synthetic arrays, so no raster files are needed.
+"""
+
+import numpy as np
+import pytest
+
+pytest.importorskip('qgis.core')
+pytest.importorskip('osgeo.gdal')
+
+import snodastools.util.zonal_util as zonal_util  # noqa: E402
+
+# Nodata value used for the synthetic rasters, the same as the SNODAS rasters.
+NODATA = -9999.0
+# WGS84 geographic coordinate system, as used by the native SNODAS grid.
+WGS84_WKT = ('GEOGCS["WGS 84",DATUM["WGS_1984",SPHEROID["WGS 84",6378137,298.257223563]],'
+             'PRIMEM["Greenwich",0],UNIT["degree",0.0174532925199433],AUTHORITY["EPSG","4326"]]')
+
+
+def create_raster(values: np.ndarray) -> zonal_util.RasterData:
+    """
+    Create a projected raster with 1000 m cells for test values.
+    """
+    return zonal_util.RasterData(np.asarray(values, dtype=np.float32), NODATA, (0.0, 1000.0, 0.0, 0.0, 0.0, -1000.0),
+                                 '')
+
+
+def test_valid_basin_cells_round_trip(tmp_path):
+    valid_basin_cells = {
+        # Unweighted basin.
+        3: zonal_util.BasinCells(np.array([1, 2, 5, 9], dtype=np.int64)),
+        # Weighted basin (small basin or geographic raster).
+        7: zonal_util.BasinCells(np.array([4, 6], dtype=np.int64), np.array([0.25, 0.75])),
+        # Basin with no cells with data.
+        8: zonal_util.BasinCells(np.empty(0, dtype=np.int64))
+    }
+    cache_file_path = tmp_path / 'cache' / 'ValidBasinCells_test.npz'
+    zonal_util.write_valid_basin_cells(valid_basin_cells, cache_file_path)
+    assert [path.name for path in cache_file_path.parent.iterdir()] == [cache_file_path.name]
+
+    read_basin_cells = zonal_util.read_valid_basin_cells(cache_file_path)
+    assert sorted(read_basin_cells.keys()) == [3, 7, 8]
+    for fid, basin in valid_basin_cells.items():
+        np.testing.assert_array_equal(read_basin_cells[fid].cells, basin.cells)
+        if basin.weights is None:
+            assert read_basin_cells[fid].weights is None
+        else:
+            np.testing.assert_array_equal(read_basin_cells[fid].weights, basin.weights)
+
+
+def test_valid_mask_hash_changes_when_one_cell_changes():
+    valid = np.ones((50, 70), dtype=bool)
+    valid[0:10, 0:10] = False
+    mask_hash = zonal_util.get_valid_mask_hash(valid)
+    assert zonal_util.get_valid_mask_hash(valid.copy()) == mask_hash
+    changed = valid.copy()
+    changed[49, 69] = False
+    assert zonal_util.get_valid_mask_hash(changed) != mask_hash
+    # The same cells in a different shape are a different mask.
+    assert zonal_util.get_valid_mask_hash(valid.reshape(70, 50)) != mask_hash
+
+
+def test_create_snow_cover_mask():
+    raster = create_raster([[0.0, 5.0, NODATA], [np.nan, 0.5, -1.0]])
+    np.testing.assert_array_equal(zonal_util.create_snow_cover_mask(raster),
+                                  [[False, True, False], [False, True, False]])
+
+
+def test_dense_basin_statistics():
+    flat_values = np.array([0.0, 10.0, 20.0, 30.0, 40.0, 99.0])
+    flat_snow = flat_values > 0
+    basin = zonal_util.BasinCells(np.array([0, 1, 2, 3, 4], dtype=np.int64))
+    stats = zonal_util.calculate_dense_basin_statistics(basin, flat_values, flat_snow, [])
+    assert stats['count'] == 5
+    assert stats['snow_count'] == 4
+    assert stats['mean'] == pytest.approx(20.0)
+    assert stats['min'] == 0.0
+    assert stats['max'] == 40.0
+    # Population standard deviation (divide by n), the same as QgsZonalStatistics.
+    assert stats['stdev'] == pytest.approx(np.std([0.0, 10.0, 20.0, 30.0, 40.0]))
+    assert stats['stdev'] != pytest.approx(np.std([0.0, 10.0, 20.0, 30.0, 40.0], ddof=1))
+
+
+def test_dense_basin_statistics_without_cells():
+    stats = zonal_util.calculate_dense_basin_statistics(zonal_util.BasinCells(np.empty(0, dtype=np.int64)),
+                                                        np.array([1.0]), np.array([True]), [])
+    assert stats['count'] == 0
+    assert stats['mean'] is None
+    assert stats['stdev'] is None
+
+
+def test_zonal_statistics():
+    raster = create_raster([[0.0, 10.0, 20.0], [30.0, NODATA, 50.0]])
+    basin_cells = {
+        1: zonal_util.BasinCells(np.array([0, 1, 3], dtype=np.int64)),
+        2: zonal_util.BasinCells(np.array([2, 5], dtype=np.int64))
+    }
+    basin_stats = zonal_util.calculate_zonal_statistics(raster, basin_cells,
+                                                        zonal_util.create_snow_cover_mask(raster))
+    assert basin_stats[1]['count'] == 3
+    assert basin_stats[1]['snow_count'] == 2
+    assert basin_stats[1]['mean'] == pytest.approx(40.0 / 3.0)
+    assert basin_stats[2]['snow_count'] == 2
+    assert basin_stats[2]['mean'] == pytest.approx(35.0)
+    # Without the snow mask, the snow cover is not calculated.
+    basin_stats = zonal_util.calculate_zonal_statistics(raster, basin_cells, None)
+    assert basin_stats[1]['snow_count'] == 0
+    assert basin_stats[1]['mean'] == pytest.approx(40.0 / 3.0)
+
+
+def test_threshold_snow_counts():
+    raster = create_raster([[0.0, 1.0, 2.5], [10.0, 25.0, NODATA]])
+    basin_cells = {1: zonal_util.BasinCells(np.array([0, 1, 2, 3, 4], dtype=np.int64))}
+    basin_stats = zonal_util.calculate_zonal_statistics(raster, basin_cells,
+                                                        zonal_util.create_snow_cover_mask(raster), [2.5, 10.0, 100.0])
+    # The cells with SWE greater than (not equal to) each threshold are counted.
+    assert basin_stats[1]['snow_count'] == 4
+    assert basin_stats[1]['threshold_snow_count'] == {2.5: 2, 10.0: 1, 100.0: 0}
+
+
+def test_weighted_dense_basin_statistics():
+    flat_values = np.array([10.0, 20.0, 40.0])
+    weights = np.array([1.0, 0.5, 0.25])
+    basin = zonal_util.BasinCells(np.array([0, 1, 2], dtype=np.int64), weights)
+    stats = zonal_util.calculate_dense_basin_statistics(basin, flat_values, flat_values > 15.0, [15.0])
+    mean = np.sum(weights * flat_values) / weights.sum()
+    assert stats['count'] == pytest.approx(1.75)
+    assert stats['snow_count'] == pytest.approx(0.75)
+    assert stats['threshold_snow_count'] == {15.0: pytest.approx(0.75)}
+    assert stats['mean'] == pytest.approx(mean)
+    assert stats['stdev'] == pytest.approx(np.sqrt(np.sum(weights * (flat_values - mean) ** 2) / weights.sum()))
+    assert stats['min'] == 10.0
+    assert stats['max'] == 40.0
+
+
+def test_row_cell_areas_total_earth_area():
+    # 1-degree global grid.
+    raster = zonal_util.RasterData(np.zeros((180, 360), dtype=np.float32), NODATA,
+                                   (-180.0, 1.0, 0.0, 90.0, 0.0, -1.0), WGS84_WKT)
+    assert zonal_util.is_geographic_raster(raster)
+    row_cell_areas = zonal_util.calculate_row_cell_areas(raster)
+    assert row_cell_areas.shape == (180,)
+    # The total area of the WGS84 ellipsoid is about 5.1007e14 square meters.
+    assert row_cell_areas.sum() * 360 == pytest.approx(5.1007e14, rel=1e-4)
+    # The cells are symmetric about the equator and largest at the equator.
+    np.testing.assert_allclose(row_cell_areas, row_cell_areas[::-1])
+    assert np.argmax(row_cell_areas) in (89, 90)
+
+
+def create_sparse_test_data() -> (zonal_util.RasterData, dict):
+    """
+    Create a raster that is mostly zero, with nodata cells, and basins with unweighted and weighted cells.
+    """
+    random = np.random.default_rng(1)
+    values = np.zeros((40, 50), dtype=np.float32)
+    snow_cells = random.choice(values.size, 60, replace=False)
+    values.ravel()[snow_cells] = random.uniform(0.5, 300.0, 60).astype(np.float32)
+    values[0:3, :] = NODATA
+    raster = create_raster(values)
+    valid_cells = np.flatnonzero(raster.get_valid_mask().ravel())
+    basin_cells = {}
+    for fid in range(6):
+        cells = np.sort(random.choice(valid_cells, 200, replace=False)).astype(np.int64)
+        weights = random.uniform(0.1, 1.0, cells.size) if fid % 2 else None
+        basin_cells[fid] = zonal_util.BasinCells(cells, weights)
+    # Basins with no snow, and with no cells.
+    basin_cells[6] = zonal_util.BasinCells(np.flatnonzero(raster.values.ravel() == 0)[0:10].astype(np.int64))
+    basin_cells[7] = zonal_util.BasinCells(np.empty(0, dtype=np.int64))
+    return raster, basin_cells
+
+
+def test_sparse_statistics_equal_dense_statistics():
+    raster, basin_cells = create_sparse_test_data()
+    thresholds = [1.0, 50.0]
+    snow_mask = zonal_util.create_snow_cover_mask(raster)
+    dense_stats = zonal_util.calculate_zonal_statistics(raster, basin_cells, snow_mask, thresholds)
+    sparse_stats = zonal_util.calculate_zonal_statistics(raster, basin_cells, snow_mask, thresholds, 1.0)
+    for fid in basin_cells.keys():
+        for key, value in dense_stats[fid].items():
+            if key == 'threshold_snow_count':
+                assert sparse_stats[fid][key] == {threshold: pytest.approx(count)
+                                                  for threshold, count in value.items()}, fid
+            elif value is None:
+                assert sparse_stats[fid][key] is None, (fid, key)
+            else:
+                assert sparse_stats[fid][key] == pytest.approx(value, rel=1e-9, abs=1e-9), (fid, key)
+
+
+def test_zonal_statistics_uses_sparse_path_below_fraction(monkeypatch):
+    raster, basin_cells = create_sparse_test_data()
+    calls = []
+    sparse_function = zonal_util.calculate_sparse_basin_statistics
+
+    def count_sparse_calls(*args):
+        calls.append(1)
+        return sparse_function(*args)
+
+    monkeypatch.setattr(zonal_util, 'calculate_sparse_basin_statistics', count_sparse_calls)
+    snow_mask = zonal_util.create_snow_cover_mask(raster)
+    # About 3% of the 1850 cells with data are not zero.
+    zonal_util.calculate_zonal_statistics(raster, basin_cells, snow_mask, None, 0.01)
+    assert not calls
+    zonal_util.calculate_zonal_statistics(raster, basin_cells, snow_mask, None, 0.05)
+    assert len(calls) == len(basin_cells)